@@ -4,6 +4,8 @@ from celery.schedules import crontab
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+from trading.schedules import MarketHoursSchedule
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 app = Celery('core')
@@ -16,7 +18,11 @@ app.autodiscover_tasks()
 app.conf.beat_schedule = {
     'execute_trades': {
         'task': 'trading.tasks.execute_trade_task',
-        'schedule': 60.0,  # Run every 60 seconds
+        'schedule': MarketHoursSchedule(60.0, symbols=['AAPL']),  # Every 60 seconds while AAPL trades
+    },
+    'refresh_asset_universe': {
+        'task': 'trading.tasks.refresh_asset_universe_task',
+        'schedule': crontab(hour=12, minute=0),  # Daily, before the US equity open
     },
 }
 
@@ -250,5 +250,44 @@ REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
 
+# Shared indicator cache (in-process LRU in front of Redis)
+INDICATOR_CACHE_SIZE = int(os.getenv('INDICATOR_CACHE_SIZE', '1024'))
+INDICATOR_CACHE_TTL = int(os.getenv('INDICATOR_CACHE_TTL', '300'))  # seconds
+INDICATOR_STATE_TTL = int(os.getenv('INDICATOR_STATE_TTL', '259200'))  # seconds, persisted IndicatorState snapshots
+
+# On-disk cache of backtest, optimisation and training results
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', str(BASE_DIR / 'cache' / 'results'))
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Local columnar OHLCV store (one directory per symbol/timeframe)
+BAR_STORE_DIR = os.getenv('BAR_STORE_DIR', str(BASE_DIR / 'cache' / 'bars'))
+
+# Upstream market data: API key, requests per minute per provider, and requests in flight
+ALPHA_VANTAGE_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY', 'demo')
+MARKET_DATA_RATE_LIMITS = {
+    'alpha_vantage': int(os.getenv('ALPHA_VANTAGE_REQUESTS_PER_MINUTE', '75')),
+}
+MARKET_DATA_MAX_CONCURRENCY = int(os.getenv('MARKET_DATA_MAX_CONCURRENCY', '8'))
+
+# Bar providers in priority order; a backup is hedged once the primary runs past its p95 latency
+MARKET_DATA_PROVIDERS = [name for name in os.getenv('MARKET_DATA_PROVIDERS', 'alpaca,yfinance').split(',') if name]
+MARKET_DATA_HEDGE_DELAY = float(os.getenv('MARKET_DATA_HEDGE_DELAY', '1.0'))  # seconds, until p95 is known
+
+# Coalesced upstream calls: results are fresh for TTL seconds, then served stale while revalidating
+SINGLE_FLIGHT_TTL = float(os.getenv('SINGLE_FLIGHT_TTL', '5'))
+SINGLE_FLIGHT_STALE_TTL = float(os.getenv('SINGLE_FLIGHT_STALE_TTL', '60'))
+
+# Broker asset list, downloaded once a day into a table shared by all processes
+ASSET_UNIVERSE_PATH = os.getenv('ASSET_UNIVERSE_PATH', str(BASE_DIR / 'cache' / 'assets.npz'))
+ASSET_UNIVERSE_MAX_AGE = int(os.getenv('ASSET_UNIVERSE_MAX_AGE', str(24 * 3600)))  # seconds
+
+# Seconds the local account/position book is trusted before reloading from the broker,
+# and the shorter window after an order that has not reported all its fills
+ACCOUNT_BOOK_MAX_AGE = float(os.getenv('ACCOUNT_BOOK_MAX_AGE', '30'))
+ACCOUNT_BOOK_SETTLE_AGE = float(os.getenv('ACCOUNT_BOOK_SETTLE_AGE', '5'))
+
+# Symbols the market-data hub always streams; others are added while clients watch them
+MARKET_HUB_SYMBOLS = [symbol for symbol in os.getenv('MARKET_HUB_SYMBOLS', 'AAPL').split(',') if symbol]
+
 # Activate Django-Heroku
 django_heroku.settings(locals())
\ No newline at end of file
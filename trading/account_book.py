@@ -0,0 +1,184 @@
+"""Local book of a broker account's cash and positions.
+
+Pre-trade checks used to fetch the account (and the position) from the
+broker on every call. ``AccountBook`` loads both once, answers lookups from
+memory, and keeps them current between reconciliations:
+
+* Fills reported with an order response, or pushed on the broker's
+  trade-updates stream, are applied to cash, buying power and the position
+  right away.
+* A snapshot is trusted for ``max_age`` seconds. An order that has not
+  reported all its fills shortens that to ``settle_age``, so the book is
+  reloaded from the broker soon after anything it cannot see.
+
+Books are shared per broker account through ``get_account_book``.
+"""
+import asyncio
+import logging
+import threading
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _decimal(value) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _field(data, name, default=None):
+    return data.get(name, default) if isinstance(data, dict) else getattr(data, name, default)
+
+
+class AccountBook:
+    """Account and positions of one broker account.
+
+    Args:
+        broker: AlpacaClient, or a stand-in with its ``get_account`` and ``get_positions``
+        max_age: Seconds a broker snapshot is served before the next lookup reloads it
+        settle_age: Seconds before reloading after an order that has not reported all its fills
+    """
+
+    def __init__(self, broker, max_age: float = 30.0, settle_age: float = 5.0):
+        self.broker = broker
+        self.max_age = max_age
+        self.settle_age = settle_age
+        self._account: Optional[Dict] = None
+        self._positions: Dict[str, Dict] = {}
+        self._filled: Dict[str, Decimal] = {}  # order id -> quantity already applied
+        self._expires = 0.0
+        self._lock = threading.Lock()  # stream fills arrive on another thread
+        self._following = False
+        self.counts = {'lookups': 0, 'refreshes': 0, 'fills': 0}
+
+    async def refresh(self) -> None:
+        """Reload the account and every position from the broker"""
+        account, positions = await asyncio.gather(self.broker.get_account(), self.broker.get_positions())
+        with self._lock:
+            self._account = dict(account)
+            self._positions = {position['symbol']: dict(position) for position in positions}
+            self._expires = time.monotonic() + self.max_age
+            self.counts['refreshes'] += 1
+
+    async def _current(self) -> None:
+        self.counts['lookups'] += 1
+        if self._account is None or time.monotonic() >= self._expires:
+            await self.refresh()
+
+    def invalidate(self) -> None:
+        """Reload from the broker on the next lookup"""
+        self._expires = 0.0
+
+    async def account(self) -> Dict:
+        """Account dict in the shape of ``AlpacaClient.get_account``"""
+        await self._current()
+        with self._lock:
+            return dict(self._account)
+
+    async def position(self, symbol: str) -> Optional[Dict]:
+        """Position dict in the shape of ``AlpacaClient.get_position``, or None"""
+        await self._current()
+        with self._lock:
+            position = self._positions.get(symbol)
+            return dict(position) if position is not None else None
+
+    async def positions(self) -> List[Dict]:
+        await self._current()
+        with self._lock:
+            return [dict(position) for _, position in sorted(self._positions.items())]
+
+    def apply_fill(self, symbol: str, side: str, qty, price) -> None:
+        """Apply one execution to cash, buying power and the symbol's position"""
+        qty, price = _decimal(qty), _decimal(price)
+        signed = qty if side == 'buy' else -qty
+        with self._lock:
+            if self._account is None:
+                return
+            self.counts['fills'] += 1
+            # Cash and market value offset at the fill price, so portfolio value is unchanged
+            self._account['cash'] -= signed * price
+            self._account['buying_power'] -= signed * price
+            position = self._positions.get(symbol)
+            held = _decimal(position['qty']) if position else Decimal(0)
+            avg = position['avg_entry_price'] if position else price
+            total = held + signed
+            if total == 0:
+                self._positions.pop(symbol, None)
+                return
+            if held == 0 or (held > 0) == (signed > 0):
+                avg = (held * avg + signed * price) / total
+            elif (held > 0) != (total > 0):
+                avg = price  # flipped: a new position at the fill price
+            lastday = position['lastday_price'] if position else price
+            self._positions[symbol] = {
+                'symbol': symbol,
+                'qty': int(total),
+                'avg_entry_price': avg,
+                'market_value': total * price,
+                'unrealized_pl': total * (price - avg),
+                'current_price': price,
+                'lastday_price': lastday,
+                'change_today': price / lastday - 1 if lastday else Decimal(0)
+            }
+
+    def _apply_order_fills(self, order, price) -> None:
+        """Apply the part of an order's cumulative filled quantity not seen yet"""
+        order_id = _field(order, 'id')
+        filled = _decimal(_field(order, 'filled_qty') or 0)
+        with self._lock:
+            new = filled - self._filled.get(order_id, Decimal(0))
+            if new > 0:
+                self._filled[order_id] = filled
+        if new > 0:
+            self.apply_fill(_field(order, 'symbol'), _field(order, 'side'), new,
+                            price if price is not None else _field(order, 'filled_avg_price'))
+
+    def record_order(self, order: Dict, price=None) -> None:
+        """Fold a just-submitted order into the book.
+
+        Fills reported with the order are applied at its average fill price
+        (``price`` when the response has none). If part of it is still open,
+        the book reloads within ``settle_age`` unless the stream reports the fills first.
+        """
+        self._apply_order_fills(order, _field(order, 'filled_avg_price') or price)
+        if _decimal(_field(order, 'filled_qty') or 0) < _decimal(order['qty']):
+            with self._lock:
+                self._expires = min(self._expires, time.monotonic() + self.settle_age)
+
+    async def on_trade_update(self, update) -> None:
+        """Handler for the broker's trade-updates stream"""
+        try:
+            if _field(update, 'event') in ('fill', 'partial_fill'):
+                self._apply_order_fills(_field(update, 'order'), _field(update, 'price'))
+        except Exception as e:
+            logger.error(f"Error applying trade update, reloading the account book: {str(e)}")
+            self.invalidate()
+
+    def follow(self, stream) -> None:
+        """Apply fills pushed on ``stream`` (an alpaca_trade_api Stream) as they happen"""
+        with self._lock:
+            if self._following:
+                return
+            self._following = True
+        stream.subscribe_trade_updates(self.on_trade_update)
+        threading.Thread(target=stream.run, name='account-book-trade-updates', daemon=True).start()
+
+    def stats(self) -> Dict:
+        return dict(self.counts, expires_in=max(self._expires - time.monotonic(), 0.0))
+
+
+_books: Dict = {}
+_books_lock = threading.Lock()
+
+
+def get_account_book(broker) -> AccountBook:
+    """Process-wide book for the broker's account (one per API key), staleness from settings"""
+    key = getattr(broker, 'api_key', None) or broker
+    with _books_lock:
+        if key not in _books:
+            from django.conf import settings
+
+            _books[key] = AccountBook(broker, max_age=settings.ACCOUNT_BOOK_MAX_AGE,
+                                      settle_age=settings.ACCOUNT_BOOK_SETTLE_AGE)
+        return _books[key]
@@ -2,28 +2,29 @@ from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 import numpy as np
 import pandas as pd
-from alpha_vantage.timeseries import TimeSeries
-import pandas as pd
+import logging
 from django.conf import settings
 
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+from .indicators import compute_indicators, align_universe, compute_universe_indicators
+from .indicator_cache import get_indicator_cache
+from .result_cache import get_result_cache
+from .bar_store import get_bar_store
+from .market_data import refresh_universe_sync, unique_symbols
+from .strategies import sma_crossover_strategy, rsi_strategy, bollinger_strategy, combined_strategy
+
+logger = logging.getLogger(__name__)
+
 
 # Add exponential moving average (EMA)
 def add_technical_indicators(data):
-    data['SMA_5'] = data['4. close'].rolling(window=5).mean()  # Simple moving average (5 periods)
-    data['EMA_10'] = data['4. close'].ewm(span=10, adjust=False).mean()  # Exponential moving average (10 periods)
-    
-    # Relative strength index (RSI)
-    delta = data['4. close'].diff(1)
-    gain = np.where(delta > 0, delta, 0)
-    loss = np.where(delta < 0, -delta, 0)
-    avg_gain = pd.Series(gain).rolling(window=14).mean()
-    avg_loss = pd.Series(loss).rolling(window=14).mean()
-    rs = avg_gain / avg_loss
-    data['RSI'] = 100 - (100 / (1 + rs))
-    
+    # SMA (5 periods), EMA (10 periods) and RSI (14 periods) in one pass
+    indicators = compute_indicators(data, sma=(5,), ema_spans=(10,), rsi=14, macd=None, bollinger=None)
+    for name in ('SMA_5', 'EMA_10', 'RSI'):
+        data[name] = indicators[name]
+
     return data.dropna()
 
 # Prepare the data for training
@@ -42,7 +43,8 @@ def prepare_data(data):
 
 # Simple function to create moving averages
 def add_moving_average(data, window=5):
-    data['SMA'] = data['4. close'].rolling(window=window).mean()
+    indicators = compute_indicators(data, sma=(window,), ema_spans=(), rsi=None, macd=None, bollinger=None)
+    data['SMA'] = indicators[f'SMA_{window}']
     return data
 
 def prepare_data(data):
@@ -58,11 +60,11 @@ def prepare_data(data):
 
     return train_test_split(X, y, test_size=0.3, random_state=42)
 
-def train_model(data):
+def train_model(data, **model_params):
     X_train, X_test, y_train, y_test = prepare_data(data)
 
-    # Initialize a random forest classifier
-    model = RandomForestClassifier(n_estimators=100)
+    # Initialize a random forest classifier (e.g. with hyperparameters picked by walk_forward_optimize)
+    model = RandomForestClassifier(**{'n_estimators': 100, **model_params})
 
     # Train the model
     model.fit(X_train, y_train)
@@ -74,19 +76,32 @@ def train_model(data):
     return model
 
 
+def train_model_cached(data, **model_params):
+    """train_model, reusing the stored model when the data and parameters are unchanged"""
+    return get_result_cache().get_or_compute(
+        'train_model', model_params, data, lambda: train_model(data, **model_params)
+    )
+
+
 # Get the most recent market data and make a trade decision
-def make_trade_prediction(model, data):
+def make_trade_prediction(model, data, indicators=None):
     """Make a trade prediction with confidence score.
     
     Args:
         model: Trained RandomForestClassifier model
         data: Market data DataFrame
+        indicators: Optional latest indicator values (e.g. from an IndicatorState);
+            used instead of recomputing SMA_5/EMA_10/RSI over ``data`` when warm
         
     Returns:
         dict: Contains prediction ('buy' or 'sell') and confidence score
     """
-    data = add_technical_indicators(data)
-    recent_data = data[['SMA_5', 'EMA_10', 'RSI']].tail(1)
+    features = ['SMA_5', 'EMA_10', 'RSI']
+    if indicators is not None and not any(np.isnan(indicators[name]) for name in features):
+        recent_data = pd.DataFrame([[indicators[name] for name in features]], columns=features)
+    else:
+        data = add_technical_indicators(data)
+        recent_data = data[features].tail(1)
     
     # Get prediction probabilities
     pred_proba = model.predict_proba(recent_data)[0]
@@ -103,108 +118,110 @@ def make_trade_prediction(model, data):
 
 # Fetch market data from Alpha Vantage
 def get_market_data(assets=['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'FB', 'NFLX', 'NVDA', 'PYPL', 'INTC', 'AMD', 'CSCO', 'ADBE', 'QCOM', 'AMAT', 'MU', 'AVGO', 'TXN', 'IBM', 'ADP', 'BTC-USD', 'ETH-USD', 'XRP-USD', 'LTC-USD', 'BCH-USD', 'BNB-USD', 'USDT-USD', 'LINK-USD', 'XLM-USD', 'ADA-USD', 'USDC-USD', 'EOS-USD', 'XMR-USD', 'TRX-USD', 'DASH-USD', 'ETC-USD', 'NEO-USD', 'XTZ-USD', 'ZEC-USD', 'DOGE-USD', 'VET-USD', 'BAT-USD', 'LSK-USD', 'ZRX-USD', 'OMG-USD', 'QTUM-USD', 'REP-USD', 'ALGO-USD', 'COMP-USD', 'KNC-USD', 'DAI-USD', 'YFI-USD', 'UMA-USD', 'REN-USD', 'BAL-USD', 'CRV-USD', 'SUSHI-USD', 'BAND-USD', 'OCEAN-USD', 'NMR-USD', 'MKR-USD', 'SNX-USD', 'LRC-USD', 'UNI-USD', 'YFII-USD', 'RUNE-USD', 'SOL-USD', 'SRM-USD', 'FTT-USD', 'BNT-USD', 'KAVA-USD', 'AKRO-USD', 'KSM-USD', 'RSR-USD', 'SAND-USD', 'MANA-USD', 'RLC-USD', 'ORN-USD', 'UTK-USD', 'STMX-USD', 'DNT-USD', 'RLY-USD', 'TRB-USD', 'LPT-USD', 'MLN-USD', 'FIL-USD', 'LUNA-USD', 'BOND-USD', '1INCH-USD', 'ENJ-USD', 'CHZ-USD', 'OGN-USD', 'RLC-USD', 'SNT-USD', 'GRT-USD', 'BTT-USD', 'SC-USD', 'DGB-USD', 'HOT-USD', 'RVN-USD', 'WIN-USD', 'STMX-USD', 'DENT-USD', 'DOCK-USD', 'CELR-USD',]):
+    store = get_bar_store()
+    # Duplicates are fetched once, concurrently, within the provider's rate limit,
+    # and symbols with stored history only download the latest bars
+    refresh_universe_sync(assets, store, timeframe='1min', interval='1min')
     data = {}
-    for asset in assets:
-        ts = TimeSeries(key=settings.ALPHA_VANTAGE_API_KEY, output_format='pandas')
-        data[asset], _ = ts.get_intraday(symbol=asset, interval='1min', outputsize='full')
+    for asset in unique_symbols(assets):
+        stored = store.read(asset, '1min')
+        if not stored.empty:
+            # Symbols whose fetch failed fall back to the stored history
+            data[asset] = stored
     return data
 
 
-def apply_trading_strategy(data):
-    data['SMA_5'] = data['4. close'].rolling(window=5).mean()  # 5-period SMA
-    data['SMA_20'] = data['4. close'].rolling(window=20).mean()  # 20-period SMA
+def load_market_data(assets, timeframe='1min', start=None, end=None, limit=None):
+    """Oldest-first bars per asset from the local bar store, without touching the network"""
+    store = get_bar_store()
+    return {asset: store.read(asset, timeframe, start=start, end=end, limit=limit) for asset in assets}
 
-    # Generate signals
-    data['Signal'] = 0
-    data['Signal'][data['SMA_5'] > data['SMA_20']] = 1  # Buy signal
-    data['Signal'][data['SMA_5'] <= data['SMA_20']] = -1  # Sell signal
 
-    return data
+def _with_columns(data, columns):
+    """Return a new frame with extra columns; the caller's frame is left untouched"""
+    return data.assign(**columns)
+
+
+def apply_trading_strategy(data):
+    result = sma_crossover_strategy(data, diagnostics=True)
+    return _with_columns(data, {**result.diagnostics, 'Signal': result.signal})
 
 
 def calculate_rsi(data, window=14):
-    delta = data['4. close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-    rs = gain / loss
-    data['RSI'] = 100 - (100 / (1 + rs))
-    return data
+    indicators = compute_indicators(data, sma=(), ema_spans=(), rsi=window, macd=None, bollinger=None)
+    return _with_columns(data, {'RSI': indicators['RSI']})
 
 
 def apply_rsi_strategy(data):
-    data = calculate_rsi(data)
-    data['Signal'] = 0
-    data.loc[data['RSI'] < 30, 'Signal'] = 1  # Buy signal
-    data.loc[data['RSI'] > 70, 'Signal'] = -1  # Sell signal
-    return data
+    result = rsi_strategy(data, diagnostics=True)
+    return _with_columns(data, {**result.diagnostics, 'Signal': result.signal})
 
 
 def calculate_bollinger_bands(data, window=20):
-    data['SMA'] = data['4. close'].rolling(window=window).mean()
-    data['Upper'] = data['SMA'] + 2 * data['4. close'].rolling(window=window).std()
-    data['Lower'] = data['SMA'] - 2 * data['4. close'].rolling(window=window).std()
-    return data
+    indicators = compute_indicators(data, sma=(), ema_spans=(), rsi=None, macd=None, bollinger=(window, 2.0))
+    return _with_columns(data, {
+        'SMA': indicators[f'SMA_{window}'],
+        'Upper': indicators['Upper'],
+        'Lower': indicators['Lower'],
+    })
 
 
 def apply_bollinger_strategy(data):
-    data = calculate_bollinger_bands(data)
-    data['Signal'] = 0
-    data.loc[data['4. close'] < data['Lower'], 'Signal'] = 1  # Buy
-    data.loc[data['4. close'] > data['Upper'], 'Signal'] = -1  # Sell
-    return data
+    result = bollinger_strategy(data, diagnostics=True)
+    diagnostics = result.diagnostics
+    return _with_columns(data, {
+        'SMA': diagnostics['SMA_20'],
+        'Upper': diagnostics['Upper'],
+        'Lower': diagnostics['Lower'],
+        'Signal': result.signal,
+    })
 
 
 def apply_combined_strategy(data):
-    """Apply a combined trading strategy using multiple technical indicators"""
+    """Apply a combined trading strategy using multiple technical indicators.
+
+    Returns a new DataFrame with the indicator columns and a 'signal' column;
+    use trading.strategies.combined_strategy to get just the signal array.
+    """
     try:
-        # Calculate technical indicators
-        data['SMA_5'] = data['4. close'].rolling(window=5).mean()
-        data['SMA_20'] = data['4. close'].rolling(window=20).mean()
-        
-        # RSI calculation
-        delta = data['4. close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        data['RSI'] = 100 - (100 / (1 + rs))
-        
-        # MACD
-        exp1 = data['4. close'].ewm(span=12, adjust=False).mean()
-        exp2 = data['4. close'].ewm(span=26, adjust=False).mean()
-        data['MACD'] = exp1 - exp2
-        data['Signal_line'] = data['MACD'].ewm(span=9, adjust=False).mean()
-        
-        # Generate trading signals (1 for buy, -1 for sell, 0 for hold)
-        data['signal'] = 0  # Initialize signal column
-        
-        # Buy signals
-        buy_condition = (
-            (data['SMA_5'] > data['SMA_20']) &  # Golden cross
-            (data['RSI'] < 70) &  # Not overbought
-            (data['MACD'] > data['Signal_line'])  # MACD crossover
-        )
-        
-        # Sell signals
-        sell_condition = (
-            (data['SMA_5'] < data['SMA_20']) &  # Death cross
-            (data['RSI'] > 30) &  # Not oversold
-            (data['MACD'] < data['Signal_line'])  # MACD crossover
-        )
-        
-        # Apply signals
-        data.loc[buy_condition, 'signal'] = 1
-        data.loc[sell_condition, 'signal'] = -1
-        
-        # Forward fill any NaN values in the signal column
-        data['signal'] = data['signal'].fillna(0)
-        
-        return data
+        result = combined_strategy(data, diagnostics=True)
+        return _with_columns(data, {**result.diagnostics, 'signal': result.signal})
         
     except Exception as e:
         logger.error(f"Error in apply_combined_strategy: {str(e)}")
         # Return the original data with a neutral signal if strategy application fails
-        data['signal'] = 0
-        return data
+        return _with_columns(data, {'signal': 0})
+
+
+def latest_indicators(symbol, timeframe, data):
+    """Latest combined-strategy indicators and signal for a symbol, shared via the indicator cache"""
+    params = {'sma': [5, 20], 'rsi': 14, 'macd': [12, 26, 9], 'strategy': 'combined'}
+
+    def compute():
+        result = combined_strategy(data, diagnostics=True)
+        latest = {name: float(values[-1]) for name, values in result.diagnostics.items()}
+        latest['signal'] = int(result.signal[-1])
+        return latest
+
+    return get_indicator_cache().get_or_compute(symbol, timeframe, data.index[-1], params, compute)
+
+
+def evaluate_universe(data, bars=None):
+    """Apply the combined strategy to every symbol of a universe in one call.
+
+    Args:
+        data: Symbol -> DataFrame mapping as returned by get_market_data
+        bars: Only evaluate the newest ``bars`` bars of each symbol
+
+    Returns:
+        DataFrame: One row per symbol with the latest close, indicators and signal
+    """
+    universe = align_universe(data, bars=bars)
+    indicators = compute_universe_indicators(universe, bollinger=None)
+    latest = {name: values[:, -1] for name, values in indicators.items()}
+    latest['4. close'] = universe.close[:, -1]
+    latest['timestamp'] = universe.timestamps[:, -1]
+    return pd.DataFrame(latest, index=pd.Index(universe.symbols, name='symbol'))
 
 
 def notify_websocket(message):
@@ -1,45 +1,126 @@
 import os
+import json
+import asyncio
 import logging
+import threading
 from decimal import Decimal
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence
 
+import aiohttp
+import numpy as np
+import pandas as pd
 from alpaca_trade_api.rest import REST, TimeFrame
 from alpaca_trade_api.stream import Stream
 import alpaca_trade_api as tradeapi
 
+from .bar_store import LATEST_COLUMNS, BarBatch, format_bars
+from .market_calendar import get_market_calendar
+
 logger = logging.getLogger(__name__)
 
+
+class AlpacaAPIError(Exception):
+    """Non-2xx response from the Alpaca REST API"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
 class AlpacaClient:
-    def __init__(self):
+    """Alpaca trading and market data over aiohttp.
+
+    Every request of an event loop goes through one keep-alive session, at most
+    ``max_concurrency`` at a time, with the timeout of its endpoint. Blocking
+    callers use ``SyncAlpacaClient``. ``api`` (the ``alpaca_trade_api`` REST
+    client) and ``stream`` remain for the calls not covered here.
+    """
+    # Seconds allowed per endpoint, connection setup included
+    TIMEOUTS = {
+        'account': 5.0,
+        'orders': 10.0,
+        'positions': 5.0,
+        'bars': 30.0,
+        'latest': 5.0,
+    }
+    # Symbols per multi-symbol request, keeping URLs well under server limits
+    BATCH_SYMBOLS = 100
+    # Bar fields of the market data API
+    BAR_KEYS = {'open': 'o', 'high': 'h', 'low': 'l', 'close': 'c', 'volume': 'v'}
+
+    def __init__(self, max_concurrency: int = 10, keepalive_timeout: float = 60.0):
         self.api_key = os.getenv('ALPACA_API_KEY')
         self.api_secret = os.getenv('ALPACA_SECRET_KEY')
         self.base_url = os.getenv('ALPACA_BASE_URL', 'https://api.alpaca.markets')  # Use paper URL for testing
-        
+        self.data_url = os.getenv('ALPACA_DATA_URL', 'https://data.alpaca.markets')
+        self.data_feed = 'iex'  # Use 'sip' for production
+        self.max_concurrency = max_concurrency
+        self.keepalive_timeout = keepalive_timeout
+        # Event loop -> (session, semaphore); sessions cannot be shared between loops
+        self._sessions: Dict[asyncio.AbstractEventLoop, tuple] = {}
+
         self.api = REST(
             key_id=self.api_key,
             secret_key=self.api_secret,
             base_url=self.base_url
         )
-        
+
         self.stream = Stream(
             key_id=self.api_key,
             secret_key=self.api_secret,
             base_url=self.base_url,
-            data_feed='iex'  # Use 'sip' for production
+            data_feed=self.data_feed
         )
 
+    def _session(self) -> tuple:
+        loop = asyncio.get_running_loop()
+        entry = self._sessions.get(loop)
+        if entry is None:
+            # Sessions of finished loops (asyncio.run) can no longer be closed properly
+            for finished in [other for other in list(self._sessions) if other.is_closed()]:
+                self._sessions.pop(finished)[0].detach()
+            session = aiohttp.ClientSession(
+                headers={'APCA-API-KEY-ID': self.api_key or '', 'APCA-API-SECRET-KEY': self.api_secret or ''},
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=self.keepalive_timeout),
+            )
+            entry = self._sessions[loop] = (session, asyncio.Semaphore(self.max_concurrency))
+        return entry
+
+    async def close(self) -> None:
+        """Close the connection pool of the running event loop"""
+        entry = self._sessions.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].close()
+
+    async def _request(self, method: str, url: str, endpoint: str, params: Optional[Dict] = None,
+                       payload: Optional[Dict] = None):
+        session, semaphore = self._session()
+        if params is not None:
+            params = {name: str(value) for name, value in params.items() if value is not None}
+        async with semaphore:
+            async with session.request(method, url, params=params, json=payload,
+                                       timeout=aiohttp.ClientTimeout(total=self.TIMEOUTS[endpoint])) as response:
+                text = await response.text()
+                status = response.status
+        data = json.loads(text) if text else None
+        if status >= 400:
+            message = data.get('message', text) if isinstance(data, dict) else text
+            raise AlpacaAPIError(status, message)
+        return data
+
     async def get_account(self) -> Dict:
         """Get Alpaca account information"""
         try:
-            account = self.api.get_account()
+            account = await self._request('GET', f'{self.base_url}/v2/account', 'account')
             return {
-                'cash': Decimal(account.cash),
-                'portfolio_value': Decimal(account.portfolio_value),
-                'buying_power': Decimal(account.buying_power),
-                'day_trade_count': account.daytrade_count,
-                'trading_blocked': account.trading_blocked,
-                'trades_blocked': account.trades_blocked,
-                'transfers_blocked': account.transfers_blocked
+                'cash': Decimal(account['cash']),
+                'portfolio_value': Decimal(account['portfolio_value']),
+                'buying_power': Decimal(account['buying_power']),
+                'day_trade_count': account['daytrade_count'],
+                'trading_blocked': account['trading_blocked'],
+                'trades_blocked': account.get('trades_blocked', False),
+                'transfers_blocked': account['transfers_blocked']
             }
         except Exception as e:
             logger.error(f"Error getting Alpaca account info: {str(e)}")
@@ -57,47 +138,54 @@ class AlpacaClient:
     ) -> Dict:
         """Place an order on Alpaca"""
         try:
-            order = self.api.submit_order(
-                symbol=symbol,
-                qty=qty,
-                side=side,
-                type=type,
-                time_in_force=time_in_force,
-                limit_price=limit_price,
-                stop_price=stop_price
-            )
-            
+            payload = {
+                'symbol': symbol,
+                'qty': str(qty),
+                'side': side,
+                'type': type,
+                'time_in_force': time_in_force
+            }
+            if limit_price is not None:
+                payload['limit_price'] = str(limit_price)
+            if stop_price is not None:
+                payload['stop_price'] = str(stop_price)
+            order = await self._request('POST', f'{self.base_url}/v2/orders', 'orders', payload=payload)
+
             return {
-                'id': order.id,
-                'client_order_id': order.client_order_id,
-                'symbol': order.symbol,
-                'side': order.side,
-                'qty': order.qty,
-                'filled_qty': order.filled_qty,
-                'type': order.type,
-                'status': order.status,
-                'created_at': order.created_at
+                'id': order['id'],
+                'client_order_id': order['client_order_id'],
+                'symbol': order['symbol'],
+                'side': order['side'],
+                'qty': order['qty'],
+                'filled_qty': order['filled_qty'],
+                'type': order['type'],
+                'status': order['status'],
+                'created_at': pd.Timestamp(order['created_at'])
             }
         except Exception as e:
             logger.error(f"Error placing Alpaca order: {str(e)}")
             raise
 
+    @staticmethod
+    def _position(position: Dict) -> Dict:
+        return {
+            'symbol': position['symbol'],
+            'qty': int(position['qty']),
+            'avg_entry_price': Decimal(position['avg_entry_price']),
+            'market_value': Decimal(position['market_value']),
+            'unrealized_pl': Decimal(position['unrealized_pl']),
+            'current_price': Decimal(position['current_price']),
+            'lastday_price': Decimal(position['lastday_price']),
+            'change_today': Decimal(position['change_today'])
+        }
+
     async def get_position(self, symbol: str) -> Dict:
         """Get position information for a symbol"""
         try:
-            position = self.api.get_position(symbol)
-            return {
-                'symbol': position.symbol,
-                'qty': int(position.qty),
-                'avg_entry_price': Decimal(position.avg_entry_price),
-                'market_value': Decimal(position.market_value),
-                'unrealized_pl': Decimal(position.unrealized_pl),
-                'current_price': Decimal(position.current_price),
-                'lastday_price': Decimal(position.lastday_price),
-                'change_today': Decimal(position.change_today)
-            }
+            position = await self._request('GET', f'{self.base_url}/v2/positions/{symbol}', 'positions')
+            return self._position(position)
         except Exception as e:
-            if 'position does not exist' in str(e).lower():
+            if (isinstance(e, AlpacaAPIError) and e.status == 404) or 'position does not exist' in str(e).lower():
                 return None
             logger.error(f"Error getting Alpaca position: {str(e)}")
             raise
@@ -105,17 +193,8 @@ class AlpacaClient:
     async def get_positions(self) -> List[Dict]:
         """Get all open positions"""
         try:
-            positions = self.api.list_positions()
-            return [{
-                'symbol': pos.symbol,
-                'qty': int(pos.qty),
-                'avg_entry_price': Decimal(pos.avg_entry_price),
-                'market_value': Decimal(pos.market_value),
-                'unrealized_pl': Decimal(pos.unrealized_pl),
-                'current_price': Decimal(pos.current_price),
-                'lastday_price': Decimal(pos.lastday_price),
-                'change_today': Decimal(pos.change_today)
-            } for pos in positions]
+            positions = await self._request('GET', f'{self.base_url}/v2/positions', 'positions')
+            return [self._position(pos) for pos in positions]
         except Exception as e:
             logger.error(f"Error getting Alpaca positions: {str(e)}")
             raise
@@ -126,34 +205,140 @@ class AlpacaClient:
         timeframe: TimeFrame,
         start: Optional[str] = None,
         end: Optional[str] = None,
-        limit: int = 100
-    ) -> List[Dict]:
-        """Get historical bar data for a symbol"""
+        limit: int = 100,
+        output: str = 'dicts'
+    ):
+        """Get historical bar data for a symbol.
+
+        The first ``limit`` bars from ``start``; without it, the latest
+        ``limit`` bars. (Alpaca itself starts at the beginning of the current
+        day, so the request covers just enough trading sessions, like
+        ``get_multi_bars``.)
+
+        ``output`` picks the shape (see ``bar_store.format_bars``): 'dicts'
+        (Decimal prices per bar), or 'columns' / 'frame' with float64 values
+        and no per-bar objects.
+        """
         try:
-            bars = self.api.get_bars(
-                symbol,
-                timeframe,
-                start=start,
-                end=end,
-                limit=limit
-            ).df
-            
-            return [{
-                'timestamp': bar.name.isoformat(),
-                'open': Decimal(str(bar['open'])),
-                'high': Decimal(str(bar['high'])),
-                'low': Decimal(str(bar['low'])),
-                'close': Decimal(str(bar['close'])),
-                'volume': int(bar['volume'])
-            } for bar in bars.itertuples()]
+            latest = start is None
+            if latest:
+                start = get_market_calendar().history_start(timeframe, limit)
+            bars = []
+            page_token = None
+            while latest or len(bars) < limit:
+                page = await self._request('GET', f'{self.data_url}/v2/stocks/{symbol}/bars', 'bars', params={
+                    'timeframe': str(timeframe),
+                    'start': start,
+                    'end': end,
+                    'limit': 10000 if latest else min(limit - len(bars), 10000),
+                    'feed': self.data_feed,
+                    'page_token': page_token
+                })
+                bars.extend(page.get('bars') or [])
+                page_token = page.get('next_page_token')
+                if not page_token:
+                    break
+
+            return format_bars(*self._bar_columns(bars[-limit:] if latest else bars[:limit]), output)
         except Exception as e:
             logger.error(f"Error getting Alpaca bars: {str(e)}")
             raise
 
+    def _bar_columns(self, bars: List[Dict]) -> tuple:
+        """Timestamps and float64 columns of raw API bars"""
+        index = pd.to_datetime([bar['t'] for bar in bars], utc=True)
+        return index, {
+            field: np.fromiter((bar[key] for bar in bars), dtype=np.float64, count=len(bars))
+            for field, key in self.BAR_KEYS.items()
+        }
+
+    def _chunks(self, symbols: Sequence[str]) -> List[List[str]]:
+        symbols = sorted(set(symbols))
+        return [symbols[i:i + self.BATCH_SYMBOLS] for i in range(0, len(symbols), self.BATCH_SYMBOLS)]
+
+    async def _multi_bars_chunk(self, symbols: List[str], params: Dict) -> Dict[str, List[Dict]]:
+        bars: Dict[str, List[Dict]] = {}
+        page_token = None
+        while True:
+            page = await self._request('GET', f'{self.data_url}/v2/stocks/bars', 'bars',
+                                       params=dict(params, symbols=','.join(symbols), page_token=page_token))
+            for symbol, rows in (page.get('bars') or {}).items():
+                bars.setdefault(symbol, []).extend(rows)
+            page_token = page.get('next_page_token')
+            if not page_token:
+                return bars
+
+    async def get_multi_bars(
+        self,
+        symbols: Sequence[str],
+        timeframe: TimeFrame,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: int = 100
+    ) -> BarBatch:
+        """Latest ``limit`` bars of every symbol, from one paginated request per 100 symbols.
+
+        Without ``start`` the request covers just enough trading sessions for
+        ``limit`` bars. Symbols without bars have empty rows in the batch.
+        """
+        try:
+            params = {
+                'timeframe': str(timeframe),
+                'start': start if start is not None else get_market_calendar().history_start(timeframe, limit),
+                'end': end,
+                'limit': 10000,
+                'feed': self.data_feed
+            }
+            parts = {}
+            for chunk in await asyncio.gather(*(self._multi_bars_chunk(chunk, params) for chunk in self._chunks(symbols))):
+                parts.update(chunk)
+            return BarBatch.from_parts({
+                symbol: format_bars(*self._bar_columns(parts.get(symbol, [])[-limit:]), 'columns')
+                for symbol in set(symbols)
+            })
+        except Exception as e:
+            logger.error(f"Error getting Alpaca multi-symbol bars: {str(e)}")
+            raise
+
+    async def get_latest(self, symbols: Sequence[str]) -> pd.DataFrame:
+        """Latest trade and quote of every symbol from one snapshot request per 100 symbols.
+
+        Returns:
+            DataFrame: Indexed by symbol with ``LATEST_COLUMNS``; NaN/NaT where
+            the feed has no trade or quote
+        """
+        try:
+            snapshots = {}
+            for chunk in await asyncio.gather(*(
+                    self._request('GET', f'{self.data_url}/v2/stocks/snapshots', 'latest',
+                                  params={'symbols': ','.join(chunk), 'feed': self.data_feed})
+                    for chunk in self._chunks(symbols))):
+                snapshots.update(chunk or {})
+            symbols = sorted(set(symbols))
+            trades = [(snapshots.get(symbol) or {}).get('latestTrade') or {} for symbol in symbols]
+            quotes = [(snapshots.get(symbol) or {}).get('latestQuote') or {} for symbol in symbols]
+
+            def values(rows, key):
+                return np.fromiter((row.get(key, np.nan) for row in rows), dtype=np.float64, count=len(rows))
+
+            return pd.DataFrame({
+                'price': values(trades, 'p'),
+                'size': values(trades, 's'),
+                'trade_time': pd.to_datetime([trade.get('t') for trade in trades], utc=True),
+                'bid': values(quotes, 'bp'),
+                'bid_size': values(quotes, 'bs'),
+                'ask': values(quotes, 'ap'),
+                'ask_size': values(quotes, 'as'),
+                'quote_time': pd.to_datetime([quote.get('t') for quote in quotes], utc=True),
+            }, index=pd.Index(symbols, name='symbol'), columns=list(LATEST_COLUMNS))
+        except Exception as e:
+            logger.error(f"Error getting Alpaca latest trades and quotes: {str(e)}")
+            raise
+
     def close_all_positions(self) -> None:
         """Close all open positions"""
         try:
-            self.api.close_all_positions()
+            run_sync(self._request('DELETE', f'{self.base_url}/v2/positions', 'orders'))
         except Exception as e:
             logger.error(f"Error closing all positions: {str(e)}")
             raise
@@ -161,7 +346,80 @@ class AlpacaClient:
     def cancel_all_orders(self) -> None:
         """Cancel all open orders"""
         try:
-            self.api.cancel_all_orders()
+            run_sync(self._request('DELETE', f'{self.base_url}/v2/orders', 'orders'))
         except Exception as e:
             logger.error(f"Error canceling all orders: {str(e)}")
             raise
+
+
+_loop: Optional[tuple] = None  # (pid, event loop); a forked Celery worker starts its own
+_loop_lock = threading.Lock()
+
+
+def _client_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop[0] != os.getpid():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='alpaca-client-loop', daemon=True).start()
+            _loop = (os.getpid(), loop)
+        return _loop[1]
+
+
+def run_sync(coro):
+    """Run a coroutine on the process-wide client event loop and wait for its result.
+
+    Blocking callers all share this loop, so they share each client's
+    connection pool instead of opening a new one per call.
+    """
+    loop = _client_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError('run_sync() called from the client event loop; await the coroutine instead')
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+class SyncAlpacaClient:
+    """Blocking facade over an AlpacaClient (or a stand-in with its interface) for threads and Celery tasks"""
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else AlpacaClient()
+
+    @property
+    def api(self):
+        return self.client.api
+
+    def get_account(self) -> Dict:
+        return run_sync(self.client.get_account())
+
+    def place_order(self, symbol: str, qty: float, side: str, type: str = 'market', time_in_force: str = 'day',
+                    limit_price: Optional[float] = None, stop_price: Optional[float] = None) -> Dict:
+        return run_sync(self.client.place_order(symbol, qty, side, type=type, time_in_force=time_in_force,
+                                                limit_price=limit_price, stop_price=stop_price))
+
+    def get_position(self, symbol: str) -> Optional[Dict]:
+        return run_sync(self.client.get_position(symbol))
+
+    def get_positions(self) -> List[Dict]:
+        return run_sync(self.client.get_positions())
+
+    def get_bars(self, symbol: str, timeframe, start: Optional[str] = None, end: Optional[str] = None,
+                 limit: int = 100, output: str = 'dicts'):
+        return run_sync(self.client.get_bars(symbol, timeframe, start=start, end=end, limit=limit, output=output))
+
+    def get_multi_bars(self, symbols: Sequence[str], timeframe, start: Optional[str] = None, end: Optional[str] = None,
+                       limit: int = 100) -> BarBatch:
+        return run_sync(self.client.get_multi_bars(symbols, timeframe, start=start, end=end, limit=limit))
+
+    def get_latest(self, symbols: Sequence[str]) -> pd.DataFrame:
+        return run_sync(self.client.get_latest(symbols))
+
+    def close_all_positions(self) -> None:
+        self.client.close_all_positions()
+
+    def cancel_all_orders(self) -> None:
+        self.client.cancel_all_orders()
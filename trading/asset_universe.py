@@ -0,0 +1,243 @@
+"""Cached, indexed universe of broker assets.
+
+The Alpaca asset list (thousands of entries) is downloaded at most once per
+``max_age`` into a compact column table: one sorted symbol array, the asset
+class and exchange as small integer codes, and a boolean array per flag
+(tradable, shortable, fractionable, ...). The table is saved to disk so every
+process shares the daily download, and answers lookups and filter queries
+from memory; repeated queries are memoised until the next refresh.
+
+When the table is older than ``max_age`` it keeps being served while one
+background thread refreshes it.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FLAGS = ('tradable', 'shortable', 'fractionable', 'marginable', 'easy_to_borrow')
+
+
+class AssetTable(NamedTuple):
+    symbols: np.ndarray  # sorted, unicode
+    classes: np.ndarray  # codes into class_names
+    class_names: np.ndarray
+    exchanges: np.ndarray  # codes into exchange_names
+    exchange_names: np.ndarray
+    flags: Dict[str, np.ndarray]
+    loaded_at: float  # wall-clock time of the download
+
+    @classmethod
+    def from_assets(cls, assets: Iterable, loaded_at: Optional[float] = None) -> 'AssetTable':
+        """Build from Alpaca Asset entities or dicts with the same fields"""
+        def field(asset, name, default=None):
+            return asset.get(name, default) if isinstance(asset, dict) else getattr(asset, name, default)
+
+        frame = pd.DataFrame([{
+            'symbol': field(asset, 'symbol'),
+            'class': field(asset, 'class', 'us_equity'),
+            'exchange': field(asset, 'exchange', ''),
+            **{flag: bool(field(asset, flag, False)) for flag in FLAGS},
+        } for asset in assets], columns=['symbol', 'class', 'exchange', *FLAGS])
+        frame = frame.drop_duplicates('symbol', keep='last').sort_values('symbol')
+        classes = pd.Categorical(frame['class'].fillna(''))
+        exchanges = pd.Categorical(frame['exchange'].fillna(''))
+        return cls(
+            symbols=frame['symbol'].to_numpy(dtype=str),
+            classes=classes.codes.astype(np.int16),
+            class_names=np.asarray(classes.categories, dtype=str),
+            exchanges=exchanges.codes.astype(np.int16),
+            exchange_names=np.asarray(exchanges.categories, dtype=str),
+            flags={flag: frame[flag].to_numpy(dtype=bool) for flag in FLAGS},
+            loaded_at=loaded_at if loaded_at is not None else time.time(),
+        )
+
+
+def _alpaca_assets():
+    from .alpaca_client import AlpacaClient
+
+    return AlpacaClient().api.list_assets(status='active')
+
+
+class AssetUniverse:
+    """Daily-refreshed asset table with in-memory lookups.
+
+    Args:
+        path: File the table is shared through (.npz); None keeps it in memory only
+        max_age: Seconds before the table is refreshed
+        loader: Returns the active assets; defaults to Alpaca's list_assets
+    """
+    # Seconds between checks for a newer table once the current one is stale
+    RETRY_INTERVAL = 60
+
+    def __init__(self, path=None, max_age: float = 86400, loader: Optional[Callable[[], Iterable]] = None):
+        self.path = Path(path) if path is not None else None
+        self.max_age = max_age
+        self.loader = loader or _alpaca_assets
+        # (table, memoised queries), swapped as one value on refresh
+        self._current: Optional[tuple] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._next_check = 0.0
+
+    def _read_file(self) -> Optional[AssetTable]:
+        if self.path is None or not self.path.exists():
+            return None
+        try:
+            with np.load(self.path) as data:
+                return AssetTable(
+                    symbols=data['symbols'], classes=data['classes'], class_names=data['class_names'],
+                    exchanges=data['exchanges'], exchange_names=data['exchange_names'],
+                    flags={flag: data[flag] for flag in FLAGS}, loaded_at=float(data['loaded_at']),
+                )
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable asset table {self.path}: {str(e)}")
+            return None
+
+    def _write_file(self, table: AssetTable):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.assets-', suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, symbols=table.symbols, classes=table.classes, class_names=table.class_names,
+                     exchanges=table.exchanges, exchange_names=table.exchange_names,
+                     loaded_at=table.loaded_at, **table.flags)
+        os.replace(tmp, self.path)
+
+    def _install(self, table: AssetTable):
+        self._current = (table, {})
+
+    def refresh(self) -> int:
+        """Download the asset list now.
+
+        Returns:
+            int: Number of assets in the table
+        """
+        table = AssetTable.from_assets(self.loader())
+        self._write_file(table)
+        self._install(table)
+        logger.info(f"Asset universe refreshed: {len(table.symbols)} assets")
+        return len(table.symbols)
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Asset universe refresh failed, serving the previous table: {str(e)}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='asset-universe-refresh', daemon=True).start()
+
+    def _state(self) -> tuple:
+        current = self._current
+        if current is None:
+            table = self._read_file()
+            if table is None:
+                self.refresh()
+            else:
+                self._install(table)
+            current = self._current
+        table = current[0]
+        if time.time() - table.loaded_at > self.max_age and time.monotonic() >= self._next_check:
+            self._next_check = time.monotonic() + self.RETRY_INTERVAL
+            # Another process may already have refreshed the shared file
+            newer = self._read_file()
+            if newer is not None and newer.loaded_at > table.loaded_at:
+                self._install(newer)
+                current = self._current
+            else:
+                self._refresh_in_background()
+        return current
+
+    def table(self) -> AssetTable:
+        """The current table, loading or downloading it on first use"""
+        return self._state()[0]
+
+    def _row(self, table: AssetTable, symbol: str) -> int:
+        i = int(np.searchsorted(table.symbols, symbol))
+        return i if i < len(table.symbols) and table.symbols[i] == symbol else -1
+
+    def __contains__(self, symbol: str) -> bool:
+        return self._row(self.table(), symbol) >= 0
+
+    def __len__(self) -> int:
+        return len(self.table().symbols)
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """Class, exchange and flags of one asset, or None when it is not listed"""
+        table = self.table()
+        i = self._row(table, symbol)
+        if i < 0:
+            return None
+        return {
+            'symbol': symbol,
+            'class': str(table.class_names[table.classes[i]]),
+            'exchange': str(table.exchange_names[table.exchanges[i]]),
+            **{flag: bool(values[i]) for flag, values in table.flags.items()},
+        }
+
+    def symbols(self, asset_class: Optional[str] = None, exchange: Optional[str] = None,
+                limit: Optional[int] = None, **flags: bool) -> List[str]:
+        """Symbols matching every given filter, in symbol order.
+
+        Example: ``symbols(asset_class='us_equity', tradable=True, shortable=True, limit=10)``
+        """
+        unknown = set(flags) - set(FLAGS)
+        if unknown:
+            raise ValueError(f"Unknown asset flags: {sorted(unknown)}")
+        table, queries = self._state()
+        key = (asset_class, exchange, limit, tuple(sorted(flags.items())))
+        cached = queries.get(key)
+        if cached is not None:
+            return cached
+        mask = np.ones(len(table.symbols), dtype=bool)
+        for value, names, codes in ((asset_class, table.class_names, table.classes),
+                                    (exchange, table.exchange_names, table.exchanges)):
+            if value is not None:
+                matches = np.flatnonzero(names == value)
+                mask &= codes == (matches[0] if len(matches) else -2)
+        for flag, wanted in flags.items():
+            mask &= table.flags[flag] == bool(wanted)
+        result = table.symbols[mask][:limit].tolist()
+        queries[key] = result
+        return result
+
+    def frame(self) -> pd.DataFrame:
+        """The whole table, indexed by symbol"""
+        table = self.table()
+        return pd.DataFrame({
+            'class': table.class_names[table.classes],
+            'exchange': table.exchange_names[table.exchanges],
+            **table.flags,
+        }, index=pd.Index(table.symbols, name='symbol'))
+
+
+_universe = None
+_universe_lock = threading.Lock()
+
+
+def get_asset_universe() -> AssetUniverse:
+    """Process-wide asset universe shared through settings.ASSET_UNIVERSE_PATH"""
+    global _universe
+    with _universe_lock:
+        if _universe is None:
+            from django.conf import settings
+
+            _universe = AssetUniverse(settings.ASSET_UNIVERSE_PATH, max_age=settings.ASSET_UNIVERSE_MAX_AGE)
+        return _universe
@@ -1,26 +1,40 @@
+import asyncio
 import logging
 import threading
-import time
 from decimal import Decimal
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 from django.utils import timezone
+from asgiref.sync import sync_to_async
 from alpaca_trade_api.rest import TimeFrame
 
 from .models import Trade, AccountBalance, UserProfile
-from .alpaca_client import AlpacaClient
-from .ai_trading import make_trade_prediction, train_model
+from .alpaca_client import AlpacaClient, SyncAlpacaClient, run_sync
+from .ai_trading import make_trade_prediction, train_model_cached
+from .indicator_cache import cached_state_values
+from .bar_store import AV_COLUMNS, get_bar_store
+from .market_data import refresh_alpaca_bars
+from .resample import resample_store
+from .providers import build_router
+from .market_calendar import get_market_calendar
+from .asset_universe import get_asset_universe
+from .account_book import get_account_book
 
 logger = logging.getLogger(__name__)
 
 class AutomatedTrading:
-    def __init__(self, user_profile: UserProfile):
+    def __init__(self, user_profile: UserProfile, alpaca=None, market_data=None, assets=None, account_book=None):
         self.user_profile = user_profile
         self.is_running = False
         self.trading_thread = None
-        self.alpaca = AlpacaClient()
+        self.alpaca = alpaca if alpaca is not None else AlpacaClient()
+        self.market_data = market_data  # ProviderRouter, built from settings on first use
+        self.assets = assets  # AssetUniverse, the shared one by default
+        self.account_book = account_book  # AccountBook of the broker account, shared by default
+        self._stopped = threading.Event()  # wakes the trading loop early on stop()
         self.model = None  # Will store trained model
+        self.training_bars = 1000  # Hourly SPY bars the model is trained on
         self.max_position_size = Decimal('1000.00')  # Maximum position size in USD
         self.risk_per_trade = Decimal('0.01')  # 1% risk per trade
         self.stop_loss_percent = Decimal('0.02')  # 2% stop loss
@@ -34,17 +48,29 @@ class AutomatedTrading:
         # Get initial data and train model
         try:
             # Get historical data for training
-            training_data = self.alpaca.get_bars(
-                'SPY',  # Use SPY (S&P 500 ETF) for training
-                TimeFrame.Hour,
-                limit=1000  # Get more historical data for training
-            )
+            # Use SPY (S&P 500 ETF) for training; only minute bars after the stored ones
+            # are downloaded and the hourly bars are derived from them locally
+            store = get_bar_store()
+            if store.last_timestamp('SPY', '1h') is None:
+                # 10000 minute bars make only a few hundred hourly ones, so a cold store
+                # is seeded with hourly bars from the sessions the training window spans
+                start = get_market_calendar().history_start(TimeFrame.Hour, self.training_bars)
+                run_sync(refresh_alpaca_bars(self.alpaca, store, 'SPY', TimeFrame.Hour, '1h', limit=10000, start=start))
+            run_sync(refresh_alpaca_bars(self.alpaca, store, 'SPY', TimeFrame.Minute, '1min', limit=10000))
+            resample_store(store, 'SPY', timeframes=['1h'])
+            training_data = store.read('SPY', '1h', limit=self.training_bars)
             
             # Train the model
-            self.model = train_model(training_data)
+            self.model = train_model_cached(training_data)
             logger.info("Successfully trained trading model")
             
+            # Keep the account book current from fills pushed by the broker
+            stream = getattr(self.alpaca, 'stream', None)
+            if stream is not None:
+                self._get_account_book().follow(stream)
+
             self.is_running = True
+            self._stopped.clear()
             self.trading_thread = threading.Thread(target=self._trading_loop)
             self.trading_thread.daemon = True
             self.trading_thread.start()
@@ -54,9 +80,29 @@ class AutomatedTrading:
             logger.error(f"Failed to start automated trading: {str(e)}")
             return False
 
+    def _get_market_data(self):
+        if self.market_data is None:
+            self.market_data = build_router(alpaca=self.alpaca)
+        return self.market_data
+
+    def _get_assets(self):
+        if self.assets is None:
+            self.assets = get_asset_universe()
+        return self.assets
+
+    def _get_account_book(self):
+        if self.account_book is None:
+            self.account_book = get_account_book(self.alpaca)
+        return self.account_book
+
+    def _sleep(self, seconds: float):
+        """Sleep in the trading loop, returning early when trading is stopped"""
+        self._stopped.wait(seconds)
+
     def stop(self):
         """Stop automated trading"""
         self.is_running = False
+        self._stopped.set()
         try:
             # Cancel all pending orders
             self.alpaca.cancel_all_orders()
@@ -68,7 +114,7 @@ class AutomatedTrading:
     async def _check_account_status(self) -> bool:
         """Check if account is ready for trading"""
         try:
-            account = await self.alpaca.get_account()
+            account = await self._get_account_book().account()
             
             # Check if account has sufficient balance
             if Decimal(account['cash']) < Decimal('20.00'):
@@ -90,14 +136,13 @@ class AutomatedTrading:
             logger.error(f"Error checking account status: {str(e)}")
             return False
 
-    async def _execute_trade(self, symbol: str, prediction: Dict) -> Optional[Dict]:
-        """Execute a trade based on prediction"""
+    async def _execute_trade(self, symbol: str, prediction: Dict, price: Optional[float] = None) -> Optional[Dict]:
+        """Execute a trade based on prediction, at ``price`` when the caller already has the latest one"""
         try:
-            # Get current position
-            position = await self.alpaca.get_position(symbol)
-            
-            # Get account info for position sizing
-            account = await self.alpaca.get_account()
+            # Get current position and account info for position sizing from the local book
+            book = self._get_account_book()
+            position = await book.position(symbol)
+            account = await book.account()
             portfolio_value = Decimal(account['portfolio_value'])
             
             # Calculate position size (1% risk per trade)
@@ -106,9 +151,11 @@ class AutomatedTrading:
                 self.max_position_size
             )
             
-            # Get current price
-            bars = await self.alpaca.get_bars(symbol, TimeFrame.Minute, limit=1)
-            current_price = bars[-1]['close']
+            # Get current price; Decimal from here on, for the order and the trade row
+            if price is None:
+                bars = await self.alpaca.get_bars(symbol, TimeFrame.Minute, limit=1, output='columns')
+                price = bars['close'][-1]
+            current_price = Decimal(repr(float(price)))
             
             # Calculate quantity
             qty = int(position_size / current_price)
@@ -136,27 +183,22 @@ class AutomatedTrading:
                 limit_price=float(current_price),
                 stop_price=float(stop_loss)
             )
+            book.record_order(order, price=current_price)
             
-            # Record the trade
-            trade = Trade.objects.create(
-                user=self.user_profile,
+            # The ORM is synchronous; keep it off the event loop
+            trade_id = await sync_to_async(self._record_trade)(
                 symbol=symbol,
-                trade_type=prediction['action'].upper(),
-                amount=position_size,
+                action=prediction['action'],
+                position_size=position_size,
                 price=current_price,
-                quantity=qty,
-                status='EXECUTED',
+                qty=qty,
                 stop_loss=stop_loss,
-                take_profit=take_profit
+                take_profit=take_profit,
+                cash=Decimal(account['cash'])
             )
             
-            # Update account balance
-            account_balance = AccountBalance.objects.get(user=self.user_profile)
-            account_balance.balance_usd = Decimal(account['cash'])
-            account_balance.save()
-            
             return {
-                'trade_id': trade.id,
+                'trade_id': trade_id,
                 'order_id': order['id'],
                 'symbol': symbol,
                 'action': prediction['action'],
@@ -170,59 +212,111 @@ class AutomatedTrading:
             logger.error(f"Error executing trade: {str(e)}")
             return None
 
+    def _record_trade(self, symbol: str, action: str, position_size: Decimal, price: Decimal, qty: int,
+                      stop_loss: Decimal, take_profit: Decimal, cash: Decimal):
+        """Persist an executed trade and the account cash; returns the trade id"""
+        trade = Trade.objects.create(
+            user=self.user_profile,
+            symbol=symbol,
+            trade_type=action.upper(),
+            amount=position_size,
+            price=price,
+            quantity=qty,
+            status='EXECUTED',
+            stop_loss=stop_loss,
+            take_profit=take_profit
+        )
+        
+        # Update account balance
+        account_balance = AccountBalance.objects.get(user=self.user_profile)
+        account_balance.balance_usd = cash
+        account_balance.save()
+        return trade.id
+
+    async def _cycle_data(self, symbols: List[str]) -> Tuple[Dict, Dict]:
+        """Hourly bars (Alpha Vantage layout) and latest trade prices of ``symbols``.
+
+        One batched bars request and one snapshot request cover every symbol;
+        symbols the batch misses fall back to the provider router one by one.
+        """
+        bars, prices = {}, {}
+        try:
+            batch, latest = await asyncio.gather(
+                self.alpaca.get_multi_bars(symbols, TimeFrame.Hour, limit=100),
+                self.alpaca.get_latest(symbols)
+            )
+            for symbol in symbols:
+                frame = batch.bars(symbol, output='frame')
+                if not frame.empty:
+                    bars[symbol] = frame.rename(columns=AV_COLUMNS)
+            prices = latest['price'].dropna().to_dict()
+        except Exception as e:
+            logger.warning(f"Batch market data request failed, fetching symbols one by one: {str(e)}")
+        for symbol in symbols:
+            if symbol not in bars:
+                bars[symbol] = await self._get_market_data().get_bars(symbol, '1h', limit=100)
+        return bars, prices
+
     def _trading_loop(self):
-        """Main trading loop"""
+        """Main trading loop; coroutines run on the shared client loop and reuse its connections"""
         while self.is_running:
             try:
-                # Check if market is open
-                clock = self.alpaca.api.get_clock()
-                if not clock.is_open:
-                    logger.info("Market is closed")
-                    time.sleep(60)
+                # Check if market is open; while closed, sleep until the next session
+                wait = get_market_calendar().seconds_until_open()
+                if wait > 0:
+                    logger.info(f"Market is closed, sleeping {wait / 3600:.1f}h until the next session")
+                    self._sleep(wait)
                     continue
 
                 # Check account status
-                if not self._check_account_status():
+                if not run_sync(self._check_account_status()):
                     logger.warning("Account not ready for trading")
-                    time.sleep(60)
+                    self._sleep(60)
                     continue
 
-                # Get tradeable assets
-                assets = self.alpaca.api.list_assets(status='active', asset_class='us_equity')
-                tradeable_symbols = [asset.symbol for asset in assets if asset.tradable]
+                # Get tradeable assets from the daily-refreshed asset table
+                tradeable_symbols = self._get_assets().symbols(asset_class='us_equity', tradable=True, limit=10)
+
+                # Historical bars and latest prices for every symbol in a couple of round trips
+                cycle_bars, prices = run_sync(self._cycle_data(tradeable_symbols))
 
                 # Analyze each asset
-                for symbol in tradeable_symbols[:10]:  # Limit to top 10 for now
-                    # Get historical data
-                    bars = self.alpaca.get_bars(
+                for symbol in tradeable_symbols:  # Limit to top 10 for now
+                    bars = cycle_bars[symbol]
+                    
+                    # Fold new bars into the running indicators for this symbol
+                    indicators = cached_state_values(
                         symbol,
-                        TimeFrame.Hour,
-                        limit=100
+                        '1h',
+                        bars['4. close'].to_numpy(),
+                        bars.index,
+                        rsi_smoothing='simple'
                     )
-                    
+
                     # Make prediction using trained model
                     if self.model is not None:
-                        prediction = make_trade_prediction(self.model, bars)
+                        prediction = make_trade_prediction(self.model, bars, indicators=indicators)
                         
                         if prediction['confidence'] >= 0.7:  # Only trade with high confidence
-                            trade_result = self._execute_trade(symbol, prediction)
+                            trade_result = run_sync(self._execute_trade(symbol, prediction, price=prices.get(symbol)))
                             if trade_result:
                                 logger.info(f"Executed trade: {trade_result}")
                     else:
                         logger.warning("No trained model available")
 
                 # Sleep for a minute before next iteration
-                time.sleep(60)
+                self._sleep(60)
 
             except Exception as e:
                 logger.error(f"Error in trading loop: {str(e)}")
-                time.sleep(60)
+                self._sleep(60)
 
     def get_status(self) -> Dict:
         """Get current trading status"""
         try:
-            account = self.alpaca.api.get_account()
-            positions = self.alpaca.api.list_positions()
+            broker = SyncAlpacaClient(self.alpaca)
+            account = broker.get_account()
+            positions = broker.get_positions()
             
             # Get today's trades
             today = timezone.now().date()
@@ -232,13 +326,13 @@ class AutomatedTrading:
             ).count()
             
             # Calculate today's profit/loss
-            total_pl = sum(Decimal(pos.unrealized_pl) for pos in positions)
+            total_pl = sum(pos['unrealized_pl'] for pos in positions)
             
             return {
                 'is_trading': self.is_running,
-                'account_value': Decimal(account.portfolio_value),
-                'buying_power': Decimal(account.buying_power),
-                'cash': Decimal(account.cash),
+                'account_value': account['portfolio_value'],
+                'buying_power': account['buying_power'],
+                'cash': account['cash'],
                 'trades_today': trades_today,
                 'total_positions': len(positions),
                 'unrealized_pl': total_pl,
@@ -0,0 +1,395 @@
+"""Local columnar OHLCV bar store.
+
+Bars are partitioned by symbol and timeframe. Each partition is a directory
+holding one raw little-endian file per column (``timestamp.i8`` nanoseconds,
+``open.f8`` ... ``volume.f8``) plus ``meta.json`` with the committed row
+count and timezone:
+
+    <BAR_STORE_DIR>/AAPL/1min/timestamp.i8
+    <BAR_STORE_DIR>/AAPL/1min/close.f8
+    <BAR_STORE_DIR>/AAPL/1min/meta.json
+
+Ingestion is append-only: only bars newer than the last stored timestamp are
+written (``merge`` may also replace a short stored tail with revised bars),
+and the row count in ``meta.json`` is updated last, so a crash in the middle
+of a write leaves the committed rows intact. Reads memory-map
+the column files, so range reads are slices of the page cache with no
+parsing or copying.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# Layout returned by BarStore.read, matching Alpha Vantage frames used by the strategies
+AV_COLUMNS = {'open': '1. open', 'high': '2. high', 'low': '3. low', 'close': '4. close', 'volume': '5. volume'}
+
+# Column names accepted on ingestion: Alpha Vantage, Alpaca, yfinance
+_ALIASES = {field: (AV_COLUMNS[field], field, field.capitalize()) for field in FIELDS}
+
+
+def to_bar_frame(bars) -> pd.DataFrame:
+    """Normalise bars to an oldest-first frame with open/high/low/close/volume columns.
+
+    Accepts Alpha Vantage, Alpaca (``df``) or yfinance frames, and the list of
+    bar dicts returned by ``AlpacaClient.get_bars``. Duplicate timestamps keep
+    the last bar.
+    """
+    if not isinstance(bars, pd.DataFrame):
+        bars = pd.DataFrame(list(bars))
+        if 'timestamp' in bars:
+            bars = bars.set_index(pd.to_datetime(bars.pop('timestamp')))
+    frame = pd.DataFrame(index=pd.DatetimeIndex(bars.index))
+    for field in FIELDS:
+        column = next((name for name in _ALIASES[field] if name in bars), None)
+        if column is None and field != 'volume':
+            raise KeyError(f"No {field} column in bar data")
+        frame[field] = bars[column].to_numpy(dtype=np.float64) if column is not None else np.nan
+    frame = frame.sort_index(kind='stable')
+    return frame[~frame.index.duplicated(keep='last')]
+
+
+# Columns of the get_latest broker methods: last trade, then the top of the book
+LATEST_COLUMNS = ('price', 'size', 'trade_time', 'bid', 'bid_size', 'ask', 'ask_size', 'quote_time')
+
+# Output modes of the get_bars broker methods (AlpacaClient and its stand-ins)
+BAR_OUTPUTS = ('dicts', 'columns', 'frame')
+
+
+def format_bars(index: pd.DatetimeIndex, columns: Dict[str, np.ndarray], output: str = 'dicts'):
+    """Oldest-first bars in one of the ``get_bars`` output modes.
+
+    Args:
+        index: Bar timestamps; timezone-aware ones are returned in UTC
+        columns: float64 open/high/low/close/volume arrays
+        output: 'dicts' - one dict per bar with Decimal prices (the default);
+            'columns' - the float64 arrays plus 'timestamp' (datetime64[ns],
+            UTC wall time like ``BarStore.read_columns``);
+            'frame' - a DataFrame in the ``to_bar_frame`` layout
+    """
+    if output not in BAR_OUTPUTS:
+        raise ValueError(f"Unknown bar output {output!r}, expected one of {BAR_OUTPUTS}")
+    if index.tz is not None:
+        index = index.tz_convert('UTC')
+    if output == 'frame':
+        return pd.DataFrame({field: columns[field] for field in FIELDS}, index=index)
+    if output == 'columns':
+        stamps = index.tz_localize(None) if index.tz is not None else index
+        return {'timestamp': stamps.as_unit('ns').to_numpy(), **{field: columns[field] for field in FIELDS}}
+    # Decimal only here, for callers that still want per-bar objects
+    rows = zip(index, *(columns[field].tolist() for field in FIELDS))
+    return [{
+        'timestamp': timestamp.isoformat(),
+        'open': Decimal(repr(open_)),
+        'high': Decimal(repr(high)),
+        'low': Decimal(repr(low)),
+        'close': Decimal(repr(close)),
+        'volume': int(volume)
+    } for timestamp, open_, high, low, close, volume in rows]
+
+
+def _lock_file(lock) -> None:
+    """Block until this process holds the exclusive lock on an open file"""
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return
+    lock.seek(0)
+    while True:
+        try:
+            # LK_LOCK gives up after about 10 seconds; keep waiting like flock does
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(lock) -> None:
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    else:
+        lock.seek(0)
+        msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class BarBatch(NamedTuple):
+    """Bars of several symbols in shared flat columns.
+
+    Rows of ``symbols[i]`` are ``offsets[i]:offsets[i + 1]``, oldest first.
+    ``columns`` holds 'timestamp' (datetime64[ns], UTC wall time) and the
+    float64 OHLCV arrays, like ``get_bars(output='columns')``.
+    """
+    symbols: np.ndarray  # sorted
+    offsets: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+    @classmethod
+    def from_parts(cls, parts: Dict[str, Dict[str, np.ndarray]]) -> 'BarBatch':
+        """Concatenate per-symbol columns (``get_bars(output='columns')`` results)"""
+        symbols = sorted(parts)
+        lengths = [len(parts[symbol]['close']) for symbol in symbols]
+        columns = {'timestamp': np.empty(0, dtype='datetime64[ns]'), **{field: np.empty(0) for field in FIELDS}}
+        if symbols:
+            columns = {name: np.concatenate([parts[symbol][name] for symbol in symbols]) for name in columns}
+        return cls(np.array(symbols, dtype=str), np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64), columns)
+
+    def _rows(self, symbol: str) -> slice:
+        i = int(np.searchsorted(self.symbols, symbol))
+        if i == len(self.symbols) or self.symbols[i] != symbol:
+            return slice(0, 0)
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def bars(self, symbol: str, output: str = 'columns'):
+        """One symbol's bars (none when it is not in the batch) in a ``format_bars`` output mode"""
+        rows = self._rows(symbol)
+        index = pd.DatetimeIndex(self.columns['timestamp'][rows]).tz_localize('UTC')
+        return format_bars(index, {field: self.columns[field][rows] for field in FIELDS}, output)
+
+    def last(self, field: str = 'close') -> pd.Series:
+        """Latest ``field`` value per symbol, NaN for symbols without bars"""
+        ends = self.offsets[1:]
+        present = ends > self.offsets[:-1]
+        values = np.full(len(self.symbols), np.nan)
+        values[present] = self.columns[field][ends[present] - 1]
+        return pd.Series(values, index=self.symbols)
+
+
+class BarStore:
+    """Append-only, memory-mapped column files per (symbol, timeframe)"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._maps = {}  # (symbol, timeframe) -> (rows, {column: memmap})
+        self._lock = threading.Lock()
+
+    def _dir(self, symbol: str, timeframe: str) -> Path:
+        if '/' in symbol or '/' in timeframe or symbol.startswith('.'):
+            raise ValueError(f"Invalid partition {symbol}/{timeframe}")
+        return self.root / symbol / timeframe
+
+    @staticmethod
+    def _column_path(directory: Path, column: str) -> Path:
+        return directory / (f'{column}.i8' if column == 'timestamp' else f'{column}.f8')
+
+    def _meta(self, directory: Path) -> Dict:
+        try:
+            return json.loads((directory / 'meta.json').read_text())
+        except FileNotFoundError:
+            return {'rows': 0, 'tz': None}
+
+    @contextmanager
+    def _writer(self, directory: Path):
+        """Exclusive lock across processes for appends to one partition"""
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / '.lock', 'w') as lock:
+            _lock_file(lock)
+            try:
+                yield
+            finally:
+                _unlock_file(lock)
+
+    def _stamps(self, frame: pd.DataFrame, meta: Dict, partition: str):
+        """UTC nanosecond timestamps of ``frame`` and the partition timezone"""
+        index = frame.index
+        tz = meta['tz']
+        if meta['rows'] == 0:
+            tz = str(index.tz) if index.tz is not None else None
+        elif (index.tz is None) != (tz is None):
+            raise ValueError(f"Timezone of new bars does not match {partition} (stored tz={tz})")
+        stamps = (index.tz_convert('UTC').tz_localize(None) if index.tz is not None else index).as_unit('ns').asi8
+        return stamps, tz
+
+    def _read_stamps(self, directory: Path, start: int, stop: int) -> np.ndarray:
+        return np.fromfile(self._column_path(directory, 'timestamp'), dtype='<i8', count=stop - start, offset=start * 8)
+
+    def _read_values(self, directory: Path, field: str, start: int, stop: int) -> np.ndarray:
+        return np.fromfile(self._column_path(directory, field), dtype='<f8', count=stop - start, offset=start * 8)
+
+    def _write_rows(self, directory: Path, position: int, stamps: np.ndarray, frame: pd.DataFrame, tz: Optional[str]):
+        """Write rows starting at ``position`` and commit the new row count"""
+        columns = {'timestamp': stamps.astype('<i8')}
+        columns.update({field: frame[field].to_numpy(dtype='<f8') for field in FIELDS})
+        for column, values in columns.items():
+            path = self._column_path(directory, column)
+            # Bytes past the committed rows (left by an interrupted write) are simply overwritten
+            with open(path, 'r+b' if path.exists() else 'w+b') as f:
+                f.seek(position * 8)
+                f.write(values.tobytes())
+        self._write_meta(directory, {'rows': position + len(stamps), 'tz': tz})
+
+    def append(self, symbol: str, timeframe: str, bars) -> int:
+        """Append bars newer than the last stored one.
+
+        Returns:
+            int: Number of bars written
+        """
+        frame = to_bar_frame(bars)
+        directory = self._dir(symbol, timeframe)
+        with self._writer(directory):
+            meta = self._meta(directory)
+            rows = meta['rows']
+            stamps, tz = self._stamps(frame, meta, f'{symbol}/{timeframe}')
+            if rows:
+                keep = stamps > self._read_stamps(directory, rows - 1, rows)[0]
+                frame, stamps = frame[keep], stamps[keep]
+            if not len(stamps):
+                return 0
+            self._write_rows(directory, rows, stamps, frame, tz)
+        return len(stamps)
+
+    def merge(self, symbol: str, timeframe: str, bars, max_rewrite: int = 1000) -> int:
+        """Merge a refresh into the partition.
+
+        Bars newer than the stored ones are appended. Bars that overlap the
+        last ``max_rewrite`` stored rows replace them, since a feed's newest
+        bar is often still forming when first stored; stored bars missing from
+        the refresh are kept. Anything older is ignored, so history further
+        back is never rewritten.
+
+        Returns:
+            int: Number of bars added to the partition
+        """
+        frame = to_bar_frame(bars)
+        directory = self._dir(symbol, timeframe)
+        with self._writer(directory):
+            meta = self._meta(directory)
+            rows = meta['rows']
+            stamps, tz = self._stamps(frame, meta, f'{symbol}/{timeframe}')
+            if not len(stamps):
+                return 0
+            if rows == 0:
+                self._write_rows(directory, 0, stamps, frame, tz)
+                return len(stamps)
+
+            tail_start = max(rows - max_rewrite, 0)
+            tail = self._read_stamps(directory, tail_start, rows)
+            keep = stamps >= tail[0]
+            if not keep.any():
+                return 0
+            position = tail_start + int(np.searchsorted(tail, stamps[keep][0], side='left'))
+
+            stored = pd.DataFrame(
+                {field: self._read_values(directory, field, position, rows) for field in FIELDS},
+                index=self._read_stamps(directory, position, rows),
+            )
+            incoming = pd.DataFrame(frame[keep].to_numpy(), columns=FIELDS, index=stamps[keep])
+            merged = pd.concat([stored, incoming])
+            merged = merged[~merged.index.duplicated(keep='last')].sort_index(kind='stable')
+
+            if position < rows:
+                # Uncommit the tail first so readers never see half-written rows
+                self._write_meta(directory, {'rows': position, 'tz': tz})
+            self._write_rows(directory, position, merged.index.to_numpy(), merged, tz)
+        return position + len(merged) - rows
+
+    @staticmethod
+    def _write_meta(directory: Path, meta: Dict):
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.meta-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, directory / 'meta.json')
+
+    def _columns(self, symbol: str, timeframe: str):
+        directory = self._dir(symbol, timeframe)
+        meta = self._meta(directory)
+        rows = meta['rows']
+        key = (symbol, timeframe)
+        with self._lock:
+            cached = self._maps.get(key)
+            if cached is not None and cached[0] == rows:
+                return cached[1], meta
+            if rows == 0:
+                maps = {'timestamp': np.zeros(0, dtype='<i8'), **{field: np.zeros(0) for field in FIELDS}}
+            else:
+                maps = {
+                    column: np.memmap(self._column_path(directory, column), dtype='<i8' if column == 'timestamp' else '<f8',
+                                      mode='r', shape=(rows,))
+                    for column in ('timestamp',) + FIELDS
+                }
+            self._maps[key] = (rows, maps)
+        return maps, meta
+
+    @staticmethod
+    def _to_ns(value, tz: Optional[str]) -> int:
+        stamp = pd.Timestamp(value)
+        if tz is not None:
+            stamp = (stamp.tz_localize(tz) if stamp.tzinfo is None else stamp).tz_convert('UTC').tz_localize(None)
+        elif stamp.tzinfo is not None:
+            stamp = stamp.tz_localize(None)
+        return stamp.as_unit('ns').value
+
+    def read_columns(self, symbol: str, timeframe: str, start=None, end=None, limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Zero-copy column views for bars with start <= timestamp <= end.
+
+        Returns:
+            dict: 'timestamp' (datetime64[ns], UTC when the partition is
+            timezone-aware) and the float64 OHLCV columns, as read-only
+            memory-mapped slices. ``limit`` keeps the most recent bars.
+        """
+        maps, meta = self._columns(symbol, timeframe)
+        stamps = maps['timestamp']
+        lo = int(np.searchsorted(stamps, self._to_ns(start, meta['tz']), side='left')) if start is not None else 0
+        hi = int(np.searchsorted(stamps, self._to_ns(end, meta['tz']), side='right')) if end is not None else len(stamps)
+        if limit is not None:
+            lo = max(lo, hi - limit)
+        columns = {column: values[lo:hi] for column, values in maps.items()}
+        columns['timestamp'] = columns['timestamp'].view('datetime64[ns]')
+        return columns
+
+    def read(self, symbol: str, timeframe: str, start=None, end=None, limit: Optional[int] = None) -> pd.DataFrame:
+        """Bars as an oldest-first DataFrame in the Alpha Vantage column layout"""
+        columns = self.read_columns(symbol, timeframe, start, end, limit)
+        index = pd.DatetimeIndex(columns.pop('timestamp'))
+        tz = self._meta(self._dir(symbol, timeframe))['tz']
+        if tz is not None:
+            index = index.tz_localize('UTC').tz_convert(tz)
+        return pd.DataFrame({AV_COLUMNS[field]: values for field, values in columns.items()}, index=index)
+
+    def last_timestamp(self, symbol: str, timeframe: str) -> Optional[pd.Timestamp]:
+        """Timestamp of the newest stored bar, or None for an empty partition"""
+        directory = self._dir(symbol, timeframe)
+        meta = self._meta(directory)
+        if not meta['rows']:
+            return None
+        value = self._read_stamps(directory, meta['rows'] - 1, meta['rows'])[0]
+        stamp = pd.Timestamp(int(value))
+        return stamp.tz_localize('UTC').tz_convert(meta['tz']) if meta['tz'] else stamp
+
+    def partitions(self) -> List[Dict]:
+        """Stored (symbol, timeframe) partitions with their row counts"""
+        return [
+            {'symbol': meta_path.parent.parent.name, 'timeframe': meta_path.parent.name, **json.loads(meta_path.read_text())}
+            for meta_path in sorted(self.root.glob('*/*/meta.json'))
+        ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bar_store() -> BarStore:
+    """Process-wide bar store rooted at settings.BAR_STORE_DIR"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            from django.conf import settings
+
+            _store = BarStore(settings.BAR_STORE_DIR)
+        return _store
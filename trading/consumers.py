@@ -1,12 +1,35 @@
 import json
+import math
+import re
+from datetime import timedelta
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.db.models import Sum
 from django.utils import timezone
-from asgiref.sync import database_sync_to_async
+from channels.db import database_sync_to_async
 from .models import Trade
-import yfinance as yf
-import numpy as np
-import asyncio
+from .market_calendar import get_market_calendar
+from .market_hub import CLIENTS_GROUP, HUB_GROUP, symbol_group
+
+# Channel layer group names allow ASCII letters, digits, '.', '-' and '_'
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9][A-Z0-9.\-]{0,19}$')
+
+
+def _market_json(data):
+    """JSON for a market message, with NaN and infinities (warm-up indicators) as null.
+
+    ``json.dumps`` would emit bare ``NaN``, which the browser's ``JSON.parse`` rejects.
+    """
+    def finite(value):
+        if isinstance(value, float):
+            return value if math.isfinite(value) else None
+        if isinstance(value, dict):
+            return {key: finite(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [finite(item) for item in value]
+        return value
+
+    return json.dumps(finite(data), allow_nan=False)
 
 class TradeConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -38,46 +61,106 @@ class TradeConsumer(AsyncWebsocketConsumer):
         }))
 
 class AutomatedTradingConsumer(AsyncWebsocketConsumer):
+    """Trading status for one user plus market updates for the symbols they watch.
+
+    Clients send {"action": "subscribe" | "unsubscribe", "symbol": "AAPL"};
+    the default symbols (or ?symbols=AAPL,MSFT) are subscribed on connect.
+    Market updates come from the market-data hub, which publishes each bar
+    once to the symbol's group, so no per-connection polling is needed.
+    """
+    DEFAULT_SYMBOLS = ('AAPL',)
+    MAX_SYMBOLS = 20
+
     async def connect(self):
         self.user = self.scope["user"]
+        self.symbols = set()
         if not self.user.is_authenticated:
             await self.close()
             return
 
         self.room_name = f"auto_trading_{self.user.id}"
         self.room_group_name = f"auto_trading_group_{self.user.id}"
-        self.update_task = None
 
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
+        # Re-announce our symbols when the hub restarts
+        await self.channel_layer.group_add(CLIENTS_GROUP, self.channel_name)
 
         await self.accept()
         
-        # Send initial status and start market data updates
+        # Send initial status and subscribe to the requested symbols
         await self.send_trading_status()
-        self.update_task = asyncio.create_task(self.send_market_updates())
+        for symbol in self.requested_symbols():
+            await self.subscribe(symbol)
 
     async def disconnect(self, close_code):
-        # Cancel the update task if it exists
-        if self.update_task:
-            self.update_task.cancel()
-            try:
-                await self.update_task
-            except asyncio.CancelledError:
-                pass
+        for symbol in list(self.symbols):
+            await self.unsubscribe(symbol)
+        if not self.user.is_authenticated:
+            return
 
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        await self.channel_layer.group_discard(CLIENTS_GROUP, self.channel_name)
+
+    def requested_symbols(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if 'symbols' in query:
+            return [symbol.upper() for symbol in query['symbols'][0].split(',') if symbol]
+        return list(self.DEFAULT_SYMBOLS)
 
     async def receive(self, text_data):
-        # Handle any messages from the client if needed
-        pass
+        try:
+            message = json.loads(text_data)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        symbol = str(message.get('symbol', '')).upper()
+        if message.get('action') == 'subscribe':
+            await self.subscribe(symbol)
+        elif message.get('action') == 'unsubscribe':
+            await self.unsubscribe(symbol)
+
+    async def subscribe(self, symbol):
+        if symbol in self.symbols:
+            return
+        if not SYMBOL_PATTERN.match(symbol) or len(self.symbols) >= self.MAX_SYMBOLS:
+            await self.send(text_data=json.dumps({'type': 'error', 'message': f'Cannot subscribe to {symbol}'}))
+            return
+        self.symbols.add(symbol)
+        await self.channel_layer.group_add(symbol_group(symbol), self.channel_name)
+        # The hub answers with a snapshot on our own channel
+        await self.channel_layer.group_send(HUB_GROUP, {
+            'type': 'hub.watch',
+            'symbol': symbol,
+            'reply_channel': self.channel_name,
+        })
+        # Outside the symbol's sessions the hub publishes nothing; tell the client when it resumes
+        wait = get_market_calendar().seconds_until_open(symbols=[symbol])
+        await self.send(text_data=json.dumps({
+            'type': 'subscribed',
+            'symbol': symbol,
+            'market_open': bool(wait == 0),
+            'next_open': (timezone.now() + timedelta(seconds=wait)).isoformat() if wait else None,
+        }))
+
+    async def unsubscribe(self, symbol):
+        if symbol not in self.symbols:
+            return
+        self.symbols.discard(symbol)
+        await self.channel_layer.group_discard(symbol_group(symbol), self.channel_name)
+        await self.channel_layer.group_send(HUB_GROUP, {
+            'type': 'hub.unwatch',
+            'symbol': symbol,
+            'reply_channel': self.channel_name,
+        })
 
     async def send_trading_status(self):
         # Get today's trading stats
@@ -102,91 +185,39 @@ class AutomatedTradingConsumer(AsyncWebsocketConsumer):
             automated=True
         ))
 
-    def calculate_rsi(self, prices, periods=14):
-        deltas = np.diff(prices)
-        gain = np.where(deltas > 0, deltas, 0)
-        loss = np.where(deltas < 0, -deltas, 0)
-        
-        avg_gain = np.mean(gain[:periods])
-        avg_loss = np.mean(loss[:periods])
-        
-        if avg_loss == 0:
-            return 100
-        
-        rs = avg_gain / avg_loss
-        return 100 - (100 / (1 + rs))
+    async def market_bar(self, event):
+        bar, indicators = event['bar'], event['indicators']
+        await self.send(text_data=_market_json({
+            'type': 'market_update',
+            'symbol': event['symbol'],
+            'timestamp': bar['timestamp'],
+            'price': bar['close'],
+            'volume': bar['volume'],
+            'technical': {
+                'rsi': indicators.get('RSI'),
+                'macd': indicators.get('MACD')
+            }
+        }))
 
-    def calculate_macd(self, prices, fast=12, slow=26, signal=9):
-        # Calculate EMAs
-        exp1 = prices.ewm(span=fast, adjust=False).mean()
-        exp2 = prices.ewm(span=slow, adjust=False).mean()
-        macd = exp1 - exp2
-        signal_line = macd.ewm(span=signal, adjust=False).mean()
-        return macd.iloc[-1], signal_line.iloc[-1]
+    async def market_quote(self, event):
+        await self.send(text_data=_market_json({'type': 'quote', 'symbol': event['symbol'], **event['quote']}))
 
-    @database_sync_to_async
-    def get_market_data(self):
-        # Get the current asset from user's settings or default to 'AAPL'
-        symbol = 'AAPL'  # You should get this from user's settings
-        
-        try:
-            # Fetch historical data
-            ticker = yf.Ticker(symbol)
-            hist = ticker.history(period='1d', interval='1m')
-            
-            if hist.empty:
-                return None
-            
-            # Calculate technical indicators
-            close_prices = hist['Close']
-            volume = hist['Volume'].iloc[-1]
-            
-            # Calculate RSI
-            rsi = self.calculate_rsi(close_prices)
-            
-            # Calculate MACD
-            macd, signal = self.calculate_macd(close_prices)
-            
-            return {
-                'price': float(close_prices.iloc[-1]),
-                'volume': int(volume),
-                'technical': {
-                    'rsi': float(rsi),
-                    'macd': float(macd)
-                }
-            }
-        except Exception as e:
-            print(f"Error fetching market data: {e}")
-            return None
-
-    async def send_market_updates(self):
-        while True:
-            try:
-                # Get market data
-                market_data = await self.get_market_data()
-                
-                if market_data:
-                    # Get today's P/L
-                    today = timezone.now().date()
-                    trades = await self.get_today_trades(today)
-                    profit_loss = sum(trade.profit_loss for trade in trades) if trades else 0
-                    
-                    # Add P/L to market data
-                    market_data['profitLoss'] = profit_loss
-                    
-                    # Send update
-                    await self.send(text_data=json.dumps({
-                        'type': 'market_update',
-                        **market_data
-                    }))
-                
-                # Wait for 1 minute before next update
-                await asyncio.sleep(60)
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                print(f"Error in market updates: {e}")
-                await asyncio.sleep(60)  # Wait before retrying
+    async def market_snapshot(self, event):
+        await self.send(text_data=_market_json({
+            'type': 'snapshot',
+            'symbol': event['symbol'],
+            'bars': event['bars'],
+            'technical': event['indicators'],
+            'quote': event['quote'],
+        }))
+
+    async def market_resync(self, event):
+        for symbol in self.symbols:
+            await self.channel_layer.group_send(HUB_GROUP, {
+                'type': 'hub.watch',
+                'symbol': symbol,
+                'reply_channel': self.channel_name,
+            })
 
     async def trading_update(self, event):
         # Send message to WebSocket
@@ -0,0 +1,167 @@
+"""Shared cache for computed indicator values.
+
+Entries are keyed by (symbol, timeframe, last-bar timestamp, indicator
+params), so whichever component computes the indicators for a bar first -
+the dashboard view, the websocket consumer, the Celery task or the trading
+loop - makes them available to the others. Lookups go through an in-process
+LRU tier first and then a Redis tier on ``REDIS_URL``. Values are plain
+{name: number} dicts and are stored in Redis as JSON, so the shared tier
+carries data only.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+from django.conf import settings
+
+from .indicators import get_indicator_state, save_indicator_state
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'indicators'
+
+
+class IndicatorCache:
+    # Seconds to stop talking to Redis after a connection error
+    REDIS_RETRY_INTERVAL = 30
+
+    def __init__(self, max_entries: int = 1024, ttl: int = 300, redis_url: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_down_until = 0.0
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def make_key(symbol: str, timeframe: str, last_bar, params: Dict) -> str:
+        """Cache key for one symbol/timeframe at a given last bar and parameter set"""
+        last_bar = pd.Timestamp(last_bar).isoformat() if last_bar is not None else 'none'
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        return f'{KEY_PREFIX}:{symbol}:{timeframe}:{last_bar}:{digest}'
+
+    def _get_redis(self):
+        if not self.redis_url or time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            import redis
+
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        self.redis_errors += 1
+        self._redis_down_until = time.monotonic() + self.REDIS_RETRY_INTERVAL
+        logger.warning(f"Indicator cache Redis tier unavailable: {str(e)}")
+
+    def _store_local(self, key: str, value: Any):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get(self, key: str, default=None):
+        """Look a key up in the local tier, then in Redis"""
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                self.local_hits += 1
+                return self._local[key]
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                raw = client.get(key)
+            except Exception as e:
+                self._redis_failed(e)
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self._store_local(key, value)
+                self.redis_hits += 1
+                return value
+
+        self.misses += 1
+        return default
+
+    def set(self, key: str, value: Any):
+        """Store a value in both tiers"""
+        self._store_local(key, value)
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.set(key, json.dumps(value), ex=self.ttl)
+            except Exception as e:
+                self._redis_failed(e)
+
+    def get_or_compute(self, symbol: str, timeframe: str, last_bar, params: Dict, compute: Callable[[], Any]):
+        """Return the cached value for this bar, computing and sharing it on a miss"""
+        key = self.make_key(symbol, timeframe, last_bar, params)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        """Drop the local tier (Redis entries expire on their own)"""
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for both tiers"""
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'redis_errors': self.redis_errors,
+            'hit_rate': (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            'local_entries': len(self._local),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_indicator_cache() -> IndicatorCache:
+    """Process-wide cache configured from settings"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = IndicatorCache(
+                max_entries=settings.INDICATOR_CACHE_SIZE,
+                ttl=settings.INDICATOR_CACHE_TTL,
+                redis_url=settings.REDIS_URL,
+            )
+        return _cache
+
+
+def cached_state_values(symbol: str, timeframe: str, closes, timestamps, rsi_smoothing: str = 'wilder') -> Dict[str, float]:
+    """Latest indicator values for a series, shared through the cache.
+
+    On a miss the new bars are folded into the process's IndicatorState for
+    (symbol, timeframe). On a hit the state is left alone; it catches up with
+    the skipped bars on its next miss.
+    """
+    state = get_indicator_state(symbol, timeframe, rsi_smoothing)
+
+    def compute():
+        values = state.extend(closes, timestamps)
+        save_indicator_state(state)
+        return values
+
+    return get_indicator_cache().get_or_compute(symbol, timeframe, timestamps[-1], state.params, compute)
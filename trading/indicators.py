@@ -0,0 +1,704 @@
+"""Vectorised technical indicator engine shared by the trading strategies.
+
+All indicators are computed from one contiguous float64 close array. The
+rolling windows (SMA, RSI, Bollinger) are derived from a single set of
+cumulative sums, and the exponential averages (EMA, MACD) run as linear
+filters, so every requested indicator costs one pass over the series instead
+of one pandas ``rolling()``/``ewm()`` pass per column. Indicators are nodes
+of a dependency graph, so intermediates are shared between them.
+
+The functions operate along the last axis, so a 1-D close series and a 2-D
+(symbols x bars) matrix go through the same code.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+logger = logging.getLogger(__name__)
+
+CLOSE_COLUMN = '4. close'
+
+# Sums smaller than this fraction of the price scale are treated as zero so
+# that flat windows give the same RSI/std results as pandas.
+_ROUNDING_TOLERANCE = 1e-10
+
+
+def as_price_array(prices) -> np.ndarray:
+    """Return close prices as a contiguous float64 array (no copy when possible)"""
+    if isinstance(prices, pd.DataFrame):
+        prices = prices[CLOSE_COLUMN]
+    if isinstance(prices, pd.Series):
+        prices = prices.to_numpy(dtype=np.float64, copy=False)
+    return np.ascontiguousarray(prices, dtype=np.float64)
+
+
+def _cumsum0(values: np.ndarray) -> np.ndarray:
+    """Cumulative sum along the last axis with a leading zero column"""
+    out = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=out[..., 1:])
+    return out
+
+
+def _window_sum(csum: np.ndarray, window: int) -> np.ndarray:
+    """Rolling window sum from a zero-padded cumulative sum (NaN during warm-up)"""
+    n = csum.shape[-1] - 1
+    out = np.full(csum.shape[:-1] + (n,), np.nan)
+    if window <= n:
+        out[..., window - 1:] = csum[..., window:] - csum[..., :n - window + 1]
+    return out
+
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average seeded with the first value (pandas ``adjust=False``)"""
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[-1] == 0:
+        return values.copy()
+    alpha = 2.0 / (span + 1.0)
+    zi = (1.0 - alpha) * values[..., :1]
+    out, _ = lfilter([alpha], [1.0, alpha - 1.0], values, axis=-1, zi=zi)
+    return out
+
+
+# Indicator dependency graph.
+#
+# Every indicator is a node named '<kind>_<param>_<param>...' (e.g. 'sma_20',
+# 'macdsignal_12_26_9'). A node factory returns the node's dependencies and a
+# function computing it from the graph and the dependency values, so shared
+# intermediates (cumulative sums, EMAs, price deltas) are evaluated once no
+# matter how many indicators or strategies need them.
+_NODE_FACTORIES = {}
+
+
+def indicator_node(kind: str):
+    """Register a node factory for indicator names starting with ``kind``"""
+    def decorator(factory):
+        _NODE_FACTORIES[kind] = factory
+        return factory
+    return decorator
+
+
+def _parse_param(value: str):
+    return float(value) if '.' in value else int(value)
+
+
+def resolve_node(name: str) -> Tuple[Tuple[str, ...], Callable]:
+    """Dependencies and compute function of an indicator node"""
+    kind, *params = name.split('_')
+    factory = _NODE_FACTORIES.get(kind)
+    if factory is None:
+        raise KeyError(f"Unknown indicator: {name}")
+    return factory(*[_parse_param(param) for param in params])
+
+
+@indicator_node('centered')
+def _centered_node():
+    # Prices shifted by the first close so running sums stay small and precise
+    return (), lambda graph: graph.close - graph.base
+
+
+@indicator_node('cumsum')
+def _cumsum_node():
+    return ('centered',), lambda graph, centered: _cumsum0(centered)
+
+
+@indicator_node('cumsumsq')
+def _cumsumsq_node():
+    return ('centered',), lambda graph, centered: _cumsum0(centered * centered)
+
+
+@indicator_node('sma')
+def _sma_node(window):
+    return ('cumsum',), lambda graph, csum: _window_sum(csum, window) / window + graph.base
+
+
+@indicator_node('var')
+def _var_node(window):
+    def compute(graph, csum, csum_sq):
+        total = _window_sum(csum, window)
+        var = (_window_sum(csum_sq, window) - total * total / window) / (window - 1)
+        var[var < _ROUNDING_TOLERANCE * graph.scale * graph.scale] = 0.0
+        return var
+    return ('cumsum', 'cumsumsq'), compute
+
+
+@indicator_node('bbupper')
+def _bbupper_node(window, num_std):
+    return (f'sma_{window}', f'var_{window}'), lambda graph, sma, var: sma + num_std * np.sqrt(var)
+
+
+@indicator_node('bblower')
+def _bblower_node(window, num_std):
+    return (f'sma_{window}', f'var_{window}'), lambda graph, sma, var: sma - num_std * np.sqrt(var)
+
+
+@indicator_node('ema')
+def _ema_node(span):
+    return (), lambda graph: ema(graph.close, span)
+
+
+@indicator_node('macd')
+def _macd_node(fast, slow):
+    return (f'ema_{fast}', f'ema_{slow}'), lambda graph, ema_fast, ema_slow: ema_fast - ema_slow
+
+
+@indicator_node('macdsignal')
+def _macdsignal_node(fast, slow, signal):
+    return (f'macd_{fast}_{slow}',), lambda graph, macd: ema(macd, signal)
+
+
+@indicator_node('delta')
+def _delta_node():
+    def compute(graph):
+        delta = np.zeros_like(graph.close)
+        delta[..., 1:] = np.diff(graph.close, axis=-1)
+        return delta
+    return (), compute
+
+
+@indicator_node('gains')
+def _gains_node():
+    return ('delta',), lambda graph, delta: _cumsum0(np.maximum(delta, 0.0))
+
+
+@indicator_node('losses')
+def _losses_node():
+    return ('delta',), lambda graph, delta: _cumsum0(np.maximum(-delta, 0.0))
+
+
+@indicator_node('rsi')
+def _rsi_node(window):
+    def compute(graph, gains, losses):
+        gain = _window_sum(gains, window)
+        loss = _window_sum(losses, window)
+        tolerance = _ROUNDING_TOLERANCE * graph.scale
+        gain[np.abs(gain) < tolerance] = 0.0
+        loss[np.abs(loss) < tolerance] = 0.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 100.0 - 100.0 / (1.0 + gain / loss)
+    return ('gains', 'losses'), compute
+
+
+class IndicatorGraph:
+    """Evaluates indicator nodes over one close series, each node at most once.
+
+    Nodes are computed in topological order and memoised, and the time spent
+    in each node is recorded in ``timings`` (seconds).
+    """
+
+    def __init__(self, close):
+        self.close = as_price_array(close)
+        has_bars = self.close.shape[-1] > 0
+        self.base = self.close[..., :1] if has_bars else 0.0
+        self.scale = np.abs(self.base) + 1.0
+        self.values: Dict[str, np.ndarray] = {}
+        self.timings: Dict[str, float] = {}
+
+    @staticmethod
+    def plan(names: Iterable[str]) -> List[str]:
+        """Topological evaluation order for the union of ``names`` and their dependencies"""
+        order, done, active = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in active:
+                raise ValueError(f"Indicator dependency cycle at {name}")
+            active.add(name)
+            for dependency in resolve_node(name)[0]:
+                visit(dependency)
+            active.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def evaluate(self, names: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Compute the requested nodes (and anything they depend on) once"""
+        names = list(names)
+        for name in self.plan(names):
+            if name in self.values:
+                continue
+            dependencies, compute = resolve_node(name)
+            started = time.perf_counter()
+            self.values[name] = compute(self, *[self.values[dependency] for dependency in dependencies])
+            self.timings[name] = time.perf_counter() - started
+        return {name: self.values[name] for name in names}
+
+
+def indicator_nodes(
+    sma: Iterable[int] = (5, 20),
+    ema_spans: Iterable[int] = (10,),
+    rsi: Optional[int] = 14,
+    macd: Optional[Tuple[int, int, int]] = (12, 26, 9),
+    bollinger: Optional[Tuple[int, float]] = (20, 2.0),
+) -> Dict[str, str]:
+    """Map the column names used by the strategies to graph node names"""
+    nodes = {f'SMA_{window}': f'sma_{window}' for window in sma}
+    nodes.update({f'EMA_{span}': f'ema_{span}' for span in ema_spans})
+    if rsi is not None:
+        nodes['RSI'] = f'rsi_{rsi}'
+    if macd is not None:
+        fast, slow, signal = macd
+        nodes['MACD'] = f'macd_{fast}_{slow}'
+        nodes['Signal_line'] = f'macdsignal_{fast}_{slow}_{signal}'
+    if bollinger is not None:
+        window, num_std = bollinger
+        nodes[f'SMA_{window}'] = f'sma_{window}'
+        nodes['Upper'] = f'bbupper_{window}_{num_std}'
+        nodes['Lower'] = f'bblower_{window}_{num_std}'
+    return nodes
+
+
+def compute_indicators(
+    close,
+    sma: Iterable[int] = (5, 20),
+    ema_spans: Iterable[int] = (10,),
+    rsi: Optional[int] = 14,
+    macd: Optional[Tuple[int, int, int]] = (12, 26, 9),
+    bollinger: Optional[Tuple[int, float]] = (20, 2.0),
+) -> Dict[str, np.ndarray]:
+    """Compute every requested indicator in a single pass over the close series.
+
+    Args:
+        close: Close prices (array, Series or a DataFrame with a '4. close' column)
+        sma: Simple moving average windows, returned as 'SMA_<window>'
+        ema_spans: Exponential moving average spans, returned as 'EMA_<span>'
+        rsi: RSI window (rolling mean of gains/losses), returned as 'RSI'
+        macd: (fast, slow, signal) spans, returned as 'MACD' and 'Signal_line'
+        bollinger: (window, num_std), returned as 'SMA_<window>', 'Upper' and 'Lower'
+
+    Returns:
+        dict: Indicator name -> float64 array with the same shape as ``close``.
+        Values are NaN until the indicator's window is full.
+    """
+    nodes = indicator_nodes(sma=sma, ema_spans=ema_spans, rsi=rsi, macd=macd, bollinger=bollinger)
+    values = IndicatorGraph(close).evaluate(nodes.values())
+    return {column: values[node] for column, node in nodes.items()}
+
+
+def combined_signal(indicators: Dict[str, np.ndarray], fast: int = 5, slow: int = 20,
+                    oversold: float = 30, overbought: float = 70) -> np.ndarray:
+    """Combined SMA cross / RSI / MACD signal: 1 buy, -1 sell, 0 hold"""
+    sma_fast, sma_slow = indicators[f'SMA_{fast}'], indicators[f'SMA_{slow}']
+    rsi, macd, signal_line = indicators['RSI'], indicators['MACD'], indicators['Signal_line']
+
+    with np.errstate(invalid='ignore'):
+        buy = (sma_fast > sma_slow) & (rsi < overbought) & (macd > signal_line)
+        sell = (sma_fast < sma_slow) & (rsi > oversold) & (macd < signal_line)
+    return np.where(buy, 1, np.where(sell, -1, 0)).astype(np.int8)
+
+
+
+class UniverseMatrix(NamedTuple):
+    """Close prices for a symbol universe packed into one (symbols x bars) array.
+
+    Each row is right-aligned so its newest bar sits in the last column;
+    shorter histories are left-padded with their first close and flagged
+    False in ``mask``.
+    """
+    symbols: List[str]
+    close: np.ndarray
+    mask: np.ndarray
+    timestamps: np.ndarray
+    start: np.ndarray
+
+
+def align_universe(frames: Dict[str, pd.DataFrame], bars: Optional[int] = None, column: str = CLOSE_COLUMN) -> UniverseMatrix:
+    """Pack per-symbol frames into a UniverseMatrix.
+
+    Args:
+        frames: Symbol -> DataFrame in the Alpha Vantage column layout
+        bars: Keep only the newest ``bars`` bars per symbol (default: longest history)
+        column: Price column to pack
+
+    Returns:
+        UniverseMatrix: Symbols in insertion order, with empty frames dropped
+    """
+    symbols = [symbol for symbol, frame in frames.items() if frame is not None and len(frame)]
+    lengths = np.array([len(frames[symbol]) for symbol in symbols], dtype=np.int64)
+    width = int(bars if bars is not None else lengths.max(initial=0))
+    lengths = np.minimum(lengths, width)
+
+    close = np.empty((len(symbols), width))
+    timestamps = np.full((len(symbols), width), np.datetime64('NaT'), dtype='datetime64[ns]')
+    start = width - lengths
+    for row, symbol in enumerate(symbols):
+        frame = frames[symbol].iloc[-lengths[row]:] if lengths[row] else frames[symbol].iloc[:0]
+        values = frame[column].to_numpy(dtype=np.float64)
+        close[row, start[row]:] = values
+        close[row, :start[row]] = values[0] if len(values) else np.nan
+        timestamps[row, start[row]:] = frame.index.to_numpy(dtype='datetime64[ns]')
+
+    mask = np.arange(width) >= start[:, None]
+    return UniverseMatrix(symbols, close, mask, timestamps, start)
+
+
+# Number of real bars each indicator needs before its value is meaningful
+def _warmup(name: str, sma: Iterable[int], rsi: Optional[int], bollinger: Optional[Tuple[int, float]]) -> int:
+    if name.startswith('SMA_'):
+        return int(name[4:])
+    if name == 'RSI':
+        return rsi
+    if name in ('Upper', 'Lower'):
+        return bollinger[0]
+    # EMA/MACD seeded with the padding value match the unpadded series
+    return 1
+
+
+def compute_universe_indicators(
+    universe: UniverseMatrix,
+    sma: Iterable[int] = (5, 20),
+    ema_spans: Iterable[int] = (10,),
+    rsi: Optional[int] = 14,
+    macd: Optional[Tuple[int, int, int]] = (12, 26, 9),
+    bollinger: Optional[Tuple[int, float]] = (20, 2.0),
+) -> Dict[str, np.ndarray]:
+    """Indicators and combined-strategy signals for every symbol in one vectorised call.
+
+    Returns the same keys as ``compute_indicators`` as (symbols x bars)
+    arrays, plus an int8 'signal' array. Values that depend on padding are
+    NaN (signal 0), so each row equals the per-symbol computation.
+    """
+    indicators = compute_indicators(universe.close, sma=sma, ema_spans=ema_spans, rsi=rsi, macd=macd, bollinger=bollinger)
+    positions = np.arange(universe.close.shape[-1])
+    for name, values in indicators.items():
+        warmup = _warmup(name, sma, rsi, bollinger)
+        values[positions < universe.start[:, None] + warmup - 1] = np.nan
+
+    if {'SMA_5', 'SMA_20', 'RSI', 'MACD', 'Signal_line'} <= indicators.keys():
+        indicators['signal'] = combined_signal(indicators)
+    return indicators
+
+
+class IndicatorState:
+    """Running indicator state for one (symbol, timeframe) series.
+
+    Each appended bar updates SMA, EMA, RSI, MACD/signal line and Bollinger
+    bands in constant time from running sums and EMA state, so the live loop
+    never has to recompute indicators over the full history. ``snapshot()``
+    and ``restore()`` round-trip the state through plain JSON-compatible data.
+    """
+
+    # Running sums are rebuilt from the window buffer this often to stop
+    # floating point drift from accumulating over long sessions.
+    RESYNC_INTERVAL = 10000
+
+    def __init__(
+        self,
+        symbol: str,
+        timeframe: str,
+        sma: Iterable[int] = (5, 20),
+        ema_spans: Iterable[int] = (10,),
+        rsi: Optional[int] = 14,
+        macd: Optional[Tuple[int, int, int]] = (12, 26, 9),
+        bollinger: Optional[Tuple[int, float]] = (20, 2.0),
+        rsi_smoothing: str = 'wilder',
+    ):
+        if rsi_smoothing not in ('wilder', 'simple'):
+            raise ValueError(f"Unknown RSI smoothing: {rsi_smoothing}")
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.sma_windows = tuple(sorted(set(sma) | ({bollinger[0]} if bollinger else set())))
+        self.ema_spans = tuple(ema_spans)
+        self.rsi_window = rsi
+        self.macd_spans = tuple(macd) if macd else None
+        self.bollinger = tuple(bollinger) if bollinger else None
+        self.rsi_smoothing = rsi_smoothing
+        self._window = max(self.sma_windows + ((rsi,) if rsi and rsi_smoothing == 'simple' else ()), default=0)
+        self.reset()
+
+    def reset(self):
+        """Drop all accumulated state"""
+        self.count = 0
+        self.last_close = None
+        self.last_timestamp = None
+        self._closes = deque(maxlen=self._window or None)
+        self._sums = {window: 0.0 for window in self.sma_windows}
+        self._sum_sq = 0.0
+        spans = set(self.ema_spans) | set(self.macd_spans[:2] if self.macd_spans else ())
+        self._emas = {span: None for span in spans}
+        self._macd_signal = None
+        self._gains = deque(maxlen=self.rsi_window if self.rsi_smoothing == 'simple' else None)
+        self._losses = deque(maxlen=self.rsi_window if self.rsi_smoothing == 'simple' else None)
+        self._avg_gain = 0.0
+        self._avg_loss = 0.0
+
+    @staticmethod
+    def _ema_step(previous, value, span):
+        if previous is None:
+            return value
+        return previous + (2.0 / (span + 1.0)) * (value - previous)
+
+    def update(self, close: float, timestamp=None) -> Dict[str, float]:
+        """Append one bar and return the current indicator values"""
+        close = float(close)
+        closes = self._closes
+
+        # Rolling sums: add the new close and drop the one leaving each window
+        for window in self.sma_windows:
+            leaving = closes[-window] if len(closes) >= window else 0.0
+            self._sums[window] += close - leaving
+        if self.bollinger:
+            window = self.bollinger[0]
+            leaving = closes[-window] if len(closes) >= window else 0.0
+            self._sum_sq += close * close - leaving * leaving
+        if closes.maxlen:
+            closes.append(close)
+
+        for span in self._emas:
+            self._emas[span] = self._ema_step(self._emas[span], close, span)
+        if self.macd_spans:
+            fast, slow, signal = self.macd_spans
+            self._macd_signal = self._ema_step(self._macd_signal, self._emas[fast] - self._emas[slow], signal)
+
+        if self.rsi_window and self.last_close is not None:
+            self._update_rsi(close - self.last_close)
+
+        self.count += 1
+        self.last_close = close
+        if timestamp is not None:
+            self.last_timestamp = pd.Timestamp(timestamp)
+        if self.count % self.RESYNC_INTERVAL == 0:
+            self._resync()
+        return self.values
+
+    def _update_rsi(self, delta: float):
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        window = self.rsi_window
+        if self.rsi_smoothing == 'simple':
+            if len(self._gains) == window:
+                self._avg_gain -= self._gains[0] / window
+                self._avg_loss -= self._losses[0] / window
+            self._gains.append(gain)
+            self._losses.append(loss)
+            self._avg_gain += gain / window
+            self._avg_loss += loss / window
+        elif self.count <= window:
+            # Wilder seeds the averages with a plain mean of the first window
+            self._avg_gain += gain / window
+            self._avg_loss += loss / window
+        else:
+            self._avg_gain = (self._avg_gain * (window - 1) + gain) / window
+            self._avg_loss = (self._avg_loss * (window - 1) + loss) / window
+
+    def _resync(self):
+        closes = list(self._closes)
+        for window in self.sma_windows:
+            self._sums[window] = float(sum(closes[-window:]))
+        if self.bollinger:
+            self._sum_sq = float(sum(c * c for c in closes[-self.bollinger[0]:]))
+        if self.rsi_smoothing == 'simple' and self._gains:
+            self._avg_gain = sum(self._gains) / self.rsi_window
+            self._avg_loss = sum(self._losses) / self.rsi_window
+
+    @property
+    def bar_spacing(self) -> Optional[pd.Timedelta]:
+        """Expected time between consecutive bars, or None for an unknown timeframe"""
+        try:
+            return pd.Timedelta(self.timeframe)
+        except ValueError:
+            return None
+
+    def extend(self, closes, timestamps=None) -> Dict[str, float]:
+        """Append several bars, skipping any at or before the last seen timestamp.
+
+        If the series starts more than one bar after the last seen timestamp,
+        bars are missing in between (a restart, a missed day) and folding the
+        series in would treat it as contiguous, so the state is rewarmed from
+        the whole series instead.
+        """
+        closes = as_price_array(closes)
+        if timestamps is None:
+            for close in closes.tolist():
+                self.update(close)
+            return self.values
+
+        timestamps = pd.DatetimeIndex(timestamps)
+        start = 0
+        if self.last_timestamp is not None and len(timestamps):
+            spacing = self.bar_spacing
+            first = timestamps[0]
+            if first > self.last_timestamp and (spacing is None or first - self.last_timestamp > spacing):
+                logger.info(
+                    f"Rewarming {self.symbol} {self.timeframe} indicators: bars missing between "
+                    f"{self.last_timestamp} and {first}"
+                )
+                self.reset()
+            else:
+                start = int(timestamps.searchsorted(self.last_timestamp, side='right'))
+        for close, timestamp in zip(closes[start:].tolist(), timestamps[start:]):
+            self.update(close, timestamp)
+        return self.values
+
+    @property
+    def values(self) -> Dict[str, float]:
+        """Current indicator values; NaN until an indicator's window is full"""
+        nan = float('nan')
+        values = {}
+        for window in self.sma_windows:
+            values[f'SMA_{window}'] = self._sums[window] / window if self.count >= window else nan
+        for span in self.ema_spans:
+            values[f'EMA_{span}'] = self._emas[span] if self._emas[span] is not None else nan
+        if self.macd_spans:
+            fast, slow, _ = self.macd_spans
+            has_data = self.count > 0
+            values['MACD'] = self._emas[fast] - self._emas[slow] if has_data else nan
+            values['Signal_line'] = self._macd_signal if has_data else nan
+        if self.rsi_window:
+            values['RSI'] = self._rsi() if self.count > self.rsi_window else nan
+        if self.bollinger:
+            window, num_std = self.bollinger
+            if self.count >= window:
+                total = self._sums[window]
+                var = max((self._sum_sq - total * total / window) / (window - 1), 0.0)
+                values['Upper'] = total / window + num_std * var ** 0.5
+                values['Lower'] = total / window - num_std * var ** 0.5
+            else:
+                values['Upper'] = values['Lower'] = nan
+        return values
+
+    def _rsi(self) -> float:
+        if self._avg_loss <= 0.0:
+            return 100.0 if self._avg_gain > 0.0 else float('nan')
+        return 100.0 - 100.0 / (1.0 + self._avg_gain / self._avg_loss)
+
+    @property
+    def params(self) -> Dict:
+        """Indicator parameters of this state"""
+        return {
+            'sma': list(self.sma_windows),
+            'ema_spans': list(self.ema_spans),
+            'rsi': self.rsi_window,
+            'macd': list(self.macd_spans) if self.macd_spans else None,
+            'bollinger': list(self.bollinger) if self.bollinger else None,
+            'rsi_smoothing': self.rsi_smoothing,
+        }
+
+    def snapshot(self) -> Dict:
+        """Serialisable copy of the running state"""
+        return {
+            'symbol': self.symbol,
+            'timeframe': self.timeframe,
+            'params': self.params,
+            'count': self.count,
+            'last_close': self.last_close,
+            'last_timestamp': self.last_timestamp.isoformat() if self.last_timestamp is not None else None,
+            'closes': list(self._closes),
+            'emas': {str(span): value for span, value in self._emas.items()},
+            'macd_signal': self._macd_signal,
+            'gains': list(self._gains),
+            'losses': list(self._losses),
+            'avg_gain': self._avg_gain,
+            'avg_loss': self._avg_loss,
+        }
+
+    @classmethod
+    def restore(cls, snapshot: Dict) -> 'IndicatorState':
+        """Rebuild a state object from ``snapshot()`` output"""
+        params = snapshot['params']
+        state = cls(
+            snapshot['symbol'],
+            snapshot['timeframe'],
+            sma=params['sma'],
+            ema_spans=params['ema_spans'],
+            rsi=params['rsi'],
+            macd=tuple(params['macd']) if params['macd'] else None,
+            bollinger=tuple(params['bollinger']) if params['bollinger'] else None,
+            rsi_smoothing=params['rsi_smoothing'],
+        )
+        state.count = snapshot['count']
+        state.last_close = snapshot['last_close']
+        if snapshot['last_timestamp']:
+            state.last_timestamp = pd.Timestamp(snapshot['last_timestamp'])
+        state._closes.extend(snapshot['closes'])
+        state._emas = {int(span): value for span, value in snapshot['emas'].items()}
+        state._macd_signal = snapshot['macd_signal']
+        state._gains.extend(snapshot['gains'])
+        state._losses.extend(snapshot['losses'])
+        state._avg_gain = snapshot['avg_gain']
+        state._avg_loss = snapshot['avg_loss']
+        state._resync()
+        return state
+
+
+_states: Dict[Tuple[str, str, str], IndicatorState] = {}
+_states_lock = threading.Lock()
+
+STATE_KEY_PREFIX = 'indicator_state'
+
+
+_redis_client = None
+_redis_lock = threading.Lock()
+
+
+def _redis():
+    """Process-wide Redis client, so every save and load shares one connection pool"""
+    global _redis_client
+    with _redis_lock:
+        if _redis_client is None:
+            from django.conf import settings
+            import redis
+
+            _redis_client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.25, socket_connect_timeout=0.25)
+        return _redis_client
+
+
+def get_indicator_state(symbol: str, timeframe: str, rsi_smoothing: str = 'wilder') -> IndicatorState:
+    """Process-wide indicator state for a (symbol, timeframe), restored from Redis when available"""
+    key = (symbol, timeframe, rsi_smoothing)
+    with _states_lock:
+        state = _states.get(key)
+        if state is None:
+            state = load_indicator_state(symbol, timeframe, rsi_smoothing)
+            if state is None:
+                state = IndicatorState(symbol, timeframe, rsi_smoothing=rsi_smoothing)
+            _states[key] = state
+        return state
+
+
+def _state_key(symbol: str, timeframe: str, rsi_smoothing: str) -> str:
+    return f'{STATE_KEY_PREFIX}:{symbol}:{timeframe}:{rsi_smoothing}'
+
+
+def save_indicator_state(state: IndicatorState, snapshot: Optional[Dict] = None) -> bool:
+    """Persist a state snapshot so a restarted worker can resume without warm-up.
+
+    ``snapshot`` is a ``state.snapshot()`` taken earlier, for saving from a
+    thread other than the one updating the state. Snapshots expire after
+    ``INDICATOR_STATE_TTL`` seconds so an abandoned one is not resumed.
+    """
+    from django.conf import settings
+
+    if snapshot is None:
+        snapshot = state.snapshot()
+    try:
+        _redis().set(
+            _state_key(state.symbol, state.timeframe, state.rsi_smoothing),
+            json.dumps(snapshot),
+            ex=settings.INDICATOR_STATE_TTL,
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Could not save indicator state for {state.symbol}: {str(e)}")
+        return False
+
+
+def load_indicator_state(symbol: str, timeframe: str, rsi_smoothing: str = 'wilder') -> Optional[IndicatorState]:
+    """Load a persisted snapshot, or None if there is none or Redis is unavailable"""
+    try:
+        raw = _redis().get(_state_key(symbol, timeframe, rsi_smoothing))
+    except Exception as e:
+        logger.warning(f"Could not load indicator state for {symbol}: {str(e)}")
+        return None
+    if not raw:
+        return None
+    return IndicatorState.restore(json.loads(raw))
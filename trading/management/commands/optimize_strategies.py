@@ -0,0 +1,61 @@
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.bar_store import get_bar_store
+from trading.optimization import STRATEGY_GRIDS, walk_forward_optimize
+from trading.result_cache import get_result_cache
+
+
+class Command(BaseCommand):
+    help = 'Walk-forward parameter sweep of the strategies and the trade model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bars', nargs='?', help="CSV file of bars with '1. open' and '4. close' columns and a timestamp index")
+        parser.add_argument('--symbol', help='Read bars for this symbol from the local bar store instead of a CSV file')
+        parser.add_argument('--timeframe', default='1min', help='Bar store timeframe used with --symbol')
+        parser.add_argument('--train-size', type=int, default=5000)
+        parser.add_argument('--test-size', type=int, default=1000)
+        parser.add_argument('--step', type=int, help='Bars between windows (defaults to --test-size)')
+        parser.add_argument('--strategy', action='append', choices=sorted(STRATEGY_GRIDS),
+                            help='Strategy to sweep (repeatable, defaults to all)')
+        parser.add_argument('--skip-model', action='store_true', help='Do not sweep RandomForest hyperparameters')
+        parser.add_argument('--workers', type=int, help='Worker processes (defaults to all cores)')
+        parser.add_argument('--top', type=int, default=10, help='Rows to print per kind')
+        parser.add_argument('--output', help='Write the full ranked table to this CSV file')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Recompute every window instead of reusing scores from the result cache')
+
+    def handle(self, *args, **options):
+        if options['symbol']:
+            bars = get_bar_store().read(options['symbol'], options['timeframe'])
+        elif options['bars']:
+            try:
+                bars = pd.read_csv(options['bars'], index_col=0, parse_dates=True).sort_index()
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read bars: {e}")
+        else:
+            raise CommandError('Pass a CSV file or --symbol')
+
+        grids = STRATEGY_GRIDS
+        if options['strategy']:
+            grids = {name: STRATEGY_GRIDS[name] for name in options['strategy']}
+
+        try:
+            table = walk_forward_optimize(
+                bars,
+                train_size=options['train_size'],
+                test_size=options['test_size'],
+                step=options['step'],
+                strategy_grids=grids,
+                model_grid={} if options['skip_model'] else None,
+                max_workers=options['workers'],
+                cache=None if options['no_cache'] else get_result_cache(),
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            table.to_csv(options['output'], index=False)
+        for kind, rows in table.groupby('kind'):
+            self.stdout.write(f"\n{kind}\n{rows.head(options['top']).to_string(index=False)}")
+        self.stdout.write(self.style.SUCCESS(f"Ranked {len(table)} parameter sets"))
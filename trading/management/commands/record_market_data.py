@@ -0,0 +1,40 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.bar_store import get_bar_store
+from trading.recorded import Recording, record_alpaca
+
+
+class Command(BaseCommand):
+    help = 'Record bars and the broker account into a directory for offline replay'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Recording directory (created or extended)')
+        parser.add_argument('--symbols', nargs='+', required=True)
+        parser.add_argument('--from-store', action='store_true',
+                            help='Copy 1-minute bars from the local bar store instead of downloading them from Alpaca')
+        parser.add_argument('--limit', type=int, default=10000, help='Bars per Alpaca request')
+        parser.add_argument('--max-pages', type=int, default=10, help='Alpaca requests per symbol')
+
+    def handle(self, *args, **options):
+        recording = Recording(options['output'])
+        if options['from_store']:
+            store = get_bar_store()
+            added = {}
+            for symbol in options['symbols']:
+                bars = store.read(symbol, '1min')
+                if bars.empty:
+                    raise CommandError(f"No stored 1-minute bars for {symbol}")
+                added[symbol] = recording.store.merge(symbol, '1min', bars)
+        else:
+            from alpaca_trade_api.rest import TimeFrame
+
+            from trading.alpaca_client import AlpacaClient
+
+            added = asyncio.run(record_alpaca(recording, AlpacaClient(), options['symbols'], TimeFrame.Minute,
+                                              limit=options['limit'], max_pages=options['max_pages']))
+
+        for symbol, count in added.items():
+            self.stdout.write(f"{symbol}: {count} bars")
+        self.stdout.write(self.style.SUCCESS(f"Recorded {len(added)} symbols to {recording.root}"))
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.simulation import replay_bars
+from trading.strategies import STRATEGIES
+
+
+class Command(BaseCommand):
+    help = 'Replay historical bars through the AutomatedTrading order logic'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bars', help='CSV file of OHLC bars with a timestamp index column')
+        parser.add_argument('--symbol', default='AAPL')
+        parser.add_argument('--strategy', default='combined', choices=sorted(STRATEGIES))
+        parser.add_argument('--cash', type=float, default=100000.0)
+        parser.add_argument('--fee-rate', type=float, default=0.0)
+        parser.add_argument('--stop-loss', type=Decimal, help='Override stop_loss_percent, e.g. 0.02')
+        parser.add_argument('--take-profit', type=Decimal, help='Override take_profit_percent, e.g. 0.04')
+        parser.add_argument('--risk-per-trade', type=Decimal, help='Override risk_per_trade, e.g. 0.01')
+        parser.add_argument('--max-position-size', type=Decimal, help='Override max_position_size in USD')
+
+    def handle(self, *args, **options):
+        try:
+            bars = pd.read_csv(options['bars'], index_col=0, parse_dates=True).sort_index()
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read bars: {e}")
+
+        overrides = {
+            'stop_loss_percent': options['stop_loss'],
+            'take_profit_percent': options['take_profit'],
+            'risk_per_trade': options['risk_per_trade'],
+            'max_position_size': options['max_position_size'],
+        }
+        overrides = {name: value for name, value in overrides.items() if value is not None}
+
+        signal = STRATEGIES[options['strategy']](bars).signal
+        result = replay_bars(
+            options['symbol'],
+            bars,
+            signal,
+            initial_cash=options['cash'],
+            fee_rate=options['fee_rate'],
+            **overrides
+        )
+
+        for name, value in result.metrics.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS(f"Replayed {len(bars)} bars"))
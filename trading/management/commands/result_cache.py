@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from trading.result_cache import get_result_cache
+
+
+class Command(BaseCommand):
+    help = 'List or prune the on-disk backtest/training result cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'prune', 'clear'])
+        parser.add_argument('--kind', help="Only entries of this kind, e.g. 'backtest', 'walk_forward', 'train_model'")
+        parser.add_argument('--max-mb', type=float, help='prune: evict least recently used entries down to this size')
+        parser.add_argument('--older-than-days', type=float, help='prune: evict entries unused for this many days')
+
+    def handle(self, *args, **options):
+        cache = get_result_cache()
+
+        if options['action'] == 'list':
+            entries = cache.entries(options['kind'])
+            for entry in entries:
+                last_used = datetime.fromtimestamp(entry['last_used']).isoformat(timespec='seconds')
+                self.stdout.write(
+                    f"{entry['key'][:16]}  {entry['kind']:<12} {entry['size']:>10}  {last_used}  {entry['params']}"
+                )
+            total = sum(entry['size'] for entry in entries)
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(entries)} entries, {total / 1e6:.1f} MB of {cache.max_bytes / 1e6:.1f} MB in {cache.root}"
+            ))
+            return
+
+        if options['action'] == 'clear':
+            result = cache.clear(options['kind'])
+        else:
+            max_mb = options['max_mb']
+            older_than_days = options['older_than_days']
+            result = cache.prune(
+                max_bytes=int(max_mb * 1e6) if max_mb is not None else None,
+                older_than=older_than_days * 86400 if older_than_days is not None else None,
+                kind=options['kind'],
+            )
+        self.stdout.write(self.style.SUCCESS(f"Removed {result['removed']} entries ({result['bytes'] / 1e6:.1f} MB)"))
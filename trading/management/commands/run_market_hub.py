@@ -0,0 +1,46 @@
+import asyncio
+
+import pandas as pd
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trading.bar_store import get_bar_store
+from trading.market_hub import AlpacaStreamSource, MarketHub, ReplaySource
+
+
+class Command(BaseCommand):
+    help = 'Run the central market-data hub that publishes streamed bars to market.<symbol> groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', nargs='*', default=None,
+                            help='Symbols that are always active (defaults to settings.MARKET_HUB_SYMBOLS)')
+        parser.add_argument('--replay', help='Replay bars from this CSV file (used for every --symbols entry) instead of the live stream')
+        parser.add_argument('--replay-store', action='store_true', help='Replay the bars stored for --symbols instead of the live stream')
+        parser.add_argument('--speed', type=float, help='Replay speed as a multiple of real time (default: as fast as possible)')
+        parser.add_argument('--timeframe', default='1min')
+        parser.add_argument('--store', action='store_true', help='Merge streamed bars into the local bar store')
+
+    def handle(self, *args, **options):
+        symbols = options['symbols'] if options['symbols'] is not None else settings.MARKET_HUB_SYMBOLS
+        store = get_bar_store() if options['store'] or options['replay_store'] else None
+
+        if options['replay']:
+            try:
+                bars = pd.read_csv(options['replay'], index_col=0, parse_dates=True)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read bars: {e}")
+            source = ReplaySource({symbol: bars for symbol in symbols}, speed=options['speed'])
+        elif options['replay_store']:
+            source = ReplaySource.from_store(store, symbols, options['timeframe'], speed=options['speed'])
+            store = None  # replayed bars are already stored
+        else:
+            source = AlpacaStreamSource()
+
+        hub = MarketHub(source, get_channel_layer(), symbols=symbols, timeframe=options['timeframe'], store=store)
+        self.stdout.write(f"Market hub publishing {', '.join(symbols) or 'watched symbols'}")
+        try:
+            asyncio.run(hub.run())
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Market hub stopped after {hub.published} publishes"))
@@ -0,0 +1,151 @@
+"""Precomputed trading calendar.
+
+US equity sessions (NYSE hours, holidays and early closes) are computed once
+into sorted arrays of session opens and closes, so "is the market open?" and
+"how long until it opens?" are binary searches instead of a broker
+``get_clock`` call. Crypto pairs (``BTC-USD``) trade around the clock.
+
+Loops and scheduled tasks use ``seconds_until_open`` to sleep through nights,
+weekends and holidays instead of polling.
+"""
+import re
+import threading
+from datetime import time
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay,
+                                    USMartinLutherKingJr, USMemorialDay, USPresidentsDay,
+                                    USThanksgivingDay, nearest_workday, sunday_to_monday)
+
+EXCHANGE_TZ = 'America/New_York'
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# One-off closures (national days of mourning)
+SPECIAL_CLOSURES = ('2018-12-05', '2025-01-09')
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        # A Saturday New Year's Day is not observed on the Friday before
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas Day', month=12, day=25, observance=nearest_workday),
+    ]
+
+
+def is_crypto(symbol: str) -> bool:
+    return symbol.endswith('-USD') or symbol.endswith('/USD')
+
+
+def _early_closes(days: pd.DatetimeIndex) -> np.ndarray:
+    """Days before Independence Day and Christmas, and the day after Thanksgiving"""
+    weekday = days.weekday
+    return (
+        ((days.month == 7) & (days.day == 3) & (weekday < 4))
+        | ((days.month == 12) & (days.day == 24) & (weekday < 4))
+        | ((days.month == 11) & (weekday == 4) & (days.day >= 23) & (days.day <= 29))
+    )
+
+
+class MarketCalendar:
+    """US equity sessions between ``start`` and ``end``, extended on demand"""
+
+    def __init__(self, start='2015-01-01', end=None):
+        self._lock = threading.Lock()
+        self._build(pd.Timestamp(start), pd.Timestamp(end) if end is not None else pd.Timestamp.now() + pd.DateOffset(years=2))
+
+    def _build(self, start: pd.Timestamp, end: pd.Timestamp):
+        holidays = NYSEHolidayCalendar().holidays(start, end).union(pd.DatetimeIndex(SPECIAL_CLOSURES))
+        days = pd.bdate_range(start, end).difference(holidays)
+        close_times = np.where(_early_closes(days), EARLY_CLOSE.hour * 60 + EARLY_CLOSE.minute,
+                               REGULAR_CLOSE.hour * 60 + REGULAR_CLOSE.minute)
+        opens = days + pd.Timedelta(hours=REGULAR_OPEN.hour, minutes=REGULAR_OPEN.minute)
+        closes = days + pd.to_timedelta(close_times, unit='min')
+        self.start, self.end, self.days = start, end, days
+        self.opens, self.closes = (
+            stamps.tz_localize(EXCHANGE_TZ).tz_convert('UTC').as_unit('ns').asi8 for stamps in (opens, closes))
+
+    @staticmethod
+    def _ns(at) -> int:
+        stamp = pd.Timestamp.now(tz='UTC') if at is None else pd.Timestamp(at)
+        if stamp.tzinfo is None:
+            stamp = stamp.tz_localize('UTC')
+        return stamp.tz_convert('UTC').as_unit('ns').value
+
+    def _index(self, ns: int) -> int:
+        """Index of the session that started last at or before ``ns`` (-1 if none); a next one always exists"""
+        if ns >= self.opens[-1]:
+            with self._lock:
+                if ns >= self.opens[-1]:
+                    self._build(self.start, pd.Timestamp(ns, tz='UTC').tz_localize(None) + pd.DateOffset(years=2))
+        return int(np.searchsorted(self.opens, ns, side='right')) - 1
+
+    def is_open(self, at=None, symbols: Iterable[str] = ()) -> bool:
+        """Whether any of ``symbols`` (US equities when empty) can trade at ``at`` (default now)"""
+        return self.seconds_until_open(at, symbols) == 0
+
+    def session(self, at=None) -> Optional[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """(open, close) in UTC of the equity session in progress at ``at``, or None"""
+        ns = self._ns(at)
+        i = self._index(ns)
+        if i >= 0 and ns < self.closes[i]:
+            return pd.Timestamp(self.opens[i], tz='UTC'), pd.Timestamp(self.closes[i], tz='UTC')
+        return None
+
+    def next_open(self, at=None) -> pd.Timestamp:
+        """Open (UTC) of the first equity session starting after ``at``"""
+        i = self._index(self._ns(at))
+        return pd.Timestamp(self.opens[i + 1], tz='UTC')
+
+    def seconds_until_open(self, at=None, symbols: Iterable[str] = ()) -> float:
+        """0 while ``symbols`` (US equities when empty) can trade, else seconds until they can"""
+        symbols = list(symbols)
+        if symbols and any(is_crypto(symbol) for symbol in symbols):
+            return 0.0
+        ns = self._ns(at)
+        i = self._index(ns)
+        if i >= 0 and ns < self.closes[i]:
+            return 0.0
+        return float((self.opens[i + 1] - ns) / 1e9)
+
+    def history_start(self, timeframe, bars: int, at=None) -> str:
+        """First day of the regular sessions needed to hold the ``bars`` bars of ``timeframe`` up to ``at`` (now)"""
+        amount, unit = re.fullmatch(r'(\d+)([A-Za-z]+)', str(timeframe)).groups()
+        if unit in ('Min', 'T', 'Hour', 'H'):
+            seconds = int(amount) * (60 if unit in ('Min', 'T') else 3600)
+            sessions = -(-bars // max(23400 // seconds, 1))  # 6.5 regular hours per session
+        else:
+            sessions = bars * int(amount) * {'Week': 5, 'W': 5, 'Month': 21, 'M': 21}.get(unit, 1)
+        day = pd.Timestamp(self._ns(at), tz='UTC').tz_convert(EXCHANGE_TZ).tz_localize(None)
+        today = int(np.searchsorted(self.days, day, side='right'))
+        return self.days[max(today - sessions - 1, 0)].strftime('%Y-%m-%d')
+
+    def seconds_until_close(self, at=None) -> float:
+        """Seconds left in the equity session in progress (0 when closed)"""
+        ns = self._ns(at)
+        i = self._index(ns)
+        return max(float((self.closes[i] - ns) / 1e9), 0.0) if i >= 0 else 0.0
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def get_market_calendar() -> MarketCalendar:
+    """Process-wide calendar"""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = MarketCalendar()
+        return _calendar
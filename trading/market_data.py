@@ -0,0 +1,282 @@
+"""Concurrent, rate-limited market data fetching.
+
+``fetch_universe`` downloads intraday bars for a whole symbol universe over
+one pooled aiohttp session. Symbols are de-duplicated, at most
+``max_concurrency`` requests are in flight, and every request first takes a
+token from the provider's token bucket so the vendor quota is respected
+across calls. A failing symbol does not fail the batch: the report carries
+the frames that arrived, the errors, and per-symbol latency and time spent
+waiting on the rate limiter.
+
+``refresh_universe`` and ``refresh_alpaca_bars`` keep the local bar store up
+to date by downloading only the bars after the last stored timestamp.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import aiohttp
+import pandas as pd
+from django.conf import settings
+
+from .bar_store import BarStore
+
+logger = logging.getLogger(__name__)
+
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+
+
+def alpha_vantage_frame(payload):
+    """Convert an Alpha Vantage time series JSON payload into an oldest-first DataFrame"""
+    series_key = next((key for key in payload if key.startswith('Time Series')), None)
+    if series_key is None:
+        return None
+    frame = pd.DataFrame.from_dict(payload[series_key], orient='index').astype(float)
+    frame.index = pd.to_datetime(frame.index)
+    return frame.sort_index()
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` requests per second with bursts up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Buckets outlive event loops (one per asyncio.run), their locks cannot
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def acquire(self) -> float:
+        """Take one token, sleeping until one is available.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        start = time.monotonic()
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+        return time.monotonic() - start
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> TokenBucket:
+    """Process-wide token bucket for a provider, sized from settings.MARKET_DATA_RATE_LIMITS"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            per_minute = settings.MARKET_DATA_RATE_LIMITS[provider]
+            _limiters[provider] = TokenBucket(per_minute / 60.0, capacity=max(1.0, per_minute / 12.0))
+        return _limiters[provider]
+
+
+class FetchStat(NamedTuple):
+    symbol: str
+    latency: float
+    wait: float
+    bars: int
+    error: Optional[str]
+
+
+class FetchReport(NamedTuple):
+    frames: Dict[str, pd.DataFrame]
+    errors: Dict[str, str]
+    stats: pd.DataFrame
+
+
+def unique_symbols(symbols: Iterable[str]) -> List[str]:
+    """Symbols in first-seen order without duplicates"""
+    return list(dict.fromkeys(symbols))
+
+
+async def fetch_intraday(session: aiohttp.ClientSession, symbol: str, interval: str = '1min',
+                         outputsize: str = 'full') -> pd.DataFrame:
+    """One Alpha Vantage TIME_SERIES_INTRADAY request, as an oldest-first frame"""
+    params = {
+        'function': 'TIME_SERIES_INTRADAY',
+        'symbol': symbol,
+        'interval': interval,
+        'outputsize': outputsize,
+        'apikey': settings.ALPHA_VANTAGE_API_KEY,
+    }
+    async with session.get(ALPHA_VANTAGE_URL, params=params) as response:
+        response.raise_for_status()
+        payload = await response.json()
+    frame = alpha_vantage_frame(payload)
+    if frame is None:
+        # Quota and bad-symbol errors come back as 200 with a message instead of a series
+        raise ValueError(payload.get('Note') or payload.get('Information') or payload.get('Error Message')
+                         or 'No time series in response')
+    return frame
+
+
+async def fetch_universe(
+    symbols: Iterable[str],
+    interval: str = '1min',
+    outputsize: str = 'full',
+    max_concurrency: Optional[int] = None,
+    limiter: Optional[TokenBucket] = None,
+    session: Optional[aiohttp.ClientSession] = None,
+    timeout: float = 30.0,
+) -> FetchReport:
+    """Fetch intraday bars for many symbols concurrently.
+
+    Args:
+        symbols: Symbols to fetch; duplicates are fetched once
+        interval: Alpha Vantage bar interval
+        outputsize: 'full' history or the latest 100 bars ('compact')
+        max_concurrency: Requests in flight (defaults to settings.MARKET_DATA_MAX_CONCURRENCY)
+        limiter: Token bucket to draw from (defaults to the Alpha Vantage bucket)
+        session: Existing session to reuse; otherwise one pooled session is opened
+        timeout: Total seconds allowed per request
+
+    Returns:
+        FetchReport: Frames that arrived, errors by symbol, and a stats table
+        with latency, rate-limiter wait and bar count per symbol
+    """
+    symbols = unique_symbols(symbols)
+    max_concurrency = max_concurrency or settings.MARKET_DATA_MAX_CONCURRENCY
+    limiter = limiter or get_rate_limiter('alpha_vantage')
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(client, symbol):
+        async with semaphore:
+            wait = await limiter.acquire()
+            start = time.monotonic()
+            try:
+                frame = await fetch_intraday(client, symbol, interval, outputsize)
+            except Exception as e:
+                return symbol, None, FetchStat(symbol, time.monotonic() - start, wait, 0, str(e) or type(e).__name__)
+            return symbol, frame, FetchStat(symbol, time.monotonic() - start, wait, len(frame), None)
+
+    async def run(client):
+        return await asyncio.gather(*(fetch(client, symbol) for symbol in symbols))
+
+    if session is not None:
+        results = await run(session)
+    else:
+        connector = aiohttp.TCPConnector(limit=max_concurrency)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as client:
+            results = await run(client)
+
+    frames = {symbol: frame for symbol, frame, _ in results if frame is not None}
+    errors = {symbol: stat.error for symbol, _, stat in results if stat.error is not None}
+    stats = pd.DataFrame([stat for _, _, stat in results], columns=FetchStat._fields).set_index('symbol')
+    if errors:
+        logger.warning(f"Market data fetch failed for {len(errors)}/{len(symbols)} symbols: {errors}")
+    if len(stats):
+        logger.info(
+            f"Fetched {len(frames)}/{len(symbols)} symbols: "
+            f"p50 latency {stats['latency'].median():.2f}s, max {stats['latency'].max():.2f}s, "
+            f"rate-limit wait {stats['wait'].sum():.2f}s total"
+        )
+    return FetchReport(frames, errors, stats)
+
+
+def fetch_universe_sync(symbols: Iterable[str], **kwargs) -> FetchReport:
+    """fetch_universe for synchronous callers (Celery tasks, management commands)"""
+    return asyncio.run(fetch_universe(symbols, **kwargs))
+
+
+def overlaps_stored(frame: pd.DataFrame, last_timestamp) -> bool:
+    """True when a delta response reaches back to the last stored bar, i.e. leaves no gap"""
+    return last_timestamp is None or (len(frame) > 0 and frame.index[0] <= last_timestamp)
+
+
+class RefreshReport(NamedTuple):
+    added: Dict[str, int]
+    errors: Dict[str, str]
+    stats: pd.DataFrame
+
+
+async def refresh_universe(symbols: Iterable[str], store: BarStore, timeframe: str = '1min',
+                           interval: str = '1min', **kwargs) -> RefreshReport:
+    """Bring the stored bars of many symbols up to date, downloading only the delta.
+
+    Symbols with stored history request Alpha Vantage's ``compact`` output
+    (latest 100 bars), which is merged into the store: overlapping bars are
+    de-duplicated (the refreshed values win) and new ones are appended. When
+    a compact response does not reach back to the last stored bar, the gap
+    is filled with one ``full`` request. Symbols with no history start with
+    ``full``.
+
+    Returns:
+        RefreshReport: Bars added and errors per symbol, plus fetch stats
+        for every request made
+    """
+    symbols = unique_symbols(symbols)
+    last = {symbol: store.last_timestamp(symbol, timeframe) for symbol in symbols}
+    added, errors, stats = {}, {}, []
+
+    def ingest(report: FetchReport):
+        errors.update(report.errors)
+        stats.append(report.stats)
+        for symbol, frame in report.frames.items():
+            added[symbol] = store.merge(symbol, timeframe, frame)
+            errors.pop(symbol, None)
+
+    delta = [symbol for symbol in symbols if last[symbol] is not None]
+    full = [symbol for symbol in symbols if last[symbol] is None]
+    if delta:
+        report = await fetch_universe(delta, interval=interval, outputsize='compact', **kwargs)
+        gaps = [symbol for symbol, frame in report.frames.items() if not overlaps_stored(frame, last[symbol])]
+        ingest(report._replace(frames={s: f for s, f in report.frames.items() if s not in gaps}))
+        full += gaps
+    if full:
+        ingest(await fetch_universe(full, interval=interval, outputsize='full', **kwargs))
+
+    stats = pd.concat(stats) if stats else pd.DataFrame(columns=FetchStat._fields[1:])
+    logger.info(f"Refreshed {len(added)}/{len(symbols)} symbols ({len(full)} full downloads), "
+                f"{sum(added.values())} new bars")
+    return RefreshReport(added, errors, stats)
+
+
+def refresh_universe_sync(symbols: Iterable[str], store: BarStore, **kwargs) -> RefreshReport:
+    """refresh_universe for synchronous callers"""
+    return asyncio.run(refresh_universe(symbols, store, **kwargs))
+
+
+async def refresh_alpaca_bars(alpaca, store: BarStore, symbol: str, timeframe, key: str,
+                              limit: int = 1000, max_pages: int = 10, start: Optional[str] = None) -> int:
+    """Fetch only the Alpaca bars from the last stored one onwards and merge them.
+
+    ``start`` is inclusive, so the first returned bar re-sends the last stored
+    one (updating it if it was still forming). Full pages are followed until
+    the feed is caught up; an empty partition fetches the latest ``limit`` bars,
+    or every bar from ``start`` when given.
+
+    Returns:
+        int: Number of bars added under (symbol, key)
+    """
+    last = store.last_timestamp(symbol, key)
+    if last is None and start is None:
+        return store.merge(symbol, key, await alpaca.get_bars(symbol, timeframe, limit=limit, output='frame'))
+    added = 0
+    for _ in range(max_pages):
+        since = last.isoformat() if last is not None else start
+        bars = await alpaca.get_bars(symbol, timeframe, start=since, limit=limit, output='frame')
+        if len(bars) == 0:
+            break
+        added += store.merge(symbol, key, bars)
+        if len(bars) < limit:
+            break
+        last = store.last_timestamp(symbol, key)
+    return added
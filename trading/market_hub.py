@@ -0,0 +1,374 @@
+"""Central market-data hub.
+
+One asyncio process subscribes to streamed bars and quotes for the active
+symbol set, keeps the latest bars and running indicator state per symbol in
+memory, and publishes every update once to the channel layer group
+``market.<symbol>``. Upstream load therefore depends on the number of
+symbols watched, not on the number of connected sessions.
+
+The active set is the hub's static symbols plus whatever consumers ask for
+by sending ``hub.watch`` / ``hub.unwatch`` messages to the ``market.hub``
+group. Watchers are tracked by their ``reply_channel``, so repeated watches
+from one consumer count once; each watch is answered on that channel with a
+snapshot of the symbol's current state. On start the hub asks the
+``market.clients`` group to re-send their watches, so a restarted hub
+rebuilds its watchers.
+
+Indicator state saves and bar store writes are blocking, so ``on_bar``
+only queues them; a writer task runs them in a worker thread, batching the
+bars that arrived during the previous write.
+
+Sources implement ``subscribe(symbols)``, ``unsubscribe(symbols)`` and
+``run(hub)``: ``AlpacaStreamSource`` wraps the Alpaca websocket stream and
+``ReplaySource`` plays recorded bars for offline testing.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional, Set
+
+import pandas as pd
+
+from .indicators import get_indicator_state, save_indicator_state
+from .resample import BarResampler, resample_store
+
+logger = logging.getLogger(__name__)
+
+HUB_GROUP = 'market.hub'
+# Every connected consumer; asked to re-send its watches when the hub (re)starts
+CLIENTS_GROUP = 'market.clients'
+
+
+def symbol_group(symbol: str) -> str:
+    """Channel layer group carrying updates for one symbol"""
+    return f'market.{symbol}'
+
+
+def _bar_message(bar: Dict) -> Dict:
+    return {**bar, 'timestamp': pd.Timestamp(bar['timestamp']).isoformat()}
+
+
+class SymbolState:
+    """Latest bars, quote and indicator state for one symbol"""
+
+    def __init__(self, symbol: str, timeframe: str, history: int):
+        self.symbol = symbol
+        self.bars = deque(maxlen=history)
+        self.indicators = get_indicator_state(symbol, timeframe)
+        self.quote = None
+        self.quote_published = 0.0
+        self.resampler = BarResampler() if timeframe == '1min' else None
+
+    def snapshot(self) -> Dict:
+        return {
+            'symbol': self.symbol,
+            'bars': [_bar_message(bar) for bar in self.bars],
+            'indicators': self.indicators.values if self.indicators.count else {},
+            'quote': self.quote,
+        }
+
+
+class MarketHub:
+    """Fan-in of upstream market data, fan-out to per-symbol channel groups.
+
+    Args:
+        source: Stream or replay source
+        channel_layer: Channels layer to publish to (None only records state)
+        symbols: Symbols that are always active
+        timeframe: Bar timeframe of the source, used for indicator state and the store
+        history: Bars kept in memory per symbol
+        store: Optional BarStore that streamed bars are merged into and
+            that warms up newly watched symbols; with 1-minute bars the
+            higher timeframes are derived into it as their buckets close
+        quote_interval: Minimum seconds between quote publishes per symbol
+    """
+
+    def __init__(self, source, channel_layer=None, symbols: Iterable[str] = (), timeframe: str = '1min',
+                 history: int = 500, store=None, quote_interval: float = 1.0):
+        self.source = source
+        self.channel_layer = channel_layer
+        self.static = set(symbols)
+        self.timeframe = timeframe
+        self.history = history
+        self.store = store
+        self.quote_interval = quote_interval
+        self.watchers: Dict[str, Set[str]] = {}  # symbol -> channels watching it
+        self.states: Dict[str, SymbolState] = {}
+        self.published = 0
+        self._writes: Optional[asyncio.Queue] = None  # set while run() is running
+
+    @property
+    def active_symbols(self):
+        return self.static | {symbol for symbol, channels in self.watchers.items() if channels}
+
+    def _state(self, symbol: str) -> SymbolState:
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = SymbolState(symbol, self.timeframe, self.history)
+            if self.store is not None:
+                stored = self.store.read(symbol, self.timeframe, limit=self.history)
+                for timestamp, row in zip(stored.index, stored.itertuples(index=False)):
+                    state.bars.append({'symbol': symbol, 'timestamp': timestamp, 'open': row[0], 'high': row[1],
+                                       'low': row[2], 'close': row[3], 'volume': row[4]})
+                state.indicators.extend(stored['4. close'], stored.index)
+        return state
+
+    async def watch(self, symbol: str, channel: str):
+        """Add ``channel`` as a watcher of ``symbol`` and send it a snapshot, subscribing upstream on the first one"""
+        newly_active = symbol not in self.active_symbols
+        self.watchers.setdefault(symbol, set()).add(channel)
+        state = self._state(symbol)
+        if newly_active:
+            await self.source.subscribe([symbol])
+            logger.info(f"Market hub subscribed to {symbol}")
+        if self.channel_layer is not None:
+            await self.channel_layer.send(channel, {'type': 'market.snapshot', **state.snapshot()})
+
+    async def unwatch(self, symbol: str, channel: str):
+        """Drop ``channel``'s watch, unsubscribing upstream when nobody watches the symbol any more"""
+        channels = self.watchers.get(symbol)
+        if not channels or channel not in channels:
+            return
+        channels.discard(channel)
+        if symbol not in self.active_symbols:
+            del self.watchers[symbol]
+            await self.source.unsubscribe([symbol])
+            logger.info(f"Market hub unsubscribed from {symbol}")
+
+    async def on_bar(self, bar: Dict):
+        """Fold a completed bar into the symbol's state and publish it"""
+        symbol = bar['symbol']
+        state = self._state(symbol)
+        timestamp = pd.Timestamp(bar['timestamp'])
+        last = state.indicators.last_timestamp
+        if last is not None and timestamp <= last:
+            return  # replayed or duplicate bar
+        state.bars.append(bar)
+        indicators = state.indicators.update(bar['close'], timestamp)
+        # Derive each higher-timeframe bar from the stored minutes as soon as it closes
+        closed = [timeframe for timeframe, _ in state.resampler.update(bar)] if state.resampler is not None else []
+        write = (state.indicators, state.indicators.snapshot(), bar, closed)
+        if self._writes is not None:
+            self._writes.put_nowait(write)
+        else:
+            await asyncio.to_thread(self._persist, [write])
+        await self.publish(symbol, {'type': 'market.bar', 'bar': _bar_message(bar), 'indicators': indicators})
+
+    def _persist(self, writes):
+        """Save indicator state and store bars for queued (state, snapshot, bar, closed) writes"""
+        pending = {}
+        for indicators, snapshot, bar, closed in writes:
+            entry = pending.setdefault(bar['symbol'], {'state': indicators, 'bars': [], 'closed': []})
+            entry['snapshot'] = snapshot  # only the newest snapshot needs saving
+            entry['bars'].append(bar)
+            entry['closed'] += [timeframe for timeframe in closed if timeframe not in entry['closed']]
+        for symbol, entry in pending.items():
+            save_indicator_state(entry['state'], entry['snapshot'])
+            if self.store is None:
+                continue
+            try:
+                self.store.merge(symbol, self.timeframe, entry['bars'])
+                if entry['closed']:
+                    resample_store(self.store, symbol, source=self.timeframe, timeframes=entry['closed'])
+            except ValueError as e:
+                logger.warning(f"Not storing streamed bars for {symbol}: {str(e)}")
+
+    async def _write_loop(self):
+        """Run queued writes in a worker thread until the None sentinel"""
+        while True:
+            writes = [await self._writes.get()]
+            while not self._writes.empty():
+                writes.append(self._writes.get_nowait())
+            done = writes[-1] is None
+            writes = [write for write in writes if write is not None]
+            if writes:
+                try:
+                    await asyncio.to_thread(self._persist, writes)
+                except Exception as e:
+                    logger.error(f"Market hub failed to persist {len(writes)} bars: {str(e)}")
+            if done:
+                return
+
+    async def on_quote(self, quote: Dict):
+        """Record the latest quote, publishing at most once per ``quote_interval``"""
+        state = self._state(quote['symbol'])
+        state.quote = {**quote, 'timestamp': pd.Timestamp(quote['timestamp']).isoformat()}
+        now = time.monotonic()
+        if now - state.quote_published >= self.quote_interval:
+            state.quote_published = now
+            await self.publish(quote['symbol'], {'type': 'market.quote', 'quote': state.quote})
+
+    async def publish(self, symbol: str, message: Dict):
+        if self.channel_layer is None:
+            return
+        await self.channel_layer.group_send(symbol_group(symbol), {'symbol': symbol, **message})
+        self.published += 1
+
+    async def _listen(self):
+        """Handle hub.watch / hub.unwatch control messages from consumers"""
+        channel = await self.channel_layer.new_channel()
+        await self.channel_layer.group_add(HUB_GROUP, channel)
+        await self.channel_layer.group_send(CLIENTS_GROUP, {'type': 'market.resync'})
+        while True:
+            message = await self.channel_layer.receive(channel)
+            try:
+                if message['type'] == 'hub.watch':
+                    await self.watch(message['symbol'], message['reply_channel'])
+                elif message['type'] == 'hub.unwatch':
+                    await self.unwatch(message['symbol'], message['reply_channel'])
+            except Exception as e:
+                logger.error(f"Market hub failed to handle {message}: {str(e)}")
+
+    async def run(self):
+        """Subscribe to the static symbols and process upstream and control messages"""
+        for symbol in self.static:
+            self._state(symbol)
+        if self.static:
+            await self.source.subscribe(sorted(self.static))
+        self._writes = asyncio.Queue()
+        writer = asyncio.create_task(self._write_loop())
+        tasks = [asyncio.create_task(self.source.run(self))]
+        if self.channel_layer is not None:
+            tasks.append(asyncio.create_task(self._listen()))
+        try:
+            # The replay source finishes; the live stream and listener run until cancelled
+            await tasks[0]
+        finally:
+            for task in tasks[1:]:
+                task.cancel()
+            # Flush what is queued before returning
+            self._writes.put_nowait(None)
+            await writer
+            self._writes = None
+
+
+def _alpaca_symbol(symbol: str) -> str:
+    return symbol.replace('-', '/') if symbol.endswith('-USD') else symbol
+
+
+def _hub_symbol(symbol: str) -> str:
+    return symbol.replace('/', '-')
+
+
+class AlpacaStreamSource:
+    """Live bars and quotes from the Alpaca websocket stream (crypto pairs as BTC-USD)"""
+
+    def __init__(self, stream=None):
+        if stream is None:
+            from .alpaca_client import AlpacaClient
+
+            stream = AlpacaClient().stream
+        self.stream = stream
+        self.hub = None
+        self.loop = None
+
+    async def _to_hub(self, coro):
+        """Run a hub coroutine on the hub's loop from the stream's handler"""
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    async def _on_bar(self, bar):
+        await self._to_hub(self.hub.on_bar({
+            'symbol': _hub_symbol(bar.symbol),
+            'timestamp': pd.Timestamp(bar.timestamp, tz='UTC'),
+            'open': float(bar.open),
+            'high': float(bar.high),
+            'low': float(bar.low),
+            'close': float(bar.close),
+            'volume': float(bar.volume),
+        }))
+
+    async def _on_quote(self, quote):
+        await self._to_hub(self.hub.on_quote({
+            'symbol': _hub_symbol(quote.symbol),
+            'timestamp': pd.Timestamp(quote.timestamp, tz='UTC'),
+            'bid_price': float(quote.bid_price),
+            'ask_price': float(quote.ask_price),
+            'bid_size': float(quote.bid_size),
+            'ask_size': float(quote.ask_size),
+        }))
+
+    def _split(self, symbols):
+        crypto = [_alpaca_symbol(symbol) for symbol in symbols if symbol.endswith('-USD')]
+        equities = [symbol for symbol in symbols if not symbol.endswith('-USD')]
+        return equities, crypto
+
+    def _subscribe(self, symbols):
+        equities, crypto = self._split(symbols)
+        if equities:
+            self.stream.subscribe_bars(self._on_bar, *equities)
+            self.stream.subscribe_quotes(self._on_quote, *equities)
+        if crypto:
+            self.stream.subscribe_crypto_bars(self._on_bar, *crypto)
+            self.stream.subscribe_crypto_quotes(self._on_quote, *crypto)
+
+    def _unsubscribe(self, symbols):
+        equities, crypto = self._split(symbols)
+        if equities:
+            self.stream.unsubscribe_bars(*equities)
+            self.stream.unsubscribe_quotes(*equities)
+        if crypto:
+            self.stream.unsubscribe_crypto_bars(*crypto)
+            self.stream.unsubscribe_crypto_quotes(*crypto)
+
+    # The SDK blocks on its own event loop while (un)subscribing a running
+    # stream, so those calls are made from a worker thread
+    async def subscribe(self, symbols):
+        await asyncio.to_thread(self._subscribe, list(symbols))
+
+    async def unsubscribe(self, symbols):
+        await asyncio.to_thread(self._unsubscribe, list(symbols))
+
+    async def run(self, hub):
+        self.hub = hub
+        self.loop = asyncio.get_running_loop()
+        try:
+            # stream.run() blocks on the SDK's own event loop; handlers hand updates back to ours
+            await asyncio.to_thread(self.stream.run)
+        finally:
+            self.stream.stop()
+
+
+class ReplaySource:
+    """Recorded bars played through the hub, for offline testing.
+
+    Args:
+        bars: Symbol -> DataFrame of bars (any layout accepted by the bar store)
+        speed: Playback speed as a multiple of real time; None plays as fast as possible
+    """
+
+    def __init__(self, bars: Dict[str, pd.DataFrame], speed: Optional[float] = None):
+        from .bar_store import to_bar_frame
+
+        frames = []
+        for symbol, data in bars.items():
+            frame = to_bar_frame(data)
+            frame['symbol'] = symbol
+            frames.append(frame)
+        self.bars = pd.concat(frames).sort_index(kind='stable') if frames else pd.DataFrame()
+        self.speed = speed
+        self.symbols = set()
+
+    @classmethod
+    def from_store(cls, store, symbols: Iterable[str], timeframe: str = '1min', start=None, end=None,
+                   speed: Optional[float] = None) -> 'ReplaySource':
+        return cls({symbol: store.read(symbol, timeframe, start=start, end=end) for symbol in symbols}, speed)
+
+    async def subscribe(self, symbols):
+        self.symbols.update(symbols)
+
+    async def unsubscribe(self, symbols):
+        self.symbols.difference_update(symbols)
+
+    async def run(self, hub):
+        previous = None
+        for timestamp, row in zip(self.bars.index, self.bars.itertuples(index=False)):
+            if self.speed and previous is not None and timestamp > previous:
+                await asyncio.sleep((timestamp - previous).total_seconds() / self.speed)
+            previous = timestamp
+            if row.symbol not in self.symbols:
+                continue
+            await hub.on_bar({'symbol': row.symbol, 'timestamp': timestamp, 'open': row.open, 'high': row.high,
+                              'low': row.low, 'close': row.close, 'volume': row.volume})
+            # Let control messages and publishes interleave with a fast replay
+            await asyncio.sleep(0)
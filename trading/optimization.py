@@ -0,0 +1,226 @@
+"""Parallel walk-forward optimisation for the strategies and the trade model.
+
+The history is cut into rolling (train, test) windows. For every window the
+feature matrix (open, close, SMA_5, EMA_10, RSI, next-bar target) is built
+once in the parent and placed in a shared memory block; worker processes
+attach to the block by name, so each task only ships a few parameters
+instead of pickled arrays.
+
+Strategy parameter sets are scored with the vectorised backtest on the test
+segment (indicators warm up on the train segment). RandomForest
+hyperparameters are scored by out-of-sample accuracy, using the same
+features as ``ai_trading.train_model``.
+"""
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from .backtest import MINUTE_BARS_PER_YEAR, OPEN_COLUMN, run_backtest
+from .indicators import as_price_array, compute_indicators
+from .result_cache import ResultCache, data_fingerprint
+from .strategies import STRATEGY_FACTORIES
+
+# Column layout of the per-window feature matrix
+FEATURE_COLUMNS = ('open', 'close', 'SMA_5', 'EMA_10', 'RSI', 'target')
+MODEL_FEATURES = slice(2, 5)
+
+STRATEGY_GRIDS = {
+    'sma_crossover': {'fast': [3, 5, 8, 10], 'slow': [20, 30, 50]},
+    'rsi': {'window': [7, 14, 21], 'oversold': [20, 25, 30], 'overbought': [70, 75, 80]},
+    'combined': {
+        'fast': [5, 10],
+        'slow': [20, 50],
+        'macd': [(12, 26, 9), (8, 17, 9), (5, 35, 5)],
+    },
+}
+
+MODEL_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 5, 10],
+    'min_samples_leaf': [1, 5],
+}
+
+
+class Window(NamedTuple):
+    start: int
+    split: int
+    end: int
+
+
+def walk_forward_windows(n: int, train_size: int, test_size: int, step: Optional[int] = None) -> List[Window]:
+    """Rolling windows of ``train_size`` bars followed by ``test_size`` out-of-sample bars"""
+    step = step or test_size
+    return [
+        Window(start, start + train_size, start + train_size + test_size)
+        for start in range(0, n - train_size - test_size + 1, step)
+    ]
+
+
+def parameter_grid(grid: Dict[str, Iterable]) -> List[Dict]:
+    """Every combination of a {name: values} grid"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def build_features(data: pd.DataFrame) -> np.ndarray:
+    """Feature matrix with FEATURE_COLUMNS for one window of bars"""
+    close = as_price_array(data)
+    open_ = data[OPEN_COLUMN].to_numpy(dtype=np.float64) if OPEN_COLUMN in data else close
+    indicators = compute_indicators(close, sma=(5,), ema_spans=(10,), rsi=14, macd=None, bollinger=None)
+    target = np.full(len(close), np.nan)
+    target[:-1] = (close[1:] > close[:-1]).astype(np.float64)
+    return np.column_stack([open_, close, indicators['SMA_5'], indicators['EMA_10'], indicators['RSI'], target])
+
+
+# Worker side: shared blocks are attached once per process and reused across tasks
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+_own_tracker = False
+
+
+def _init_worker(start_method: str):
+    global _own_tracker
+    # Forked workers share the parent's resource tracker, spawned ones start their own
+    _own_tracker = start_method != 'fork'
+
+
+def _attach(name: str, shape) -> np.ndarray:
+    block = _attached.get(name)
+    if block is None:
+        block = shared_memory.SharedMemory(name=name)
+        if _own_tracker:
+            # The parent owns the block; keep this worker's tracker from unlinking it
+            resource_tracker.unregister(block._name, 'shared_memory')
+        _attached[name] = block
+    return np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+
+
+def _evaluate(task: Dict) -> Dict:
+    cache = task['cache']
+    if cache is None:
+        return _score(task)
+    params = {name: task[name] for name in ('kind', 'name', 'params', 'split', 'periods_per_year')}
+    return {**cache.get_or_compute('walk_forward', params, None, lambda: _score(task), task['fingerprint']),
+            'window': task['window']}
+
+
+def _score(task: Dict) -> Dict:
+    features = _attach(task['block'], task['shape'])
+    split = task['split']
+    row = {'window': task['window'], 'kind': task['kind'], 'name': task['name'], 'params': repr(task['params'])}
+
+    if task['kind'] == 'strategy':
+        bars = pd.DataFrame({OPEN_COLUMN: features[:, 0], '4. close': features[:, 1]})
+        signal = STRATEGY_FACTORIES[task['name']](**task['params'])(features[:, 1]).signal
+        train = run_backtest(bars.iloc[:split], signal[:split], periods_per_year=task['periods_per_year'])
+        test = run_backtest(bars.iloc[split:], signal[split:], periods_per_year=task['periods_per_year'])
+        for prefix, result in (('train', train), ('test', test)):
+            for metric in ('sharpe_ratio', 'total_return', 'max_drawdown', 'win_rate', 'num_trades'):
+                row[f'{prefix}_{metric}'] = result.metrics[metric]
+        row['score'] = row['test_sharpe_ratio']
+        return row
+
+    from sklearn.ensemble import RandomForestClassifier
+
+    X, y = features[:, MODEL_FEATURES], features[:, -1]
+    valid = ~(np.isnan(X).any(axis=1) | np.isnan(y))
+    train_rows = valid.copy()
+    train_rows[split:] = False
+    test_rows = valid.copy()
+    test_rows[:split] = False
+    model = RandomForestClassifier(random_state=42, n_jobs=1, **task['params'])
+    model.fit(X[train_rows], y[train_rows])
+    row['train_accuracy'] = float(model.score(X[train_rows], y[train_rows]))
+    row['test_accuracy'] = float(model.score(X[test_rows], y[test_rows]))
+    row['score'] = row['test_accuracy']
+    return row
+
+
+def walk_forward_optimize(
+    data: pd.DataFrame,
+    train_size: int,
+    test_size: int,
+    step: Optional[int] = None,
+    strategy_grids: Optional[Dict[str, Dict]] = None,
+    model_grid: Optional[Dict] = None,
+    max_workers: Optional[int] = None,
+    periods_per_year: int = MINUTE_BARS_PER_YEAR,
+    cache: Optional[ResultCache] = None,
+) -> pd.DataFrame:
+    """Sweep strategy parameters and model hyperparameters over walk-forward windows.
+
+    Args:
+        data: Oldest-first bars in the Alpha Vantage column layout
+        train_size: Bars in each in-sample segment
+        test_size: Bars in each out-of-sample segment
+        step: Bars between window starts (defaults to ``test_size``)
+        strategy_grids: {strategy: {param: values}}; defaults to STRATEGY_GRIDS
+        model_grid: RandomForest {param: values}; defaults to MODEL_GRID, {} to skip
+        max_workers: Worker processes (defaults to all CPU cores)
+        periods_per_year: Bars per year for annualising Sharpe ratios
+        cache: ResultCache for per-window scores; unchanged windows and
+            parameter sets are not re-evaluated
+
+    Returns:
+        DataFrame: One row per (kind, name, params), ranked by mean out-of-sample
+        score (Sharpe ratio for strategies, accuracy for the model)
+    """
+    strategy_grids = STRATEGY_GRIDS if strategy_grids is None else strategy_grids
+    model_grid = MODEL_GRID if model_grid is None else model_grid
+    windows = walk_forward_windows(len(data), train_size, test_size, step)
+    if not windows:
+        raise ValueError(f"{len(data)} bars is too short for a {train_size}+{test_size} window")
+
+    candidates = [('strategy', name, params) for name, grid in strategy_grids.items() for params in parameter_grid(grid)]
+    if model_grid:
+        candidates += [('model', 'random_forest', params) for params in parameter_grid(model_grid)]
+
+    blocks = []
+    try:
+        tasks = []
+        for number, window in enumerate(windows):
+            features = build_features(data.iloc[window.start:window.end])
+            block = shared_memory.SharedMemory(create=True, size=features.nbytes)
+            blocks.append(block)
+            np.ndarray(features.shape, dtype=np.float64, buffer=block.buf)[:] = features
+            fingerprint = data_fingerprint(features) if cache is not None else None
+            for kind, name, params in candidates:
+                tasks.append({
+                    'block': block.name,
+                    'shape': features.shape,
+                    'split': window.split - window.start,
+                    'window': number,
+                    'kind': kind,
+                    'name': name,
+                    'params': params,
+                    'periods_per_year': periods_per_year,
+                    'cache': cache,
+                    'fingerprint': fingerprint,
+                })
+
+        max_workers = max_workers or os.cpu_count() or 1
+        start_method = multiprocessing.get_start_method()
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(start_method,)) as pool:
+            rows = list(pool.map(_evaluate, tasks, chunksize=max(1, len(tasks) // (4 * max_workers))))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    return rank_results(pd.DataFrame(rows))
+
+
+def rank_results(results: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate per-window rows into a table ranked by mean out-of-sample score"""
+    metrics = [column for column in results.columns if column not in ('window', 'kind', 'name', 'params')]
+    table = results.groupby(['kind', 'name', 'params'])[metrics].mean()
+    table['score_std'] = results.groupby(['kind', 'name', 'params'])['score'].std()
+    table['windows'] = results.groupby(['kind', 'name', 'params'])['window'].nunique()
+    table = table.sort_values(['kind', 'score'], ascending=[True, False]).reset_index()
+    table.insert(0, 'rank', table.groupby('kind').cumcount() + 1)
+    return table
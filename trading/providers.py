@@ -0,0 +1,327 @@
+"""Market data providers behind one interface, with hedged requests and failover.
+
+Alpaca, Alpha Vantage and yfinance (and the offline recordings) each implement
+``MarketDataProvider.get_bars``, returning oldest-first bars in the bar
+store's Alpha Vantage layout. ``ProviderRouter`` asks them in priority order:
+
+* Every completed call records its latency in a process-wide
+  ``LatencyTracker`` per provider.
+* If the primary has not answered within its own p95 latency, the same
+  request is sent to the next provider and the first answer wins, so one
+  slow vendor no longer sets the tail latency of a trading decision.
+* Errors fall through to the next provider, and a provider that fails
+  ``failure_threshold`` times in a row is skipped for ``cooldown`` seconds.
+  A provider that answers with no bars (``NoBars``: a symbol it does not
+  serve, a quiet pre-market window) also falls through, but is not counted
+  as failing.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .bar_store import AV_COLUMNS, to_bar_frame
+from .market_calendar import is_crypto
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Recent call latencies and failures of one provider"""
+
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool = True):
+        with self._lock:
+            self.calls += 1
+            if ok:
+                self.latencies.append(latency)
+                self.consecutive_errors = 0
+            else:
+                self.errors += 1
+                self.consecutive_errors += 1
+
+    def quantile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self.latencies) < min_samples:
+                return None
+            return float(np.quantile(np.fromiter(self.latencies, dtype=float), q))
+
+    def stats(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'down': time.monotonic() < self.down_until,
+        }
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(name: str) -> LatencyTracker:
+    """Process-wide tracker for a provider, shared by every router"""
+    with _trackers_lock:
+        if name not in _trackers:
+            _trackers[name] = LatencyTracker()
+        return _trackers[name]
+
+
+class NoBars(ValueError):
+    """The provider answered, but has no bars for the symbol and timeframe"""
+
+
+class MarketDataProvider:
+    """Interface: ``get_bars`` for the timeframes in ``timeframes``"""
+    name = 'provider'
+    timeframes = ('1min', '5min', '15min', '1h', '1d')
+
+    async def get_bars(self, symbol: str, timeframe: str, limit: int = 100) -> pd.DataFrame:
+        """Latest ``limit`` bars, oldest first, in the Alpha Vantage column layout"""
+        raise NotImplementedError
+
+
+def _av_layout(bars, limit: int) -> pd.DataFrame:
+    frame = to_bar_frame(bars).iloc[-limit:]
+    return frame.rename(columns=AV_COLUMNS)
+
+
+class AlpacaProvider(MarketDataProvider):
+    """Bars from an AlpacaClient (or anything with its ``get_bars``, like RecordedAlpacaClient)"""
+    name = 'alpaca'
+
+    def __init__(self, client=None):
+        if client is None:
+            from .alpaca_client import AlpacaClient
+
+            client = AlpacaClient()
+        self.client = client
+
+    @staticmethod
+    def _timeframe(timeframe: str):
+        from alpaca_trade_api.rest import TimeFrame, TimeFrameUnit
+
+        return {
+            '1min': TimeFrame.Minute,
+            '5min': TimeFrame(5, TimeFrameUnit.Minute),
+            '15min': TimeFrame(15, TimeFrameUnit.Minute),
+            '1h': TimeFrame.Hour,
+            '1d': TimeFrame.Day,
+        }[timeframe]
+
+    async def get_bars(self, symbol: str, timeframe: str, limit: int = 100) -> pd.DataFrame:
+        if is_crypto(symbol):
+            raise NoBars(f"Alpaca stock bars do not cover {symbol}")
+        bars = await self.client.get_bars(symbol, self._timeframe(timeframe), limit=limit, output='frame')
+        if bars.empty:
+            raise NoBars(f"No Alpaca bars for {symbol}")
+        return _av_layout(bars, limit)
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    """Intraday bars from Alpha Vantage, within its shared rate limit"""
+    name = 'alpha_vantage'
+    timeframes = ('1min', '5min', '15min', '1h')
+    INTERVALS = {'1min': '1min', '5min': '5min', '15min': '15min', '1h': '60min'}
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+        self._sessions: Dict[asyncio.AbstractEventLoop, object] = {}  # one connection pool per event loop
+
+    def _session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None:
+            # Sessions of finished loops (asyncio.run) can no longer be closed properly
+            for finished in [other for other in list(self._sessions) if other.is_closed()]:
+                self._sessions.pop(finished).detach()
+            session = self._sessions[loop] = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return session
+
+    async def close(self) -> None:
+        """Close the connection pool of the running event loop"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    async def get_bars(self, symbol: str, timeframe: str, limit: int = 100) -> pd.DataFrame:
+        from .market_data import fetch_intraday, get_rate_limiter
+
+        await get_rate_limiter('alpha_vantage').acquire()
+        frame = await fetch_intraday(self._session(), symbol, self.INTERVALS[timeframe],
+                                     outputsize='compact' if limit <= 100 else 'full')
+        if frame.empty:
+            raise NoBars(f"No Alpha Vantage bars for {symbol}")
+        return _av_layout(frame, limit)
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Bars from yfinance (or RecordedYFinance), run in a worker thread"""
+    name = 'yfinance'
+    INTERVALS = {'1min': '1m', '5min': '5m', '15min': '15m', '1h': '60m', '1d': '1d'}
+    # Longest history yfinance serves for each interval
+    PERIODS = {'1min': '5d', '5min': '1mo', '15min': '1mo', '1h': '1y', '1d': '10y'}
+
+    def __init__(self, yf=None):
+        if yf is None:
+            import yfinance as yf
+        self.yf = yf
+
+    async def get_bars(self, symbol: str, timeframe: str, limit: int = 100) -> pd.DataFrame:
+        history = await asyncio.to_thread(
+            self.yf.Ticker(symbol).history, period=self.PERIODS[timeframe], interval=self.INTERVALS[timeframe])
+        if history.empty:
+            raise NoBars(f"No yfinance bars for {symbol}")
+        return _av_layout(history, limit)
+
+
+class ProviderRouter:
+    """Providers in priority order with hedging and failover.
+
+    Args:
+        providers: Primary first, then backups
+        hedge_delay: Seconds to wait before hedging while a provider has
+            fewer than ``min_samples`` latencies recorded
+        min_samples: Latencies needed before the provider's p95 is trusted
+        failure_threshold: Consecutive failures that take a provider out of rotation
+        cooldown: Seconds a failing provider stays out of rotation
+    """
+
+    def __init__(self, providers: Sequence[MarketDataProvider], hedge_delay: float = 1.0, min_samples: int = 20,
+                 failure_threshold: int = 3, cooldown: float = 30.0):
+        if not providers:
+            raise ValueError('At least one market data provider is required')
+        self.providers = list(providers)
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.counts = {'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'failovers': 0}
+
+    def _tracker(self, provider: MarketDataProvider) -> LatencyTracker:
+        return get_latency_tracker(provider.name)
+
+    def _candidates(self, timeframe: str) -> List[MarketDataProvider]:
+        supported = [provider for provider in self.providers if timeframe in provider.timeframes]
+        if not supported:
+            raise ValueError(f"No market data provider serves {timeframe} bars")
+        now = time.monotonic()
+        healthy = [provider for provider in supported if self._tracker(provider).down_until <= now]
+        # With everything down, try them all anyway rather than fail without asking
+        return healthy or supported
+
+    def _hedge_after(self, provider: MarketDataProvider) -> float:
+        p95 = self._tracker(provider).quantile(0.95, self.min_samples)
+        return p95 if p95 is not None else self.hedge_delay
+
+    async def _call(self, provider: MarketDataProvider, symbol: str, timeframe: str, limit: int) -> pd.DataFrame:
+        tracker = self._tracker(provider)
+        start = time.monotonic()
+        try:
+            bars = await provider.get_bars(symbol, timeframe, limit=limit)
+        except (asyncio.CancelledError, NoBars):
+            raise  # lost a hedge race, or a miss: says nothing about the provider's health
+        except Exception:
+            tracker.record(time.monotonic() - start, ok=False)
+            if tracker.consecutive_errors >= self.failure_threshold:
+                tracker.down_until = time.monotonic() + self.cooldown
+                logger.warning(f"Market data provider {provider.name} out of rotation for {self.cooldown:.0f}s")
+            raise
+        tracker.record(time.monotonic() - start)
+        return bars
+
+    async def get_bars(self, symbol: str, timeframe: str, limit: int = 100) -> pd.DataFrame:
+        """Latest bars from the first provider to answer.
+
+        Raises:
+            RuntimeError: When every provider failed
+        """
+        self.counts['requests'] += 1
+        queue = self._candidates(timeframe)
+        tasks: Dict[asyncio.Task, MarketDataProvider] = {}
+        errors = {}
+
+        def launch():
+            provider = queue.pop(0)
+            tasks[asyncio.create_task(self._call(provider, symbol, timeframe, limit))] = provider
+            return provider
+
+        first = primary = launch()
+        try:
+            while tasks:
+                # Hedge when the newest request has run past its provider's p95
+                timeout = self._hedge_after(primary) if queue and len(tasks) == 1 else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.counts['hedged'] += 1
+                    primary = launch()
+                    continue
+                for task in done:
+                    provider = tasks.pop(task)
+                    if task.exception() is None:
+                        if provider is not first:
+                            self.counts['failovers' if errors else 'hedge_wins'] += 1
+                        return task.result()
+                    errors[provider.name] = str(task.exception()) or type(task.exception()).__name__
+                if not tasks and queue:
+                    primary = launch()
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise RuntimeError(f"All market data providers failed for {symbol} {timeframe}: {errors}")
+
+    def stats(self) -> Dict:
+        return dict(self.counts, providers={provider.name: self._tracker(provider).stats() for provider in self.providers})
+
+
+PROVIDERS = {
+    'alpaca': AlpacaProvider,
+    'alpha_vantage': AlphaVantageProvider,
+    'yfinance': YFinanceProvider,
+}
+
+
+def build_router(names: Optional[Sequence[str]] = None, alpaca=None) -> ProviderRouter:
+    """Router over settings.MARKET_DATA_PROVIDERS (or ``names``), reusing ``alpaca`` as the Alpaca client"""
+    from django.conf import settings
+
+    names = names if names is not None else settings.MARKET_DATA_PROVIDERS
+    providers = []
+    for name in names:
+        try:
+            providers.append(PROVIDERS[name](alpaca) if name == 'alpaca' else PROVIDERS[name]())
+        except ImportError as e:
+            logger.warning(f"Market data provider {name} unavailable: {str(e)}")
+    return ProviderRouter(providers, hedge_delay=settings.MARKET_DATA_HEDGE_DELAY)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_market_router() -> ProviderRouter:
+    """Process-wide router over settings.MARKET_DATA_PROVIDERS, for views and tasks.
+
+    Blocking callers run its ``get_bars`` with ``alpaca_client.run_sync``, so
+    they share the providers' connection pools on the client event loop.
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = build_router()
+        return _router
@@ -0,0 +1,471 @@
+"""Offline market data and broker providers backed by recorded files.
+
+A recording is a directory holding a bar store of recorded bars plus JSON
+snapshots of the broker account:
+
+    <recording>/bars/AAPL/1min/...   (BarStore partitions)
+    <recording>/account.json
+    <recording>/positions.json
+    <recording>/assets.json
+
+The providers are drop-in replacements for the live ones, so load tests,
+benchmarks and regression tests run with no network:
+
+* ``RecordedAlpacaClient`` - ``AlpacaClient`` (plus the ``api`` calls made
+  through the REST client), with orders filled in memory at recorded prices
+* ``RecordedTimeSeries`` - ``alpha_vantage.timeseries.TimeSeries.get_intraday``
+* ``RecordedYFinance`` / ``RecordedTicker`` - ``yf.Ticker(symbol).history``
+
+Timeframes that were not recorded are derived from the 1-minute bars.
+
+A ``PlaybackClock`` decides which bars are visible: without a start every
+recorded bar is visible (full speed); with a start and no speed time stands still
+until it is moved; with a speed it runs at that multiple of real time.
+``InjectedLatency`` delays each call by a fixed latency plus an exponential
+tail to mimic a vendor.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .bar_store import AV_COLUMNS, LATEST_COLUMNS, BarBatch, BarStore, format_bars
+from .market_calendar import get_market_calendar
+from .resample import TIMEFRAMES, resample_bars, timeframe_key
+
+# yfinance history periods
+_PERIODS = {
+    '1d': pd.Timedelta(days=1), '5d': pd.Timedelta(days=5), '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3), '6mo': pd.DateOffset(months=6), '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2), '5y': pd.DateOffset(years=5), '10y': pd.DateOffset(years=10),
+}
+
+
+def _decimal(value: float) -> Decimal:
+    return Decimal(str(float(value)))
+
+
+class Recording:
+    """Recorded bars and account snapshots in one directory"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.store = BarStore(self.root / 'bars')
+        self._derived: Dict[tuple, pd.DataFrame] = {}
+
+    def _load(self, name: str, default):
+        try:
+            return json.loads((self.root / f'{name}.json').read_text())
+        except FileNotFoundError:
+            return default
+
+    def _save(self, name: str, value):
+        self.root.mkdir(parents=True, exist_ok=True)
+        (self.root / f'{name}.json').write_text(json.dumps(value, indent=2, default=str))
+
+    def symbols(self) -> List[str]:
+        return sorted({partition['symbol'] for partition in self.store.partitions()})
+
+    def account(self) -> Dict:
+        return self._load('account', {'cash': '100000', 'day_trade_count': 0})
+
+    def positions(self) -> List[Dict]:
+        return self._load('positions', [])
+
+    def assets(self) -> List[Dict]:
+        """Recorded asset list, or every recorded symbol as an active tradable asset"""
+        return self._load('assets', [
+            {'symbol': symbol, 'class': 'crypto' if symbol.endswith('-USD') else 'us_equity', 'status': 'active',
+             'tradable': True, 'shortable': False, 'fractionable': True}
+            for symbol in self.symbols()
+        ])
+
+    def save_account(self, account: Dict, positions: List[Dict], assets: Optional[List[Dict]] = None):
+        self._save('account', account)
+        self._save('positions', positions)
+        if assets is not None:
+            self._save('assets', assets)
+
+    def bars(self, symbol: str, timeframe: str, start=None, end=None) -> pd.DataFrame:
+        """Recorded bars in the Alpha Vantage layout, derived from 1-minute bars if not recorded"""
+        if self.store.last_timestamp(symbol, timeframe) is not None or timeframe == '1min':
+            return self.store.read(symbol, timeframe, start=start, end=end)
+        key = (symbol, timeframe)
+        if key not in self._derived:
+            self._derived[key] = resample_bars(self.store.read(symbol, '1min'), timeframe)
+        bars = self._derived[key]
+        if not len(bars):
+            return bars
+        tz = bars.index.tz
+        if end is not None:
+            # The bucket containing ``end`` is rebuilt from the minutes up to it, so nothing later leaks in
+            end = _localize(end, tz)
+            bucket = end.floor(TIMEFRAMES[timeframe])
+            forming = resample_bars(self.store.read(symbol, '1min', start=bucket, end=end), timeframe)
+            bars = pd.concat([bars[bars.index < bucket], forming]) if len(forming) else bars[bars.index < bucket]
+        if start is not None:
+            bars = bars[bars.index >= _localize(start, tz)]
+        return bars
+
+
+def _localize(value, tz) -> pd.Timestamp:
+    stamp = pd.Timestamp(value)
+    if tz is None:
+        return stamp.tz_localize(None) if stamp.tzinfo is not None else stamp
+    return stamp.tz_localize(tz) if stamp.tzinfo is None else stamp.tz_convert(tz)
+
+
+class PlaybackClock:
+    """Simulated "now" of a replay.
+
+    Args:
+        start: Replay start; None makes every recorded bar visible
+        speed: Multiple of real time the clock runs at; None keeps it at
+            ``start`` until ``set`` or ``advance`` moves it
+    """
+
+    def __init__(self, start=None, speed: Optional[float] = None):
+        self.speed = speed
+        self.set(start)
+
+    def set(self, timestamp):
+        self._start = pd.Timestamp(timestamp) if timestamp is not None else None
+        self._started = time.monotonic()
+
+    def advance(self, delta):
+        self.set(self.now() + pd.Timedelta(delta))
+
+    def now(self) -> Optional[pd.Timestamp]:
+        if self._start is None or not self.speed:
+            return self._start
+        return self._start + pd.Timedelta(seconds=(time.monotonic() - self._started) * self.speed)
+
+
+class InjectedLatency:
+    """Per-call delay of ``latency`` seconds plus an exponential tail with mean ``jitter``"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self.calls = 0
+
+    def sample(self) -> float:
+        self.calls += 1
+        return self.latency + (self._random.expovariate(1.0 / self.jitter) if self.jitter else 0.0)
+
+    def sleep(self):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+
+    async def asleep(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class _RecordedProvider:
+    def __init__(self, recording, clock: Optional[PlaybackClock] = None, latency: Optional[InjectedLatency] = None):
+        self.recording = recording if isinstance(recording, Recording) else Recording(recording)
+        self.clock = clock or PlaybackClock()
+        self.latency = latency or InjectedLatency()
+
+    def _visible(self, symbol: str, timeframe: str, start=None, end=None) -> pd.DataFrame:
+        """Recorded bars up to the playback clock"""
+        now = self.clock.now()
+        if now is not None and (end is None or pd.Timestamp(end) > now):
+            end = now
+        return self.recording.bars(symbol, timeframe, start=start, end=end)
+
+
+class RecordedTimeSeries(_RecordedProvider):
+    """Stand-in for ``alpha_vantage.timeseries.TimeSeries``"""
+
+    def __init__(self, recording, output_format: str = 'pandas', **kwargs):
+        super().__init__(recording, **kwargs)
+        self.output_format = output_format
+
+    def get_intraday(self, symbol: str, interval: str = '15min', outputsize: str = 'compact'):
+        """Newest-first bars and metadata, as returned by TimeSeries.get_intraday"""
+        self.latency.sleep()
+        bars = self._visible(symbol, timeframe_key(interval))
+        if bars.empty:
+            raise ValueError('Invalid API call. Please retry or visit the documentation for TIME_SERIES_INTRADAY.')
+        if outputsize == 'compact':
+            bars = bars.iloc[-100:]
+        bars = bars.iloc[::-1]
+        meta = {
+            '1. Information': f'Intraday ({interval}) open, high, low, close prices and volume',
+            '2. Symbol': symbol,
+            '3. Last Refreshed': str(bars.index[0]),
+            '4. Interval': interval,
+            '5. Output Size': outputsize.capitalize(),
+            '6. Time Zone': str(bars.index.tz or 'US/Eastern'),
+        }
+        if self.output_format == 'pandas':
+            return bars.rename_axis('date'), meta
+        return {
+            str(timestamp): {column: f'{value:.4f}' for column, value in row.items()}
+            for timestamp, row in bars.iterrows()
+        }, meta
+
+
+class RecordedTicker(_RecordedProvider):
+    """Stand-in for ``yfinance.Ticker``"""
+
+    def __init__(self, symbol: str, recording, **kwargs):
+        super().__init__(recording, **kwargs)
+        self.ticker = symbol
+
+    def history(self, period: str = '1mo', interval: str = '1d', start=None, end=None, **kwargs) -> pd.DataFrame:
+        """Bars in yfinance's column layout; empty for an unknown symbol, like yfinance"""
+        self.latency.sleep()
+        bars = self._visible(self.ticker, timeframe_key(interval), start=start, end=end)
+        if start is None and len(bars) and period != 'max':
+            first = bars.index[-1] - _PERIODS[period] if period != 'ytd' else bars.index[-1].normalize().replace(month=1, day=1)
+            bars = bars[bars.index > first]
+        history = bars.rename(columns={column: field.capitalize() for field, column in AV_COLUMNS.items()})
+        return history.assign(Dividends=0.0, **{'Stock Splits': 0.0})
+
+
+class RecordedYFinance:
+    """Drop-in for the ``yfinance`` module: ``RecordedYFinance(recording).Ticker('AAPL').history()``"""
+
+    def __init__(self, recording, **kwargs):
+        self.recording = recording if isinstance(recording, Recording) else Recording(recording)
+        self.kwargs = kwargs
+
+    def Ticker(self, symbol: str) -> RecordedTicker:
+        return RecordedTicker(symbol, self.recording, **self.kwargs)
+
+
+class RecordedAlpacaClient(_RecordedProvider):
+    """Stand-in for ``AlpacaClient`` with the same method signatures and dict shapes.
+
+    The account starts from the recorded snapshot. Market orders and
+    marketable limit orders fill immediately at the latest visible close
+    (or the limit); other limit orders rest until ``cancel_all_orders``.
+    """
+
+    def __init__(self, recording, **kwargs):
+        super().__init__(recording, **kwargs)
+        account = self.recording.account()
+        self.cash = float(account['cash'])
+        self.day_trade_count = int(account.get('day_trade_count', 0))
+        self.positions = {p['symbol']: [int(p['qty']), float(p['avg_entry_price'])] for p in self.recording.positions()}
+        self.open_orders: List[Dict] = []
+        self._order_ids = itertools.count(1)
+        self.api = _RecordedREST(self)
+
+    def _prices(self, symbol: str):
+        """Latest visible close and the last close of the previous (UTC) day"""
+        columns = self.recording.store.read_columns(symbol, '1min', end=self.clock.now())
+        if not len(columns['close']):
+            raise ValueError(f"No recorded bars for {symbol}")
+        stamps = columns['timestamp']
+        day_start = np.searchsorted(stamps, stamps[-1].astype('datetime64[D]'), side='left')
+        lastday = columns['close'][day_start - 1] if day_start > 0 else columns['close'][0]
+        return float(columns['close'][-1]), float(lastday)
+
+    def _equity(self) -> float:
+        return self.cash + sum(qty * self._prices(symbol)[0] for symbol, (qty, _) in self.positions.items() if qty)
+
+    def _fill(self, symbol: str, side: str, qty: int, price: float):
+        signed = qty if side == 'buy' else -qty
+        held, avg = self.positions.get(symbol, [0, 0.0])
+        total = held + signed
+        if total == 0:
+            self.positions.pop(symbol, None)
+        elif held == 0 or (held > 0) == (signed > 0):
+            self.positions[symbol] = [total, (held * avg + signed * price) / total]
+        else:
+            # Reducing keeps the entry price; flipping starts a new one at the fill price
+            self.positions[symbol] = [total, avg if (held > 0) == (total > 0) else price]
+        self.cash -= signed * price
+
+    def _account(self) -> Dict:
+        equity = self._equity()
+        return {
+            'cash': _decimal(self.cash),
+            'portfolio_value': _decimal(equity),
+            'buying_power': _decimal(max(equity, 0.0)),
+            'day_trade_count': self.day_trade_count,
+            'trading_blocked': False,
+            'trades_blocked': False,
+            'transfers_blocked': False
+        }
+
+    async def get_account(self) -> Dict:
+        await self.latency.asleep()
+        return self._account()
+
+    async def place_order(self, symbol: str, qty: float, side: str, type: str = 'market', time_in_force: str = 'day',
+                          limit_price: Optional[float] = None, stop_price: Optional[float] = None) -> Dict:
+        await self.latency.asleep()
+        price, _ = self._prices(symbol)
+        order_id = f'rec-{next(self._order_ids)}'
+        marketable = type == 'market' or limit_price is None or (
+            price <= limit_price if side == 'buy' else price >= limit_price)
+        if marketable:
+            fill_price = price if limit_price is None else (min(price, limit_price) if side == 'buy' else max(price, limit_price))
+            self._fill(symbol, side, int(qty), fill_price)
+            status, filled = 'filled', qty
+        else:
+            self.open_orders.append({'id': order_id, 'symbol': symbol, 'side': side, 'qty': qty, 'limit_price': limit_price})
+            status, filled = 'new', 0
+        return {
+            'id': order_id,
+            'client_order_id': order_id,
+            'symbol': symbol,
+            'side': side,
+            'qty': qty,
+            'filled_qty': filled,
+            'type': type,
+            'status': status,
+            'created_at': self.clock.now() or pd.Timestamp.now(tz='UTC')
+        }
+
+    def _position(self, symbol: str) -> Optional[Dict]:
+        qty, avg = self.positions.get(symbol, [0, 0.0])
+        if not qty:
+            return None
+        price, lastday = self._prices(symbol)
+        return {
+            'symbol': symbol,
+            'qty': qty,
+            'avg_entry_price': _decimal(avg),
+            'market_value': _decimal(qty * price),
+            'unrealized_pl': _decimal(qty * (price - avg)),
+            'current_price': _decimal(price),
+            'lastday_price': _decimal(lastday),
+            'change_today': _decimal(price / lastday - 1.0)
+        }
+
+    async def get_position(self, symbol: str) -> Optional[Dict]:
+        await self.latency.asleep()
+        return self._position(symbol)
+
+    async def get_positions(self) -> List[Dict]:
+        await self.latency.asleep()
+        return [self._position(symbol) for symbol in sorted(self.positions)]
+
+    async def get_bars(self, symbol: str, timeframe, start: Optional[str] = None, end: Optional[str] = None,
+                       limit: int = 100, output: str = 'dicts'):
+        """Like AlpacaClient: the first ``limit`` bars from ``start``, otherwise the latest ``limit``.
+
+        Without ``start`` the bars come from the same window of sessions the
+        live client requests, ending at the playback clock.
+        """
+        await self.latency.asleep()
+        latest = start is None
+        if latest and self.clock.now() is not None:
+            start = get_market_calendar().history_start(timeframe, limit, at=self.clock.now())
+        bars = self._visible(symbol, timeframe_key(timeframe), start=start, end=end)
+        bars = bars.iloc[-limit:] if latest else bars.iloc[:limit]
+        return format_bars(bars.index, {field: bars[column].to_numpy(dtype=np.float64)
+                                        for field, column in AV_COLUMNS.items()}, output)
+
+    async def get_multi_bars(self, symbols: Sequence[str], timeframe, start: Optional[str] = None,
+                             end: Optional[str] = None, limit: int = 100) -> BarBatch:
+        """Latest ``limit`` bars of every symbol (from ``start`` when given) as one batch"""
+        await self.latency.asleep()
+        if start is None and self.clock.now() is not None:
+            start = get_market_calendar().history_start(timeframe, limit, at=self.clock.now())
+        parts = {}
+        for symbol in set(symbols):
+            bars = self._visible(symbol, timeframe_key(timeframe), start=start, end=end).iloc[-limit:]
+            parts[symbol] = format_bars(bars.index, {field: bars[column].to_numpy(dtype=np.float64)
+                                                     for field, column in AV_COLUMNS.items()}, 'columns')
+        return BarBatch.from_parts(parts)
+
+    async def get_latest(self, symbols: Sequence[str]) -> pd.DataFrame:
+        """Latest visible close as the last trade and as both sides of the quote (no spread is recorded)"""
+        await self.latency.asleep()
+        symbols = sorted(set(symbols))
+        rows = []
+        for symbol in symbols:
+            columns = self.recording.store.read_columns(symbol, '1min', end=self.clock.now(), limit=1)
+            if len(columns['close']):
+                price, volume, at = float(columns['close'][0]), float(columns['volume'][0]), columns['timestamp'][0]
+            else:
+                price, volume, at = np.nan, np.nan, None
+            rows.append((price, volume, at, price, np.nan, price, np.nan, at))
+        frame = pd.DataFrame(rows, index=pd.Index(symbols, name='symbol'), columns=list(LATEST_COLUMNS))
+        for column in ('trade_time', 'quote_time'):
+            frame[column] = pd.to_datetime(frame[column]).dt.tz_localize('UTC')
+        return frame
+
+    def close_all_positions(self) -> None:
+        self.latency.sleep()
+        for symbol, (qty, _) in list(self.positions.items()):
+            self._fill(symbol, 'sell' if qty > 0 else 'buy', abs(qty), self._prices(symbol)[0])
+
+    def cancel_all_orders(self) -> None:
+        self.latency.sleep()
+        self.open_orders = []
+
+
+class _RecordedREST:
+    """The subset of ``alpaca_trade_api.REST`` used directly through ``AlpacaClient.api``"""
+
+    def __init__(self, client: RecordedAlpacaClient):
+        self.client = client
+
+    def get_clock(self):
+        self.client.latency.sleep()
+        now = self.client.clock.now()
+        if now is None:
+            return SimpleNamespace(is_open=True, timestamp=pd.Timestamp.now(tz='UTC'))
+        # Open while any recorded symbol has a bar in the last couple of minutes
+        recent = [self.client.recording.store.read_columns(symbol, '1min', start=now - pd.Timedelta(minutes=2), end=now)
+                  for symbol in self.client.recording.symbols()]
+        return SimpleNamespace(is_open=any(len(columns['close']) for columns in recent), timestamp=now)
+
+    def list_assets(self, status: Optional[str] = None, asset_class: Optional[str] = None):
+        self.client.latency.sleep()
+        return [
+            SimpleNamespace(**asset) for asset in self.client.recording.assets()
+            if (status is None or asset.get('status') == status) and (asset_class is None or asset.get('class') == asset_class)
+        ]
+
+    def get_account(self):
+        self.client.latency.sleep()
+        account = self.client._account()
+        return SimpleNamespace(**{name: str(value) for name, value in account.items()},
+                               daytrade_count=account['day_trade_count'])
+
+    def list_positions(self):
+        self.client.latency.sleep()
+        return [SimpleNamespace(**self.client._position(symbol)) for symbol in sorted(self.client.positions)]
+
+
+async def record_alpaca(recording: Recording, alpaca, symbols, timeframe, key: str = '1min', limit: int = 10000,
+                        max_pages: int = 10) -> Dict[str, int]:
+    """Record bars and the account snapshot from a live AlpacaClient.
+
+    Returns:
+        dict: Bars added per symbol
+    """
+    from .market_data import refresh_alpaca_bars
+
+    added = {symbol: await refresh_alpaca_bars(alpaca, recording.store, symbol, timeframe, key,
+                                               limit=limit, max_pages=max_pages)
+             for symbol in symbols}
+    account = await alpaca.get_account()
+    positions = await alpaca.get_positions()
+    assets = [
+        {'symbol': asset.symbol, 'class': getattr(asset, 'class', 'us_equity'), 'status': asset.status,
+         'tradable': asset.tradable, 'shortable': asset.shortable, 'fractionable': asset.fractionable}
+        for asset in alpaca.api.list_assets(status='active')
+    ]
+    recording.save_account(account, positions, assets)
+    return added
@@ -0,0 +1,160 @@
+"""Higher-timeframe bars derived locally from 1-minute bars.
+
+5-minute, 15-minute, hourly and daily bars are aggregated from the stored
+1-minute series instead of being requested from a vendor, so every extra
+timeframe costs no network round trip or API quota.
+
+* ``resample_bars`` aggregates a whole series at once, with NumPy
+  ``reduceat`` over the bucket boundaries.
+* ``BarResampler`` folds minutes in one at a time and reports each
+  higher-timeframe bar as soon as the minute that closes it arrives.
+* ``resample_store`` keeps derived partitions of the bar store up to date,
+  re-deriving only from the last (possibly still forming) derived bar.
+
+Bars are labelled with the start of their bucket, like Alpaca bars. Daily
+buckets follow the calendar day in the series' timezone.
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .bar_store import AV_COLUMNS, FIELDS, to_bar_frame
+
+logger = logging.getLogger(__name__)
+
+# Timeframe key (as used for bar store partitions) -> pandas frequency
+TIMEFRAMES = {'1min': '1min', '5min': '5min', '15min': '15min', '1h': '1h', '1d': '1D'}
+DERIVED_TIMEFRAMES = ('5min', '15min', '1h', '1d')
+
+# Interval spellings of Alpaca (str(TimeFrame)), Alpha Vantage and yfinance -> bar store timeframe
+_TIMEFRAMES = {
+    '1Min': '1min', '1min': '1min', '1m': '1min',
+    '5Min': '5min', '5min': '5min', '5m': '5min',
+    '15Min': '15min', '15min': '15min', '15m': '15min',
+    '1Hour': '1h', '60min': '1h', '60m': '1h', '1h': '1h',
+    '1Day': '1d', '1d': '1d',
+}
+
+
+def _frequency(timeframe: str) -> str:
+    try:
+        return TIMEFRAMES[timeframe]
+    except KeyError:
+        raise ValueError(f"Unknown timeframe {timeframe}; expected one of {sorted(TIMEFRAMES)}")
+
+
+def timeframe_key(interval) -> str:
+    """Bar store timeframe for an Alpaca TimeFrame or an Alpha Vantage/yfinance interval"""
+    try:
+        return _TIMEFRAMES[str(interval)]
+    except KeyError:
+        raise ValueError(f"Unsupported interval {interval}")
+
+
+def resample_bars(bars, timeframe: str) -> pd.DataFrame:
+    """Aggregate bars into ``timeframe`` bars (first open, max high, min low, last close, summed volume).
+
+    Args:
+        bars: Oldest-first bars in any layout accepted by the bar store
+        timeframe: Target timeframe key, e.g. '5min' or '1h'
+
+    Returns:
+        DataFrame in the Alpha Vantage column layout indexed by bucket start.
+        The last bar is still forming if the input ends mid-bucket.
+    """
+    frequency = _frequency(timeframe)
+    frame = to_bar_frame(bars)
+    if frame.empty:
+        return pd.DataFrame(columns=list(AV_COLUMNS.values()), index=frame.index)
+    buckets = frame.index.floor(frequency)
+    values = buckets.asi8
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    ends = np.r_[starts[1:], len(values)] - 1
+    columns = {field: frame[field].to_numpy() for field in FIELDS}
+    return pd.DataFrame({
+        AV_COLUMNS['open']: columns['open'][starts],
+        AV_COLUMNS['high']: np.maximum.reduceat(columns['high'], starts),
+        AV_COLUMNS['low']: np.minimum.reduceat(columns['low'], starts),
+        AV_COLUMNS['close']: columns['close'][ends],
+        AV_COLUMNS['volume']: np.add.reduceat(columns['volume'], starts),
+    }, index=buckets[starts])
+
+
+class BarResampler:
+    """Incremental aggregation of 1-minute bars into higher timeframes.
+
+    Args:
+        timeframes: Target timeframe keys
+        base: Timeframe of the incoming bars; a bar closes a bucket when
+            its end reaches the bucket's end
+    """
+
+    def __init__(self, timeframes: Iterable[str] = DERIVED_TIMEFRAMES, base: str = '1min'):
+        self.frequencies = {timeframe: _frequency(timeframe) for timeframe in timeframes}
+        self.base = pd.Timedelta(_frequency(base))
+        self._partial: Dict[str, Dict] = {}
+
+    def partial(self, timeframe: str) -> Optional[Dict]:
+        """The forming bar of ``timeframe``, or None"""
+        bar = self._partial.get(timeframe)
+        return dict(bar) if bar is not None else None
+
+    def update(self, bar: Dict) -> List[Tuple[str, Dict]]:
+        """Fold in one bar.
+
+        Returns:
+            list: (timeframe, bar) for every higher-timeframe bar completed by
+            this bar, including buckets left open by a gap in the input
+        """
+        timestamp = pd.Timestamp(bar['timestamp'])
+        completed = []
+        for timeframe, frequency in self.frequencies.items():
+            start = timestamp.floor(frequency)
+            current = self._partial.get(timeframe)
+            if current is not None and current['timestamp'] != start:
+                if start < current['timestamp']:
+                    continue  # late bar for a bucket already emitted
+                completed.append((timeframe, current))
+                current = None
+            if current is None:
+                current = self._partial[timeframe] = {
+                    'timestamp': start, 'open': bar['open'], 'high': bar['high'],
+                    'low': bar['low'], 'close': bar['close'], 'volume': bar['volume'],
+                }
+            else:
+                current['high'] = max(current['high'], bar['high'])
+                current['low'] = min(current['low'], bar['low'])
+                current['close'] = bar['close']
+                current['volume'] += bar['volume']
+            if timestamp + self.base >= start + pd.Timedelta(frequency):
+                completed.append((timeframe, self._partial.pop(timeframe)))
+        return completed
+
+    def flush(self) -> List[Tuple[str, Dict]]:
+        """Emit and forget all forming bars"""
+        completed = list(self._partial.items())
+        self._partial.clear()
+        return completed
+
+
+def resample_store(store, symbol: str, source: str = '1min',
+                   timeframes: Iterable[str] = DERIVED_TIMEFRAMES) -> Dict[str, int]:
+    """Derive ``timeframes`` partitions of ``symbol`` from its ``source`` bars.
+
+    Only source bars from the start of the last derived bar onwards are read,
+    so the still-forming bar is recomputed and newer ones are appended.
+
+    Returns:
+        dict: Bars added per timeframe
+    """
+    added = {}
+    for timeframe in timeframes:
+        last = store.last_timestamp(symbol, timeframe)
+        bars = store.read(symbol, source, start=last)
+        if bars.empty:
+            added[timeframe] = 0
+            continue
+        added[timeframe] = store.merge(symbol, timeframe, resample_bars(bars, timeframe))
+    return added
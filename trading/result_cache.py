@@ -0,0 +1,243 @@
+"""Content-addressed on-disk cache for backtest and training results.
+
+A result is stored under the hash of (code version, parameters, data
+fingerprint), so an identical backtest, optimiser task or ``train_model``
+call on unchanged data returns the stored result instead of recomputing it.
+Editing any of the modules that produce results changes the code version
+and so invalidates their entries.
+
+Entries live under ``RESULT_CACHE_DIR`` as ``<key[:2]>/<key>.pkl`` plus a
+``.json`` sidecar with the kind, parameters and size. Writes are atomic
+(temp file + rename), so several worker processes can share one store.
+Reads bump the entry's mtime, and the least recently used entries are
+evicted once the store grows past ``max_bytes``.
+"""
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Modules whose source defines what a cached result means
+CODE_MODULES = (
+    'trading.indicators',
+    'trading.strategies',
+    'trading.backtest',
+    'trading.optimization',
+    'trading.ai_trading',
+)
+
+
+@lru_cache(maxsize=None)
+def code_version(modules=CODE_MODULES) -> str:
+    """Hash of the source of the result-producing modules"""
+    digest = hashlib.sha256()
+    for name in modules:
+        spec = importlib.util.find_spec(name)
+        if spec is None or not spec.origin:
+            continue
+        digest.update(name.encode())
+        digest.update(Path(spec.origin).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def data_fingerprint(data) -> str:
+    """Hash of a DataFrame's index, columns and values (or of an array's bytes)"""
+    digest = hashlib.sha256()
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        columns = data.columns if isinstance(data, pd.DataFrame) else [data.name]
+        digest.update(repr(list(columns)).encode())
+        digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    else:
+        array = np.ascontiguousarray(data)
+        digest.update(f'{array.dtype}{array.shape}'.encode())
+        # Object arrays (e.g. lists of bar dicts) hold pointers, so hash their pickled contents
+        digest.update(pickle.dumps(data) if array.dtype == object else array.tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU store of pickled results on local disk.
+
+    Args:
+        root: Directory holding the entries
+        max_bytes: Total size above which least recently used entries are evicted
+    """
+
+    def __init__(self, root, max_bytes: int = 512 * 1024 * 1024):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._size = None  # running estimate of the store size, rescanned on eviction
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(kind: str, params: Dict, data=None, fingerprint: Optional[str] = None) -> str:
+        """Content address for a result of ``kind`` computed from ``params`` and ``data``"""
+        if fingerprint is None:
+            fingerprint = data_fingerprint(data) if data is not None else ''
+        payload = json.dumps(
+            {'kind': kind, 'code': code_version(), 'params': params, 'data': fingerprint},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f'{key}.pkl'
+
+    def get(self, key: str, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        except Exception as e:
+            # Truncated or unreadable entry: drop it and recompute
+            logger.warning(f"Discarding unreadable result cache entry {key}: {str(e)}")
+            self._remove(path)
+            self.misses += 1
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, kind: str = '', params: Optional[Dict] = None):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        meta = {'key': key, 'kind': kind, 'params': params or {}, 'size': len(data), 'created': time.time()}
+        self._write(path.with_suffix('.json'), json.dumps(meta, default=str).encode())
+        self._write(path, data)
+
+        if self._size is None:
+            self._size = self.total_bytes()
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.prune()
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def get_or_compute(self, kind: str, params: Dict, data, compute: Callable[[], Any], fingerprint: Optional[str] = None):
+        """Return the stored result for (kind, params, data), computing and storing it on a miss"""
+        key = self.make_key(kind, params, data, fingerprint)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            try:
+                self.set(key, value, kind, params)
+            except OSError as e:
+                logger.warning(f"Could not store result cache entry {key}: {str(e)}")
+        return value
+
+    def entries(self, kind: Optional[str] = None) -> List[Dict]:
+        """Metadata of stored entries, most recently used first"""
+        entries = []
+        for path in self.root.glob('*/*.pkl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            try:
+                meta = json.loads(path.with_suffix('.json').read_text())
+            except (OSError, ValueError):
+                meta = {'key': path.stem, 'kind': '', 'params': {}}
+            if kind and meta.get('kind') != kind:
+                continue
+            meta['size'] = stat.st_size
+            meta['last_used'] = stat.st_mtime
+            meta['path'] = path
+            entries.append(meta)
+        entries.sort(key=lambda entry: entry['last_used'], reverse=True)
+        return entries
+
+    def total_bytes(self) -> int:
+        return sum(entry['size'] for entry in self.entries())
+
+    def prune(self, max_bytes: Optional[int] = None, older_than: Optional[float] = None, kind: Optional[str] = None) -> Dict:
+        """Evict entries.
+
+        Args:
+            max_bytes: Evict least recently used entries until the store fits
+                (defaults to 90% of ``self.max_bytes``, leaving headroom)
+            older_than: Also evict entries unused for this many seconds
+            kind: Only consider entries of this kind
+
+        Returns:
+            dict: Number of entries and bytes removed
+        """
+        max_bytes = int(self.max_bytes * 0.9) if max_bytes is None else max_bytes
+        entries = self.entries(kind)
+        total = sum(entry['size'] for entry in entries)
+        cutoff = time.time() - older_than if older_than is not None else None
+        removed = freed = 0
+        for entry in reversed(entries):
+            if total <= max_bytes and (cutoff is None or entry['last_used'] >= cutoff):
+                continue
+            self._remove(entry['path'])
+            total -= entry['size']
+            removed += 1
+            freed += entry['size']
+        self._size = None if kind else total
+        if removed:
+            logger.info(f"Result cache evicted {removed} entries ({freed} bytes)")
+        return {'removed': removed, 'bytes': freed}
+
+    def clear(self, kind: Optional[str] = None) -> Dict:
+        return self.prune(max_bytes=0, kind=kind)
+
+    @staticmethod
+    def _remove(path: Path):
+        for target in (path, path.with_suffix('.json')):
+            try:
+                target.unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+_cache = None
+
+
+def get_result_cache() -> ResultCache:
+    """Process-wide result cache configured from settings"""
+    global _cache
+    if _cache is None:
+        from django.conf import settings
+
+        _cache = ResultCache(settings.RESULT_CACHE_DIR, settings.RESULT_CACHE_MAX_BYTES)
+    return _cache
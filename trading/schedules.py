@@ -0,0 +1,35 @@
+"""Celery beat schedules that follow the trading calendar."""
+from celery.schedules import schedstate, schedule
+
+from .market_calendar import get_market_calendar
+
+
+class MarketHoursSchedule(schedule):
+    """Run every ``run_every`` while ``symbols`` can trade; while closed, beat sleeps until the next session.
+
+    Empty ``symbols`` means US equities. The check is a calendar lookup, so
+    nights, weekends and holidays cost neither a task run nor a clock API call.
+    """
+
+    def __init__(self, run_every, symbols=(), **kwargs):
+        super().__init__(run_every, **kwargs)
+        self.symbols = tuple(symbols)
+
+    def is_due(self, last_run_at):
+        wait = get_market_calendar().seconds_until_open(symbols=self.symbols)
+        if wait > 0:
+            return schedstate(is_due=False, next=wait)
+        return super().is_due(last_run_at)
+
+    def __repr__(self):
+        return f'<market hours: every {self.human_seconds} for {", ".join(self.symbols) or "US equities"}>'
+
+    def __reduce__(self):
+        # Beat keeps its schedules in a shelve; restore the base attributes as state
+        return self.__class__, (self.run_every, self.symbols), {'relative': self.relative, 'nowfun': self.nowfun}
+
+    def __eq__(self, other):
+        return isinstance(other, MarketHoursSchedule) and self.run_every == other.run_every and self.symbols == other.symbols
+
+    def __hash__(self):
+        return hash((self.run_every, self.symbols))
@@ -0,0 +1,198 @@
+"""Single-flight coalescing of upstream calls.
+
+When many requests need the same upstream result at once (500 dashboard
+users selecting AAPL), only one of them calls the vendor; the rest wait for
+and share its result.
+
+* In a process, callers of ``SingleFlight.do`` with the same key wait on the
+  leader's Future.
+* Across processes, the leader holds a Redis lock while it fetches and
+  publishes the result under a result key; other processes poll that key
+  instead of fetching.
+* Results are fresh for ``ttl`` seconds and then served stale for up to
+  ``stale_ttl`` more while one background refresh revalidates them.
+
+Without Redis (or while it is unreachable) coalescing is per process only.
+Results are shared through Redis as JSON, so ``fn`` must return a
+JSON-serialisable value (keep it small: it is copied to every process).
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    # Seconds to stop talking to Redis after a connection error
+    REDIS_RETRY_INTERVAL = 30
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, ttl: float = 5.0, stale_ttl: float = 60.0, lock_timeout: float = 30.0,
+                 wait_timeout: float = 10.0, redis_url: Optional[str] = None, prefix: str = 'singleflight'):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self._results: Dict[str, tuple] = {}  # key -> (value, fresh_until wall-clock time)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_down_until = 0.0
+        self.counts = {'calls': 0, 'fresh_hits': 0, 'stale_served': 0, 'local_waits': 0, 'remote_waits': 0, 'upstream_calls': 0}
+
+    def _get_redis(self):
+        if not self.redis_url or time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            import redis
+
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        self._redis_down_until = time.monotonic() + self.REDIS_RETRY_INTERVAL
+        logger.warning(f"Single-flight Redis tier unavailable: {str(e)}")
+
+    def _result_key(self, key: str) -> str:
+        return f'{self.prefix}:result:{key}'
+
+    def _lookup(self, key: str):
+        """Latest (value, fresh_until) from this process or Redis, or None"""
+        entry = self._results.get(key)
+        if entry is not None and entry[1] > time.time():
+            return entry
+        client = self._get_redis()
+        if client is not None:
+            try:
+                raw = client.get(self._result_key(key))
+            except Exception as e:
+                self._redis_failed(e)
+                raw = None
+            if raw is not None:
+                remote = tuple(json.loads(raw))
+                if entry is None or remote[1] > entry[1]:
+                    entry = remote
+                    self._results[key] = entry
+        return entry
+
+    def _publish(self, key: str, value: Any):
+        entry = (value, time.time() + self.ttl)
+        self._results[key] = entry
+        client = self._get_redis()
+        if client is not None:
+            raw = json.dumps(entry)
+            try:
+                client.set(self._result_key(key), raw, px=int((self.ttl + self.stale_ttl) * 1000))
+            except Exception as e:
+                self._redis_failed(e)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Return fn()'s result for ``key``, sharing one call among concurrent callers"""
+        self.counts['calls'] += 1
+        entry = self._lookup(key)
+        now = time.time()
+        if entry is not None and entry[1] > now:
+            self.counts['fresh_hits'] += 1
+            return entry[0]
+        if entry is not None and entry[1] + self.stale_ttl > now:
+            # Serve stale and let one background refresh revalidate it
+            self.counts['stale_served'] += 1
+            self._start(key, fn, background=True)
+            return entry[0]
+        return self._start(key, fn).result(timeout=self.lock_timeout + self.wait_timeout)
+
+    def _start(self, key: str, fn: Callable[[], Any], background: bool = False) -> Future:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                if not background:
+                    self.counts['local_waits'] += 1
+                return future
+            future = self._inflight[key] = Future()
+
+        def lead():
+            try:
+                future.set_result(self._lead(key, fn))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+        if background:
+            threading.Thread(target=lead, name=f'single-flight-{key}', daemon=True).start()
+        else:
+            lead()
+        return future
+
+    def _lead(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Fetch as this process's leader, deferring to another process that already is"""
+        client = self._get_redis()
+        started = time.time()
+        deadline = time.monotonic() + self.wait_timeout
+        while client is not None and time.monotonic() < deadline:
+            lock = client.lock(f'{self.prefix}:lock:{key}', timeout=self.lock_timeout, thread_local=False)
+            try:
+                acquired = lock.acquire(blocking=False, token=uuid.uuid4().hex)
+            except Exception as e:
+                self._redis_failed(e)
+                break
+            if acquired:
+                try:
+                    return self._call(key, fn)
+                finally:
+                    try:
+                        lock.release()
+                    except Exception:
+                        pass  # expired: the lock timeout is the upper bound anyway
+
+            # Another process is fetching: wait for a result published after we started
+            self.counts['remote_waits'] += 1
+            while time.monotonic() < deadline:
+                time.sleep(self.POLL_INTERVAL)
+                entry = self._lookup(key)
+                if entry is not None and entry[1] - self.ttl >= started - 1:
+                    return entry[0]
+                try:
+                    if not client.exists(lock.name):
+                        break  # leader gave up without publishing; try to lead
+                except Exception as e:
+                    self._redis_failed(e)
+                    client = None
+                    break
+        return self._call(key, fn)
+
+    def _call(self, key: str, fn: Callable[[], Any]) -> Any:
+        self.counts['upstream_calls'] += 1
+        value = fn()
+        self._publish(key, value)
+        return value
+
+    def stats(self) -> Dict:
+        return dict(self.counts, inflight=len(self._inflight))
+
+
+_flight = None
+_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Process-wide coalescer configured from settings"""
+    global _flight
+    with _flight_lock:
+        if _flight is None:
+            from django.conf import settings
+
+            _flight = SingleFlight(
+                ttl=settings.SINGLE_FLIGHT_TTL,
+                stale_ttl=settings.SINGLE_FLIGHT_STALE_TTL,
+                redis_url=settings.REDIS_URL,
+            )
+        return _flight
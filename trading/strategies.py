@@ -0,0 +1,156 @@
+"""Array-based trading strategies.
+
+Strategies take read-only close prices and return a compact int8 signal
+vector (1 buy, -1 sell, 0 hold) plus optional float32 diagnostics. They never
+write to the caller's data, so one price frame can be shared between the
+dashboard, the consumers and the trading loop without defensive copies.
+
+Each strategy declares the indicator graph nodes it needs. ``run_strategies``
+evaluates the union of those nodes once, in dependency order, and reports
+how long each node took.
+"""
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .indicators import IndicatorGraph, as_price_array, combined_signal
+
+
+class StrategyResult(NamedTuple):
+    signal: np.ndarray
+    diagnostics: Dict[str, np.ndarray]
+
+
+class StrategyRun(NamedTuple):
+    results: Dict[str, StrategyResult]
+    timings: Dict[str, float]
+
+
+def price_view(prices) -> np.ndarray:
+    """Read-only float64 view of close prices (no copy for float64 input)"""
+    view = as_price_array(prices).view()
+    view.flags.writeable = False
+    return view
+
+
+class Strategy:
+    """A signal rule over named indicator nodes.
+
+    Args:
+        name: Registry name
+        indicators: Column label -> indicator node the rule needs (e.g. {'RSI': 'rsi_14'})
+        rule: Callable(close, indicators) -> signal array, where ``indicators``
+            is keyed by the column labels
+    """
+
+    def __init__(self, name: str, indicators: Dict[str, str], rule: Callable[[np.ndarray, Dict[str, np.ndarray]], np.ndarray]):
+        self.name = name
+        self.indicators = dict(indicators)
+        self.rule = rule
+
+    @property
+    def requires(self) -> Sequence[str]:
+        return tuple(self.indicators.values())
+
+    def evaluate(self, graph: IndicatorGraph, diagnostics: bool = False) -> StrategyResult:
+        """Apply the rule using (and filling) a shared indicator graph"""
+        nodes = graph.evaluate(self.requires)
+        indicators = {label: nodes[node] for label, node in self.indicators.items()}
+        signal = np.asarray(self.rule(graph.close, indicators)).astype(np.int8, copy=False)
+        extra = {label: values.astype(np.float32) for label, values in indicators.items()} if diagnostics else {}
+        return StrategyResult(signal, extra)
+
+    def __call__(self, prices, diagnostics: bool = False) -> StrategyResult:
+        return self.evaluate(IndicatorGraph(price_view(prices)), diagnostics)
+
+
+STRATEGIES: Dict[str, Strategy] = {}
+
+
+def register_strategy(strategy: Strategy) -> Strategy:
+    """Add a strategy to the registry used by run_strategies"""
+    STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+def run_strategies(prices, names: Optional[Iterable[str]] = None, diagnostics: bool = False) -> StrategyRun:
+    """Run several registered strategies over one dataset.
+
+    The union of the strategies' indicators is evaluated exactly once.
+
+    Returns:
+        StrategyRun: Results per strategy and seconds spent per indicator node
+    """
+    names = list(names) if names is not None else list(STRATEGIES)
+    strategies = [STRATEGIES[name] for name in names]
+    graph = IndicatorGraph(price_view(prices))
+    graph.evaluate(IndicatorGraph.plan(node for strategy in strategies for node in strategy.requires))
+    results = {strategy.name: strategy.evaluate(graph, diagnostics) for strategy in strategies}
+    return StrategyRun(results, dict(graph.timings))
+
+
+def sma_crossover(fast: int = 5, slow: int = 20) -> Strategy:
+    """Buy while the fast SMA is above the slow SMA, sell otherwise"""
+    def rule(close, ind):
+        sma_fast, sma_slow = ind[f'SMA_{fast}'], ind[f'SMA_{slow}']
+        return np.select([sma_fast > sma_slow, sma_fast <= sma_slow], [1, -1], 0)
+    return Strategy('sma_crossover', {f'SMA_{fast}': f'sma_{fast}', f'SMA_{slow}': f'sma_{slow}'}, rule)
+
+
+def rsi_reversion(window: int = 14, oversold: float = 30, overbought: float = 70) -> Strategy:
+    """Buy when RSI is oversold, sell when it is overbought"""
+    def rule(close, ind):
+        return np.select([ind['RSI'] < oversold, ind['RSI'] > overbought], [1, -1], 0)
+    return Strategy('rsi', {'RSI': f'rsi_{window}'}, rule)
+
+
+def bollinger_reversion(window: int = 20, num_std: float = 2.0) -> Strategy:
+    """Buy below the lower band, sell above the upper band"""
+    def rule(close, ind):
+        return np.select([close < ind['Lower'], close > ind['Upper']], [1, -1], 0)
+    return Strategy('bollinger', {
+        f'SMA_{window}': f'sma_{window}',
+        'Upper': f'bbupper_{window}_{num_std}',
+        'Lower': f'bblower_{window}_{num_std}',
+    }, rule)
+
+
+def combined(fast: int = 5, slow: int = 20, rsi_window: int = 14, oversold: float = 30, overbought: float = 70,
+             macd: Tuple[int, int, int] = (12, 26, 9)) -> Strategy:
+    """SMA fast/slow cross confirmed by RSI and MACD"""
+    macd_fast, macd_slow, macd_signal = macd
+    return Strategy('combined', {
+        f'SMA_{fast}': f'sma_{fast}',
+        f'SMA_{slow}': f'sma_{slow}',
+        'RSI': f'rsi_{rsi_window}',
+        'MACD': f'macd_{macd_fast}_{macd_slow}',
+        'Signal_line': f'macdsignal_{macd_fast}_{macd_slow}_{macd_signal}',
+    }, lambda close, ind: combined_signal(ind, fast, slow, oversold, overbought))
+
+
+# Parameterised constructors, used by the optimiser to sweep parameters
+STRATEGY_FACTORIES: Dict[str, Callable[..., Strategy]] = {
+    'sma_crossover': sma_crossover,
+    'rsi': rsi_reversion,
+    'bollinger': bollinger_reversion,
+    'combined': combined,
+}
+
+for _factory in STRATEGY_FACTORIES.values():
+    register_strategy(_factory())
+
+
+def sma_crossover_strategy(prices, fast: int = 5, slow: int = 20, diagnostics: bool = False) -> StrategyResult:
+    return sma_crossover(fast, slow)(prices, diagnostics)
+
+
+def rsi_strategy(prices, window: int = 14, oversold: float = 30, overbought: float = 70, diagnostics: bool = False) -> StrategyResult:
+    return rsi_reversion(window, oversold, overbought)(prices, diagnostics)
+
+
+def bollinger_strategy(prices, window: int = 20, num_std: float = 2.0, diagnostics: bool = False) -> StrategyResult:
+    return bollinger_reversion(window, num_std)(prices, diagnostics)
+
+
+def combined_strategy(prices, diagnostics: bool = False) -> StrategyResult:
+    return combined()(prices, diagnostics)
@@ -1,5 +1,10 @@
 from celery import shared_task
-from .ai_trading import train_model, make_trade_prediction, get_market_data
+from .ai_trading import train_model_cached, make_trade_prediction
+from .alpaca_client import run_sync
+from .providers import get_market_router
+from .indicator_cache import cached_state_values
+from .market_calendar import get_market_calendar
+from .asset_universe import get_asset_universe
 from .models import UserProfile, Trade, AccountBalance
 from decimal import Decimal
 from core.celery import notify_trade_update
@@ -10,6 +15,10 @@ logger = logging.getLogger('trading')
 @shared_task
 def execute_trade_task():
     """Execute trades for users with automated trading enabled"""
+    if not get_market_calendar().is_open(symbols=['AAPL']):
+        # Beat skips closed sessions; this covers runs queued before the close
+        return "Market closed"
+
     try:
         # Only get users with automated trading enabled
         users = UserProfile.objects.filter(automated_trading_enabled=True)
@@ -23,9 +32,14 @@ def execute_trade_task():
                     logger.warning(f"Insufficient balance for user {user.user.username}")
                     continue
 
-                # Fetch market data
-                market_data = get_market_data('AAPL')
-                current_price = Decimal(str(market_data['Close'].iloc[-1]))
+                # Fetch market data from the providers (hedged, with failover)
+                market_data = run_sync(get_market_router().get_bars('AAPL', '1min', limit=1000))
+                current_price = Decimal(str(market_data['4. close'].iloc[-1]))
+
+                # Fold only the bars that arrived since the last run into the indicator state
+                indicators = cached_state_values(
+                    'AAPL', '1min', market_data['4. close'], market_data.index, rsi_smoothing='simple'
+                )
                 
                 # Check if price is within user's parameters
                 if current_price < user.min_price or current_price > user.max_price:
@@ -33,8 +47,8 @@ def execute_trade_task():
                     continue
 
                 # Train model and get prediction
-                model = train_model(market_data)
-                trade_action = make_trade_prediction(model, market_data)
+                model = train_model_cached(market_data)
+                trade_action = make_trade_prediction(model, market_data, indicators=indicators)['action']
                 
                 # Execute trade based on prediction
                 if trade_action in ['buy', 'sell']:
@@ -70,4 +84,11 @@ def execute_trade_task():
         logger.error(f"Error in execute_trade_task: {str(e)}")
         raise
 
-    return "Trade execution completed"
\ No newline at end of file
+    return "Trade execution completed"
+
+
+@shared_task
+def refresh_asset_universe_task():
+    """Download the broker's active assets into the shared asset table"""
+    count = get_asset_universe().refresh()
+    return f"Asset universe refreshed with {count} assets"
@@ -1,12 +1,33 @@
 from django.test import TestCase
 import unittest
 from decimal import Decimal
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+import numpy as np
+import pandas as pd
 from django.contrib.auth.models import User
 from .models import UserProfile, Trade, AccountBalance
 from .automated_trading import AutomatedTrading
 from .ai_trading import make_trade_prediction, apply_combined_strategy
-from .alpaca_client import AlpacaClient
+from .alpaca_client import AlpacaAPIError, AlpacaClient, SyncAlpacaClient
+from . import indicators as indicator_engine
+from .indicators import compute_indicators, IndicatorState, align_universe, compute_universe_indicators, save_indicator_state
+from .indicator_cache import IndicatorCache
+from .strategies import combined_strategy, rsi_strategy, run_strategies
+from .backtest import run_backtest
+from .simulation import replay_bars
+from .optimization import walk_forward_optimize, walk_forward_windows
+from .result_cache import ResultCache
+from .bar_store import BarStore
+from .market_data import TokenBucket, fetch_universe, refresh_alpaca_bars
+from .single_flight import SingleFlight
+from .market_hub import MarketHub, ReplaySource
+from .resample import BarResampler, resample_bars, resample_store
+from .recorded import PlaybackClock, RecordedAlpacaClient, RecordedTimeSeries, Recording
+from .providers import AlphaVantageProvider, MarketDataProvider, NoBars, ProviderRouter
+from .market_calendar import MarketCalendar
+from .asset_universe import AssetUniverse
+from .account_book import AccountBook
+from .consumers import AutomatedTradingConsumer
 
 class TestAutomatedTrading(TestCase):
     def setUp(self):
@@ -94,5 +115,885 @@ class TestAlpacaClient(TestCase):
         with self.assertRaises(Exception):
             self.client.get_account()
 
+    def test_sync_facade_keeps_dict_shapes(self):
+        """The blocking facade awaits the aiohttp-backed coroutines on the shared client loop"""
+        self.client._request = AsyncMock(return_value={
+            'cash': '10000.00', 'portfolio_value': '15000.00', 'buying_power': '20000.00',
+            'daytrade_count': 1, 'trading_blocked': False, 'transfers_blocked': False
+        })
+        account = SyncAlpacaClient(self.client).get_account()
+        self.assertEqual(account['cash'], Decimal('10000.00'))
+        self.assertEqual(account['day_trade_count'], 1)
+        self.assertFalse(account['trades_blocked'])
+        self.client._request.assert_awaited_once()
+
+    def test_bar_outputs(self):
+        """'columns' and 'frame' carry float64 values; 'dicts' keeps the Decimal rows"""
+        self.client._request = AsyncMock(return_value={'bars': [
+            {'t': '2024-01-02T14:30:00Z', 'o': 1.0, 'h': 2.0, 'l': 0.5, 'c': 1.5, 'v': 100},
+            {'t': '2024-01-02T14:31:00Z', 'o': 1.5, 'h': 2.5, 'l': 1.0, 'c': 2.0, 'v': 200},
+        ], 'next_page_token': None})
+        broker = SyncAlpacaClient(self.client)
+
+        columns = broker.get_bars('AAPL', '1Min', limit=2, output='columns')
+        self.assertEqual(columns['close'].dtype, np.float64)
+        self.assertEqual(list(columns['close']), [1.5, 2.0])
+        self.assertEqual(columns['timestamp'][0], np.datetime64('2024-01-02T14:30:00'))
+        frame = broker.get_bars('AAPL', '1Min', limit=2, output='frame')
+        self.assertEqual(list(frame['volume']), [100.0, 200.0])
+        self.assertEqual(str(frame.index.tz), 'UTC')
+        bars = broker.get_bars('AAPL', '1Min', limit=2)
+        self.assertEqual(bars[1]['close'], Decimal('2.0'))
+        self.assertEqual(bars[1]['timestamp'], '2024-01-02T14:31:00+00:00')
+
+    def test_bars_without_start_are_the_latest(self):
+        """Without start the request reaches back over enough sessions and keeps the newest bars"""
+        def bar(minute, close):
+            return {'t': f'2024-01-02T14:{minute}:00Z', 'o': 1.0, 'h': 2.0, 'l': 0.5, 'c': close, 'v': 10}
+
+        self.client._request = AsyncMock(side_effect=[
+            {'bars': [bar(30, 1.0), bar(31, 1.1)], 'next_page_token': 'next'},
+            {'bars': [bar(32, 1.2)], 'next_page_token': None},
+        ])
+        columns = SyncAlpacaClient(self.client).get_bars('AAPL', '1Min', limit=2, output='columns')
+
+        self.assertEqual(list(columns['close']), [1.1, 1.2])
+        params = self.client._request.call_args_list[0].kwargs['params']
+        self.assertIsNotNone(params['start'])
+        self.assertEqual(params['limit'], 10000)
+
+    def test_multi_symbol_batch(self):
+        """Bars of all symbols come from one paginated request and are looked up per symbol"""
+        def bar(hour, close):
+            return {'t': f'2024-01-02T{hour}:00:00Z', 'o': 1.0, 'h': 2.0, 'l': 0.5, 'c': close, 'v': 10}
+
+        self.client._request = AsyncMock(side_effect=[
+            {'bars': {'AAPL': [bar(14, 1.0), bar(15, 1.1)]}, 'next_page_token': 'next'},
+            {'bars': {'AAPL': [bar(16, 1.2)], 'MSFT': [bar(16, 2.0)]}, 'next_page_token': None},
+            {'AAPL': {'latestTrade': {'t': '2024-01-02T16:00:01Z', 'p': 1.25, 's': 100},
+                      'latestQuote': {'t': '2024-01-02T16:00:02Z', 'bp': 1.24, 'bs': 1, 'ap': 1.26, 'as': 3}}},
+        ])
+        broker = SyncAlpacaClient(self.client)
+
+        batch = broker.get_multi_bars(['MSFT', 'AAPL', 'NONE'], '1Hour', limit=2)
+        self.assertEqual(self.client._request.await_count, 2)
+        self.assertEqual(list(batch.bars('AAPL')['close']), [1.1, 1.2])
+        self.assertEqual(list(batch.bars('NONE', output='frame').index), [])
+        self.assertEqual(batch.last().dropna().to_dict(), {'AAPL': 1.2, 'MSFT': 2.0})
+
+        latest = broker.get_latest(['AAPL', 'MSFT'])
+        self.assertEqual(latest.loc['AAPL', 'price'], 1.25)
+        self.assertEqual(latest.loc['AAPL', 'ask'], 1.26)
+        self.assertTrue(np.isnan(latest.loc['MSFT', 'price']))
+
+    def test_missing_position_is_none(self):
+        """A 404 from the positions endpoint means no position"""
+        self.client._request = AsyncMock(side_effect=AlpacaAPIError(404, 'position does not exist'))
+        self.assertIsNone(SyncAlpacaClient(self.client).get_position('AAPL'))
+
+class TestIndicators(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.close = pd.Series(100 + np.cumsum(rng.normal(0, 0.5, 500)))
+
+    def test_matches_pandas_rolling(self):
+        """Engine output matches the pandas rolling/ewm formulas"""
+        indicators = compute_indicators(self.close)
+        close = self.close
+
+        delta = close.diff()
+        gain = delta.where(delta > 0, 0).rolling(window=14).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+        macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+        expected = {
+            'SMA_5': close.rolling(window=5).mean(),
+            'SMA_20': close.rolling(window=20).mean(),
+            'EMA_10': close.ewm(span=10, adjust=False).mean(),
+            'RSI': 100 - (100 / (1 + gain / loss)),
+            'MACD': macd,
+            'Signal_line': macd.ewm(span=9, adjust=False).mean(),
+            'Upper': close.rolling(window=20).mean() + 2 * close.rolling(window=20).std(),
+        }
+        for name, series in expected.items():
+            np.testing.assert_allclose(indicators[name], series.to_numpy(), rtol=1e-8, err_msg=name)
+
+    def test_matrix_rows_match_single_series(self):
+        """A (symbols x bars) matrix gives the same result as each row alone"""
+        matrix = np.stack([self.close.to_numpy(), self.close.to_numpy() * 3])
+        batched = compute_indicators(matrix)
+        single = compute_indicators(matrix[1])
+        np.testing.assert_allclose(batched['RSI'][1], single['RSI'])
+
+    def test_incremental_state_matches_batch(self):
+        """Bar-by-bar updates agree with the batch engine, across a snapshot/restore"""
+        close = self.close.to_numpy()
+        state = IndicatorState('TEST', '1min', rsi_smoothing='simple')
+        state.extend(close[:250])
+        state = IndicatorState.restore(state.snapshot())
+        values = state.extend(close[250:])
+
+        batch = compute_indicators(close)
+        for name in ('SMA_5', 'SMA_20', 'EMA_10', 'RSI', 'MACD', 'Signal_line', 'Upper', 'Lower'):
+            self.assertAlmostEqual(values[name], batch[name][-1], places=8, msg=name)
+
+    def test_incremental_state_skips_seen_bars(self):
+        """Re-feeding the same history only appends bars after the last timestamp"""
+        index = pd.date_range('2024-01-02 09:30', periods=len(self.close), freq='min')
+        state = IndicatorState('TEST', '1min')
+        state.extend(self.close, index)
+        state.extend(self.close, index)
+        self.assertEqual(state.count, len(self.close))
+        self.assertEqual(state.last_timestamp, index[-1])
+
+    def test_incremental_state_rewarms_across_missing_bars(self):
+        """A series that starts after a gap rewarms the state instead of folding across it"""
+        index = pd.date_range('2024-01-02 09:30', periods=len(self.close), freq='min')
+        state = IndicatorState('TEST', '1min')
+        state.extend(self.close[:200], index[:200])
+        # Contiguous continuation is folded in
+        state.extend(self.close[200:300], index[200:300])
+        self.assertEqual(state.count, 300)
+
+        # Bars 300-349 are never seen
+        values = state.extend(self.close[350:], index[350:])
+        fresh = IndicatorState('TEST', '1min').extend(self.close[350:], index[350:])
+        self.assertEqual(state.count, len(self.close) - 350)
+        for name in ('SMA_20', 'EMA_10', 'RSI', 'MACD'):
+            self.assertAlmostEqual(values[name], fresh[name], places=10, msg=name)
+
+    @patch('trading.indicators._redis')
+    def test_saved_state_expires(self, redis_client):
+        """Snapshots are stored with the configured TTL"""
+        state = IndicatorState('TEST', '1min')
+        state.extend(self.close[:50])
+        with self.settings(INDICATOR_STATE_TTL=120):
+            self.assertTrue(save_indicator_state(state))
+        self.assertEqual(redis_client.return_value.set.call_args.kwargs['ex'], 120)
+
+    def test_universe_rows_match_per_symbol(self):
+        """Padded universe rows reproduce each symbol's own indicators"""
+        index = pd.date_range('2024-01-02 09:30', periods=len(self.close), freq='min')
+        frames = {
+            'LONG': pd.DataFrame({'4. close': self.close.to_numpy()}, index=index),
+            'SHORT': pd.DataFrame({'4. close': self.close.to_numpy()[:60]}, index=index[:60]),
+        }
+        universe = align_universe(frames)
+        batched = compute_universe_indicators(universe)
+        self.assertEqual(universe.mask[1].sum(), 60)
+
+        single = compute_indicators(frames['SHORT'])
+        for name in ('SMA_20', 'RSI', 'MACD', 'Upper'):
+            np.testing.assert_allclose(batched[name][1, -60:], single[name], err_msg=name)
+        self.assertTrue(np.isnan(batched['SMA_20'][1, :-60]).all())
+
+    def test_strategies_do_not_mutate_input(self):
+        """Strategies return int8 signals and leave the shared frame untouched"""
+        data = pd.DataFrame({'4. close': self.close.to_numpy()})
+        result = combined_strategy(data, diagnostics=True)
+        self.assertEqual(result.signal.dtype, np.int8)
+        self.assertEqual(result.diagnostics['RSI'].dtype, np.float32)
+        self.assertEqual(list(data.columns), ['4. close'])
+
+        framed = apply_combined_strategy(data)
+        self.assertIn('signal', framed.columns)
+        self.assertEqual(list(data.columns), ['4. close'])
+
+    def test_run_strategies_shares_indicators(self):
+        """Running all registered strategies evaluates each indicator node once"""
+        with patch('trading.indicators.ema', wraps=indicator_engine.ema) as ema:
+            run = run_strategies(self.close, ['combined', 'rsi', 'sma_crossover'])
+        # ema_12, ema_26 and the MACD signal line, despite three strategies
+        self.assertEqual(ema.call_count, 3)
+        self.assertIn('rsi_14', run.timings)
+        np.testing.assert_array_equal(run.results['rsi'].signal, rsi_strategy(self.close).signal)
+
+
+class TestIndicatorCache(TestCase):
+    def test_compute_once_per_bar(self):
+        """The same (symbol, timeframe, bar, params) is computed once and then served from cache"""
+        cache = IndicatorCache(max_entries=2)
+        compute = MagicMock(return_value={'RSI': 55.0})
+        params = {'rsi': 14}
+
+        for _ in range(3):
+            value = cache.get_or_compute('AAPL', '1min', '2024-01-02 09:31', params, compute)
+        self.assertEqual(value, {'RSI': 55.0})
+        compute.assert_called_once()
+        self.assertEqual(cache.stats()['local_hits'], 2)
+
+        # A new bar is a new key; the LRU keeps at most max_entries
+        cache.get_or_compute('AAPL', '1min', '2024-01-02 09:32', params, compute)
+        cache.get_or_compute('AAPL', '1min', '2024-01-02 09:33', params, compute)
+        self.assertEqual(compute.call_count, 3)
+        self.assertEqual(cache.stats()['local_entries'], 2)
+
+    def test_redis_tier_stores_json(self):
+        """Values shared through Redis are JSON, never pickles"""
+        import json
+        cache = IndicatorCache(redis_url='redis://cache')
+        cache._redis = MagicMock()
+        cache.set('key', {'RSI': 55.0})
+        self.assertEqual(json.loads(cache._redis.set.call_args.args[1]), {'RSI': 55.0})
+
+        cache.clear()
+        cache._redis.get.return_value = b'{"RSI": 61.5}'
+        self.assertEqual(cache.get('key'), {'RSI': 61.5})
+
+
+class TestBacktest(TestCase):
+    def test_fills_next_open_and_charges_fees(self):
+        """A buy signal fills at the next open and equity follows the position"""
+        data = pd.DataFrame({
+            '1. open': [100.0, 101.0, 104.0, 103.0],
+            '4. close': [100.0, 102.0, 103.0, 105.0],
+        })
+        signal = np.array([1, 0, -1, 0], dtype=np.int8)
+        result = run_backtest(data, signal, initial_capital=1000.0, fee_rate=0.001, allow_short=False)
+
+        np.testing.assert_array_equal(result.positions, [0, 1, 1, 0])
+        np.testing.assert_array_equal(result.fills['index'], [1, 3])
+        np.testing.assert_array_equal(result.fills['price'], [101.0, 103.0])
+        expected = 1000.0 * 0.999 * (103.0 / 101.0) * 0.999
+        self.assertAlmostEqual(result.equity[-1], expected)
+        self.assertEqual(result.metrics['num_trades'], 1)
+        self.assertEqual(result.metrics['win_rate'], 1.0)
+        self.assertLess(result.metrics['max_drawdown'], 0)
+
+
+class TestOptimization(TestCase):
+    def test_walk_forward_ranks_parameter_sets(self):
+        """Every parameter set is scored on every window and ranked by test Sharpe"""
+        self.assertEqual(walk_forward_windows(10, 4, 2), [(0, 4, 6), (2, 6, 8), (4, 8, 10)])
+
+        close = 100 + np.cumsum(np.random.default_rng(1).normal(0, 0.5, 600))
+        data = pd.DataFrame({'1. open': np.r_[close[0], close[:-1]], '4. close': close})
+        table = walk_forward_optimize(
+            data, train_size=300, test_size=100,
+            strategy_grids={'sma_crossover': {'fast': [3, 5], 'slow': [20]}},
+            model_grid={}, max_workers=2,
+        )
+
+        self.assertEqual(len(table), 2)
+        self.assertTrue((table['windows'] == 3).all())
+        self.assertEqual(list(table['rank']), [1, 2])
+        self.assertGreaterEqual(table['score'].iloc[0], table['score'].iloc[1])
+
+
+class TestResultCache(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_identical_inputs_hit_and_changed_data_misses(self):
+        """Results are addressed by params and data content"""
+        cache = ResultCache(self.root)
+        data = pd.DataFrame({'4. close': [1.0, 2.0, 3.0]})
+        compute = MagicMock(return_value={'sharpe_ratio': 1.5})
+
+        cache.get_or_compute('backtest', {'fee_rate': 0.001}, data, compute)
+        cache.get_or_compute('backtest', {'fee_rate': 0.001}, data.copy(), compute)
+        self.assertEqual(compute.call_count, 1)
+
+        cache.get_or_compute('backtest', {'fee_rate': 0.001}, data.assign(**{'4. close': [1.0, 2.0, 4.0]}), compute)
+        cache.get_or_compute('backtest', {'fee_rate': 0.002}, data, compute)
+        self.assertEqual(compute.call_count, 3)
+
+    def test_evicts_least_recently_used(self):
+        """Once over max_bytes the least recently used entries are dropped"""
+        import os
+        cache = ResultCache(self.root, max_bytes=3500)
+        keys = [cache.make_key('x', {'i': i}) for i in range(3)]
+        for age, key in enumerate(keys):
+            cache.set(key, b'x' * 1000, 'x')
+            os.utime(cache._path(key), (1000 + age, 1000 + age))
+        cache.get(keys[0])  # now the most recently used
+        cache.set(cache.make_key('x', {'i': 3}), b'x' * 1000, 'x')
+
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertLessEqual(cache.total_bytes(), 3500)
+
+
+class TestBarStore(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.store = BarStore(root)
+        index = pd.date_range('2024-01-02 09:30', periods=6, freq='min')
+        self.bars = pd.DataFrame({
+            '1. open': np.arange(6.0),
+            '2. high': np.arange(6.0) + 1,
+            '3. low': np.arange(6.0) - 1,
+            '4. close': np.arange(6.0) + 0.5,
+            '5. volume': np.full(6, 100.0),
+        }, index=index)
+
+    def test_append_only_new_bars(self):
+        """Overlapping appends only write bars after the last stored timestamp"""
+        self.assertEqual(self.store.append('AAPL', '1min', self.bars.iloc[:4][::-1]), 4)
+        self.assertEqual(self.store.append('AAPL', '1min', self.bars), 2)
+        self.assertEqual(self.store.append('AAPL', '1min', self.bars), 0)
+
+        self.assertEqual(self.store.last_timestamp('AAPL', '1min'), self.bars.index[-1])
+        pd.testing.assert_frame_equal(self.store.read('AAPL', '1min'), self.bars, check_freq=False, check_names=False, check_index_type=False)
+
+    def test_range_reads_are_memory_mapped(self):
+        """read_columns slices the column files without copying"""
+        self.store.append('AAPL', '1min', self.bars)
+        columns = self.store.read_columns('AAPL', '1min', start='2024-01-02 09:32', end='2024-01-02 09:34')
+
+        self.assertIsInstance(columns['close'], np.memmap)
+        np.testing.assert_array_equal(columns['close'], [2.5, 3.5, 4.5])
+        self.assertEqual(len(self.store.read('AAPL', '1min', limit=2)), 2)
+        self.assertTrue(self.store.read('MSFT', '1min').empty)
+
+    def test_merge_replaces_revised_tail(self):
+        """A refresh overlapping the stored tail updates those bars and appends the rest"""
+        self.store.merge('AAPL', '1min', self.bars.iloc[:4])
+        revised = self.bars.iloc[2:].copy()
+        revised.loc[revised.index[1], '4. close'] = 99.0
+
+        self.assertEqual(self.store.merge('AAPL', '1min', revised), 2)
+        self.assertEqual(list(self.store.read('AAPL', '1min')['4. close']), [0.5, 1.5, 2.5, 99.0, 4.5, 5.5])
+        self.assertEqual(self.store.merge('AAPL', '1min', self.bars.iloc[:2]), 0)
+
+
+class TestMarketDataFetcher(TestCase):
+    class FakeResponse:
+        def __init__(self, symbol):
+            self.symbol = symbol
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        def raise_for_status(self):
+            pass
+
+        async def json(self):
+            if self.symbol == 'BAD':
+                return {'Error Message': 'Invalid API call'}
+            return {'Time Series (1min)': {
+                '2024-01-02 09:31:00': {'1. open': '1', '2. high': '2', '3. low': '0', '4. close': '1.5', '5. volume': '10'},
+                '2024-01-02 09:30:00': {'1. open': '1', '2. high': '2', '3. low': '0', '4. close': '1.4', '5. volume': '10'},
+            }}
+
+    def test_dedupes_and_returns_partial_results(self):
+        """Duplicates are fetched once and a failing symbol does not fail the batch"""
+        import asyncio
+        session = MagicMock()
+        session.get.side_effect = lambda url, params: self.FakeResponse(params['symbol'])
+
+        report = asyncio.run(fetch_universe(
+            ['AAPL', 'MSFT', 'AAPL', 'BAD'], session=session, limiter=TokenBucket(1000), max_concurrency=2
+        ))
+
+        self.assertEqual(session.get.call_count, 3)
+        self.assertEqual(sorted(report.frames), ['AAPL', 'MSFT'])
+        self.assertEqual(report.errors, {'BAD': 'Invalid API call'})
+        self.assertEqual(list(report.frames['AAPL']['4. close']), [1.4, 1.5])
+        self.assertEqual(list(report.stats.index), ['AAPL', 'MSFT', 'BAD'])
+        self.assertTrue((report.stats['wait'] >= 0).all())
+
+    def test_alpaca_refresh_requests_only_new_bars(self):
+        """After the first download, bars are requested from the last stored timestamp"""
+        import asyncio
+        import shutil
+        import tempfile
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = BarStore(root)
+        bars = [
+            {'timestamp': f'2024-01-02T{hour}:00:00+00:00', 'open': 1, 'high': 2, 'low': 0, 'close': close, 'volume': 10}
+            for hour, close in (('14', 1.0), ('15', 1.1), ('16', 1.2))
+        ]
+        alpaca = MagicMock()
+        alpaca.get_bars = AsyncMock(side_effect=[bars[:2], bars[1:]])
+
+        self.assertEqual(asyncio.run(refresh_alpaca_bars(alpaca, store, 'SPY', 'Hour', '1h', limit=1000)), 2)
+        self.assertEqual(asyncio.run(refresh_alpaca_bars(alpaca, store, 'SPY', 'Hour', '1h', limit=1000)), 1)
+
+        self.assertEqual(alpaca.get_bars.call_args.kwargs['start'], '2024-01-02T15:00:00+00:00')
+        self.assertEqual(list(store.read('SPY', '1h')['4. close']), [1.0, 1.1, 1.2])
+
+    def test_alpaca_refresh_seeds_empty_partition_from_start(self):
+        """With ``start`` an empty partition pages through every bar since then"""
+        import asyncio
+        import shutil
+        import tempfile
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        store = BarStore(root)
+        bars = [
+            {'timestamp': f'2024-01-02T{hour}:00:00+00:00', 'open': 1, 'high': 2, 'low': 0, 'close': close, 'volume': 10}
+            for hour, close in (('14', 1.0), ('15', 1.1), ('16', 1.2))
+        ]
+        alpaca = MagicMock()
+        alpaca.get_bars = AsyncMock(side_effect=[bars[:2], bars[1:], bars[2:]])
+
+        self.assertEqual(asyncio.run(refresh_alpaca_bars(alpaca, store, 'SPY', 'Hour', '1h', limit=2, start='2024-01-02')), 3)
+        self.assertEqual([call.kwargs['start'] for call in alpaca.get_bars.call_args_list],
+                         ['2024-01-02', '2024-01-02T15:00:00+00:00', '2024-01-02T16:00:00+00:00'])
+
+
+class TestSingleFlight(TestCase):
+    def test_concurrent_callers_share_one_call(self):
+        """Threads asking for the same key wait on a single upstream call"""
+        import threading
+        import time
+        flight = SingleFlight(ttl=5)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'bars'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('AAPL', fetch))) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['bars'] * 20)
+        self.assertEqual(flight.do('AAPL', fetch), 'bars')
+        self.assertEqual(len(calls), 1)
+
+    def test_waits_for_result_published_by_another_process(self):
+        """When another process holds the Redis lock, its published result is used"""
+        import json
+        import time
+        flight = SingleFlight(ttl=5, redis_url='redis://test')
+        client = MagicMock()
+        client.lock.return_value.acquire.return_value = False
+        client.exists.return_value = True
+        client.get.side_effect = [None, None, json.dumps(['remote bars', time.time() + 5])]
+        flight._redis = client
+        fetch = MagicMock()
+
+        self.assertEqual(flight.do('AAPL', fetch), 'remote bars')
+        fetch.assert_not_called()
+
+    def test_publishes_result_as_json(self):
+        import json
+        flight = SingleFlight(ttl=5, redis_url='redis://test')
+        client = MagicMock()
+        client.get.return_value = None
+        client.lock.return_value.acquire.return_value = True
+        flight._redis = client
+
+        self.assertEqual(flight.do('AAPL', lambda: {'last_price': 101.5}), {'last_price': 101.5})
+        value, fresh_until = json.loads(client.set.call_args[0][1])
+        self.assertEqual(value, {'last_price': 101.5})
+
+
+class TestMarketHub(TestCase):
+    @patch('trading.market_hub.save_indicator_state')
+    @patch('trading.indicators.load_indicator_state', return_value=None)
+    def test_replay_publishes_once_per_bar_to_symbol_groups(self, mock_load, mock_save):
+        """Replayed bars update indicator state and are published to market.<symbol>"""
+        import asyncio
+        index = pd.date_range('2024-01-02 09:30', periods=30, freq='min')
+        bars = pd.DataFrame({'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': np.linspace(1, 2, 30), 'volume': 10.0}, index=index)
+        layer = MagicMock()
+        layer.group_send = AsyncMock()
+        layer.send = AsyncMock()
+        hub = MarketHub(ReplaySource({'HUBA': bars, 'HUBB': bars}), layer, symbols=['HUBA'])
+
+        async def run():
+            await hub.watch('HUBB', 'client-1')
+            await hub.run()
+
+        with patch.object(hub, '_listen', AsyncMock()):
+            asyncio.run(run())
+
+        self.assertEqual(layer.send.call_args.args[0], 'client-1')
+        groups = [call.args[0] for call in layer.group_send.call_args_list]
+        self.assertEqual(groups.count('market.HUBA'), 30)
+        self.assertEqual(groups.count('market.HUBB'), 30)
+        last = layer.group_send.call_args_list[-1].args[1]
+        self.assertEqual(last['type'], 'market.bar')
+        self.assertAlmostEqual(last['indicators']['SMA_20'], np.linspace(1, 2, 30)[-20:].mean())
+
+    @patch('trading.indicators.load_indicator_state', return_value=None)
+    def test_repeated_watches_from_one_channel_count_once(self, mock_load):
+        """A resync re-sending a watch does not keep the symbol subscribed after its unwatch"""
+        import asyncio
+        source = MagicMock(subscribe=AsyncMock(), unsubscribe=AsyncMock())
+        hub = MarketHub(source)
+
+        async def run():
+            await hub.watch('HUBD', 'client-1')
+            await hub.watch('HUBD', 'client-1')
+            await hub.watch('HUBD', 'client-2')
+            await hub.unwatch('HUBD', 'client-1')
+            self.assertEqual(hub.active_symbols, {'HUBD'})
+            await hub.unwatch('HUBD', 'client-2')
+            await hub.unwatch('HUBD', 'client-2')
+
+        asyncio.run(run())
+        source.subscribe.assert_awaited_once_with(['HUBD'])
+        source.unsubscribe.assert_awaited_once_with(['HUBD'])
+        self.assertEqual(hub.active_symbols, set())
+
+    @patch('trading.market_hub.save_indicator_state')
+    @patch('trading.indicators.load_indicator_state', return_value=None)
+    def test_streamed_bars_are_persisted_off_the_loop(self, mock_load, mock_save):
+        """Queued bars reach the store, derived timeframes and indicator state before run() returns"""
+        import asyncio
+        import tempfile
+        index = pd.date_range('2024-01-02 09:30', periods=90, freq='min', tz='America/New_York')
+        bars = pd.DataFrame({'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': np.linspace(1, 2, 90), 'volume': 10.0}, index=index)
+        with tempfile.TemporaryDirectory() as root:
+            store = BarStore(root)
+            hub = MarketHub(ReplaySource({'HUBC': bars}), symbols=['HUBC'], store=store)
+            asyncio.run(hub.run())
+
+            self.assertEqual(len(store.read('HUBC', '1min')), 90)
+            self.assertEqual(store.read('HUBC', '1h').index[0], pd.Timestamp('2024-01-02 09:00', tz='America/New_York'))
+        state, snapshot = mock_save.call_args.args
+        self.assertEqual(snapshot['count'], 90)
+        self.assertIsNone(hub._writes)
+
+
+class TestMarketSubscriptions(TestCase):
+    def test_subscribe_joins_symbol_group_and_watches_once(self):
+        """Socket subscriptions join market.<symbol> and ask the hub to watch the symbol"""
+        import asyncio
+        import json
+        consumer = AutomatedTradingConsumer()
+        consumer.channel_name = 'client-1'
+        consumer.channel_layer = MagicMock(group_add=AsyncMock(), group_discard=AsyncMock(), group_send=AsyncMock())
+        consumer.send = AsyncMock()
+        consumer.symbols = set()
+        # A Saturday, so the closed-market reply is exercised whatever the wall clock says
+        calendar = MarketCalendar(start='2023-01-01', end='2025-12-31')
+        saturday = MagicMock(seconds_until_open=lambda symbols=(): calendar.seconds_until_open('2024-01-06 14:30+00:00', symbols))
+
+        async def run():
+            await consumer.receive(json.dumps({'action': 'subscribe', 'symbol': 'msft'}))
+            await consumer.receive(json.dumps({'action': 'subscribe', 'symbol': 'MSFT'}))
+            await consumer.receive(json.dumps({'action': 'subscribe', 'symbol': 'bad symbol!'}))
+            await consumer.receive(json.dumps({'action': 'unsubscribe', 'symbol': 'MSFT'}))
+
+        with patch('trading.consumers.get_market_calendar', return_value=saturday):
+            asyncio.run(run())
+        subscribed = json.loads(consumer.send.call_args_list[0].kwargs['text_data'])
+        self.assertEqual((subscribed['type'], subscribed['market_open']), ('subscribed', False))
+        consumer.channel_layer.group_add.assert_awaited_once_with('market.MSFT', 'client-1')
+        consumer.channel_layer.group_discard.assert_awaited_once_with('market.MSFT', 'client-1')
+        hub_messages = [call.args[1] for call in consumer.channel_layer.group_send.call_args_list]
+        self.assertEqual([message['type'] for message in hub_messages], ['hub.watch', 'hub.unwatch'])
+        self.assertEqual([message['reply_channel'] for message in hub_messages], ['client-1', 'client-1'])
+        self.assertEqual(consumer.symbols, set())
+
+    def test_warm_up_indicators_are_sent_as_null(self):
+        """NaN indicators during warm-up reach the browser as valid JSON nulls"""
+        import asyncio
+        import json
+        consumer = AutomatedTradingConsumer()
+        consumer.send = AsyncMock()
+        bar = {'timestamp': '2024-01-02T09:30:00', 'close': 101.0, 'volume': 10.0}
+
+        asyncio.run(consumer.market_bar({'symbol': 'AAPL', 'bar': bar, 'indicators': {'RSI': float('nan'), 'MACD': 0.5}}))
+        asyncio.run(consumer.market_snapshot({'symbol': 'AAPL', 'bars': [bar], 'indicators': {'SMA_20': float('inf')}, 'quote': None}))
+
+        update, snapshot = [json.loads(call.kwargs['text_data'], parse_constant=self.fail)
+                            for call in consumer.send.call_args_list]
+        self.assertEqual(update['technical'], {'rsi': None, 'macd': 0.5})
+        self.assertEqual(snapshot['technical'], {'SMA_20': None})
+
+
+class TestResample(TestCase):
+    def setUp(self):
+        index = pd.date_range('2024-01-02 09:30', periods=390, freq='min', tz='America/New_York')
+        close = 100 + np.random.default_rng(3).standard_normal(390).cumsum()
+        self.minutes = pd.DataFrame({'open': close, 'high': close + 1, 'low': close - 1, 'close': close,
+                                     'volume': np.arange(390, dtype=float)}, index=index)
+
+    def test_batch_matches_pandas_resample(self):
+        """Derived bars match pandas' OHLCV aggregation"""
+        expected = self.minutes.resample('15min').agg(
+            {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+        result = resample_bars(self.minutes, '15min')
+        np.testing.assert_allclose(result.to_numpy(), expected.to_numpy())
+        self.assertTrue((result.index == expected.index).all())
+
+    def test_incremental_emits_each_bucket_when_its_last_minute_closes(self):
+        """Folding minutes in one by one gives the batch result, as soon as each bucket closes"""
+        resampler = BarResampler(['5min', '1h'])
+        hourly = []
+        for timestamp, row in self.minutes.iterrows():
+            for timeframe, bar in resampler.update({'timestamp': timestamp, **row.to_dict()}):
+                if timeframe == '1h':
+                    self.assertEqual(timestamp, bar['timestamp'] + pd.Timedelta('59min'))
+                    hourly.append(bar)
+        # 09:30 starts mid-bucket: 09:00 .. 15:00 close in the loop, nothing is left forming
+        expected = resample_bars(self.minutes, '1h')
+        self.assertEqual(len(hourly), len(expected))
+        self.assertEqual(hourly[-1]['volume'], expected['5. volume'].iloc[-1])
+        self.assertIsNone(resampler.partial('1h'))
+
+    def test_store_derivation_is_incremental(self):
+        """Derived partitions only recompute the forming bar and append newer ones"""
+        import tempfile
+        with tempfile.TemporaryDirectory() as root:
+            store = BarStore(root)
+            store.merge('AAPL', '1min', self.minutes.iloc[:100])
+            self.assertEqual(resample_store(store, 'AAPL', timeframes=['5min']), {'5min': 20})
+            store.merge('AAPL', '1min', self.minutes.iloc[100:])
+            self.assertEqual(resample_store(store, 'AAPL', timeframes=['5min']), {'5min': 58})
+            pd.testing.assert_frame_equal(store.read('AAPL', '5min'), resample_bars(self.minutes, '5min'),
+                                          check_index_type=False, check_freq=False)
+
+
+class TestRecordedProviders(TestCase):
+    def setUp(self):
+        import tempfile
+        self.root = tempfile.mkdtemp()
+        index = pd.date_range('2024-01-02 14:30', periods=120, freq='min', tz='UTC')
+        close = 100 + np.arange(120) * 0.1
+        self.recording = Recording(self.root)
+        self.recording.store.merge('AAPL', '1min', pd.DataFrame(
+            {'open': close, 'high': close + 1, 'low': close - 1, 'close': close, 'volume': 10.0}, index=index))
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.root)
+
+    def test_playback_clock_hides_future_bars(self):
+        """Bars after the playback clock, including minutes of a forming hourly bar, are not served"""
+        import asyncio
+        clock = PlaybackClock('2024-01-02 15:10')
+        client = RecordedAlpacaClient(self.recording, clock=clock)
+        minutes = asyncio.run(client.get_bars('AAPL', '1Min', limit=5))
+        self.assertEqual(minutes[-1]['timestamp'], '2024-01-02T15:10:00+00:00')
+        hourly = asyncio.run(client.get_bars('AAPL', '1Hour', limit=5))
+        self.assertEqual(hourly[-1]['close'], minutes[-1]['close'])
+        self.assertEqual(hourly[-1]['volume'], 110)
+
+        clock.advance('30min')
+        data, meta = RecordedTimeSeries(self.recording, clock=clock).get_intraday('AAPL', interval='5min')
+        self.assertEqual(str(data.index[0]), '2024-01-02 15:40:00+00:00')
+        self.assertEqual(meta['2. Symbol'], 'AAPL')
+
+    def test_bars_without_start_cover_the_live_window(self):
+        """Like the live client, a request without start only reaches back over the sessions limit needs"""
+        import asyncio
+        client = RecordedAlpacaClient(self.recording, clock=PlaybackClock('2024-01-10 15:00'))
+        self.assertEqual(asyncio.run(client.get_bars('AAPL', '1Min', limit=5)), [])
+        self.assertEqual(len(asyncio.run(client.get_bars('AAPL', '1Min', limit=5, start='2024-01-02'))), 5)
+
+    def test_orders_fill_at_recorded_prices(self):
+        """Market orders fill at the latest visible close and update cash and positions"""
+        import asyncio
+        client = RecordedAlpacaClient(self.recording, clock=PlaybackClock('2024-01-02 14:40'))
+        order = asyncio.run(client.place_order('AAPL', 10, 'buy'))
+        self.assertEqual(order['status'], 'filled')
+        position = asyncio.run(client.get_position('AAPL'))
+        self.assertEqual(position['qty'], 10)
+        self.assertEqual(position['avg_entry_price'], Decimal('101.0'))
+        account = asyncio.run(client.get_account())
+        self.assertEqual(account['cash'], Decimal('98990.0'))
+
+
+class TestProviderRouter(TestCase):
+    class Provider(MarketDataProvider):
+        def __init__(self, name, delay, error=None):
+            self.name, self.delay, self.error, self.calls = name, delay, error, 0
+
+        async def get_bars(self, symbol, timeframe, limit=100):
+            import asyncio
+            self.calls += 1
+            await asyncio.sleep(self.delay)
+            if self.error:
+                raise self.error
+            return pd.DataFrame({'4. close': [float(self.calls)]}, index=pd.DatetimeIndex(['2024-01-02']))
+
+    def test_slow_primary_is_hedged_with_backup(self):
+        """A primary past the hedge delay races the backup, and the first answer wins"""
+        import asyncio
+        import time
+        primary, backup = self.Provider('hedge-primary', 1.0), self.Provider('hedge-backup', 0.01)
+        router = ProviderRouter([primary, backup], hedge_delay=0.05)
+        start = time.monotonic()
+        asyncio.run(router.get_bars('AAPL', '1h'))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual((primary.calls, backup.calls), (1, 1))
+        self.assertEqual(router.stats()['hedge_wins'], 1)
+
+    def test_failing_provider_fails_over_and_leaves_rotation(self):
+        """Errors fall through to the backup; repeated failures skip the provider"""
+        import asyncio
+        broken, backup = self.Provider('failover-broken', 0, ConnectionError('down')), self.Provider('failover-backup', 0)
+        router = ProviderRouter([broken, backup], failure_threshold=2, cooldown=60)
+        for _ in range(4):
+            asyncio.run(router.get_bars('AAPL', '1h'))
+        self.assertEqual(broken.calls, 2)
+        self.assertEqual(backup.calls, 4)
+        self.assertTrue(router.stats()['providers']['failover-broken']['down'])
+
+    def test_provider_without_bars_is_a_miss_not_a_failure(self):
+        """Symbols a provider does not serve fall through without taking it out of rotation"""
+        import asyncio
+        empty, backup = self.Provider('miss-empty', 0, NoBars('no bars')), self.Provider('miss-backup', 0)
+        router = ProviderRouter([empty, backup], failure_threshold=2, cooldown=60)
+        for _ in range(4):
+            asyncio.run(router.get_bars('BTC-USD', '1h'))
+        self.assertEqual((empty.calls, backup.calls), (4, 4))
+        self.assertFalse(router.stats()['providers']['miss-empty']['down'])
+        self.assertEqual(router.stats()['providers']['miss-empty']['errors'], 0)
+
+    def test_alpha_vantage_reuses_one_session_per_loop(self):
+        """Calls on one event loop share an HTTP session instead of opening one each"""
+        import asyncio
+        provider = AlphaVantageProvider()
+        frame = pd.DataFrame({'1. open': [1.0], '2. high': [2.0], '3. low': [0.5], '4. close': [1.5], '5. volume': [10.0]},
+                             index=pd.DatetimeIndex(['2024-01-02 09:30']))
+
+        async def run():
+            await provider.get_bars('AAPL', '5min')
+            await provider.get_bars('AAPL', '5min')
+            await provider.close()
+
+        with patch('trading.market_data.fetch_intraday', AsyncMock(return_value=frame)) as fetch, \
+                patch('trading.market_data.get_rate_limiter') as limiter:
+            limiter.return_value.acquire = AsyncMock()
+            asyncio.run(run())
+        first, second = [call.args[0] for call in fetch.await_args_list]
+        self.assertIs(first, second)
+
+
+class TestMarketCalendar(TestCase):
+    def setUp(self):
+        self.calendar = MarketCalendar(start='2023-01-01', end='2025-12-31')
+
+    def test_sessions_follow_nyse_holidays_and_early_closes(self):
+        """252 sessions in 2024; holidays are closed and early closes end at 13:00 ET"""
+        self.assertEqual(((self.calendar.days >= '2024-01-01') & (self.calendar.days < '2025-01-01')).sum(), 252)
+        self.assertFalse(self.calendar.is_open('2024-07-04 15:00+00:00'))
+        self.assertTrue(self.calendar.is_open('2024-07-03 16:59+00:00'))
+        self.assertFalse(self.calendar.is_open('2024-07-03 17:01+00:00'))
+        self.assertEqual(self.calendar.next_open('2024-03-28 21:00+00:00'), pd.Timestamp('2024-04-01 13:30', tz='UTC'))
+
+    def test_seconds_until_open_and_crypto(self):
+        """Closed equity markets report the wait until the open; -USD pairs never close"""
+        self.assertEqual(self.calendar.seconds_until_open('2024-01-08 14:30+00:00'), 0)
+        self.assertEqual(self.calendar.seconds_until_open('2024-01-06 14:30+00:00'), 2 * 86400)
+        self.assertEqual(self.calendar.seconds_until_open('2024-01-06 14:30+00:00', symbols=['BTC-USD']), 0)
+        self.assertIs(type(self.calendar.seconds_until_open('2024-01-06 14:30+00:00')), float)
+
+    def test_market_hours_schedule_survives_pickling(self):
+        """Beat's shelve can restore the schedule, which stays hashable and equal"""
+        import pickle
+        from datetime import timedelta
+        from .schedules import MarketHoursSchedule
+        schedule = MarketHoursSchedule(60.0, symbols=['AAPL'])
+
+        restored = pickle.loads(pickle.dumps(schedule))
+        self.assertEqual(restored, schedule)
+        self.assertEqual(restored.symbols, ('AAPL',))
+        self.assertEqual(restored.run_every, timedelta(seconds=60))
+        self.assertEqual(len({schedule, restored}), 1)
+
+
+class TestAssetUniverse(TestCase):
+    ASSETS = [
+        {'symbol': 'MSFT', 'class': 'us_equity', 'exchange': 'NASDAQ', 'tradable': True, 'shortable': True},
+        {'symbol': 'AAPL', 'class': 'us_equity', 'exchange': 'NASDAQ', 'tradable': True, 'shortable': False},
+        {'symbol': 'XYZ', 'class': 'us_equity', 'exchange': 'OTC', 'tradable': False},
+        {'symbol': 'BTC/USD', 'class': 'crypto', 'exchange': 'CRYPTO', 'tradable': True},
+    ]
+
+    def test_filter_queries_and_lookup(self):
+        """Filters combine class, exchange and flags; lookups are binary searches"""
+        universe = AssetUniverse(loader=lambda: self.ASSETS)
+        self.assertEqual(universe.symbols(asset_class='us_equity', tradable=True), ['AAPL', 'MSFT'])
+        self.assertEqual(universe.symbols(tradable=True, shortable=True), ['MSFT'])
+        self.assertEqual(universe.symbols(exchange='NYSE'), [])
+        self.assertEqual(universe.symbols(asset_class='us_equity', limit=1), ['AAPL'])
+        self.assertIn('BTC/USD', universe)
+        self.assertEqual(universe.get('XYZ')['exchange'], 'OTC')
+        self.assertIsNone(universe.get('NOPE'))
+
+    def test_table_is_shared_through_file(self):
+        """A second process loads the saved table instead of downloading the assets again"""
+        import tempfile
+        loader = MagicMock(return_value=self.ASSETS)
+        with tempfile.TemporaryDirectory() as tmp:
+            AssetUniverse(f"{tmp}/assets.npz", loader=loader).table()
+            other = AssetUniverse(f"{tmp}/assets.npz", loader=loader)
+            self.assertEqual(len(other), 4)
+        loader.assert_called_once()
+
+
+class TestAccountBook(TestCase):
+    def setUp(self):
+        import asyncio
+        self.run = asyncio.run
+        self.broker = MagicMock()
+        self.broker.get_account = AsyncMock(return_value={
+            'cash': Decimal('10000'), 'portfolio_value': Decimal('10000'), 'buying_power': Decimal('10000'),
+            'day_trade_count': 0, 'trading_blocked': False, 'trades_blocked': False, 'transfers_blocked': False
+        })
+        self.broker.get_positions = AsyncMock(return_value=[])
+
+    def test_lookups_are_local_until_stale(self):
+        """The broker is read once per max_age, not once per check"""
+        book = AccountBook(self.broker, max_age=60)
+        for _ in range(3):
+            self.assertEqual(self.run(book.account())['cash'], Decimal('10000'))
+            self.assertIsNone(self.run(book.position('AAPL')))
+        self.broker.get_account.assert_awaited_once()
+        book.invalidate()
+        self.run(book.account())
+        self.assertEqual(self.broker.get_account.await_count, 2)
+
+    def test_fills_update_cash_and_positions_once(self):
+        """Order-response and stream fills of one order are applied once; open orders shorten staleness"""
+        book = AccountBook(self.broker, max_age=60, settle_age=0)
+        self.run(book.account())
+        order = {'id': 'o1', 'symbol': 'AAPL', 'side': 'buy', 'qty': '10', 'filled_qty': '4', 'filled_avg_price': '100'}
+        book.record_order(order)
+        self.run(book.on_trade_update({'event': 'partial_fill', 'price': '100', 'order': order}))
+        self.run(book.on_trade_update({'event': 'fill', 'price': '101', 'order': dict(order, filled_qty='10')}))
+
+        self.assertEqual(book._account['cash'], Decimal('10000') - 4 * 100 - 6 * 101)
+        position = book._positions['AAPL']
+        self.assertEqual(position['qty'], 10)
+        self.assertEqual(position['avg_entry_price'], Decimal('100.6'))
+        # Part of the order was open when submitted, so the next lookup reconciles with the broker
+        self.run(book.account())
+        self.assertEqual(self.broker.get_account.await_count, 2)
+
+
+class TestReplay(TestCase):
+    def test_limit_entry_and_stop_loss_exit(self):
+        """Replay sizes with AutomatedTrading's rules and exits at the stop-loss"""
+        bars = pd.DataFrame({
+            '1. open': [100.0, 100.0, 101.0, 99.0],
+            '2. high': [100.5, 101.0, 101.5, 99.5],
+            '3. low': [99.5, 99.8, 97.5, 98.0],
+            '4. close': [100.0, 100.8, 98.0, 99.0],
+        }, index=pd.date_range('2024-01-02 09:30', periods=4, freq='min'))
+        signal = np.array([1, 0, 0, 0], dtype=np.int8)
+        result = replay_bars('AAPL', bars, signal, initial_cash=10000.0)
+
+        # 1% of $10,000 at $100 -> 1 share, 2% stop below entry
+        self.assertEqual(len(result.trades), 1)
+        self.assertEqual(result.trades[0]['quantity'], 1)
+        self.assertEqual(result.trades[0]['stop_loss'], Decimal('98.000'))
+        self.assertEqual(list(result.fills['price']), [100.0, 98.0])
+        self.assertAlmostEqual(result.metrics['final_equity'], 9998.0)
+
+
 if __name__ == '__main__':
     unittest.main()
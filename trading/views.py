@@ -10,6 +10,7 @@ from django.db.models import Sum, Q, Count, Max, Min, Avg
 from django.contrib import messages
 from django.utils import timezone
 from django.contrib.auth import login
+from datetime import datetime
 from decimal import Decimal
 import json
 import logging
@@ -36,6 +37,10 @@ from .models import (
     TradingAccount
 )
 from .forms import UserRegistrationForm, UserForm, UserProfileForm
+from .ai_trading import latest_indicators
+from .alpaca_client import run_sync
+from .providers import get_market_router
+from .single_flight import get_single_flight
 
 logger = logging.getLogger(__name__)
 
@@ -119,8 +124,8 @@ def home(request):
     """Landing page view with market metrics."""
     try:
         # Get market data
-        btc_price = get_market_data('BTC/USD')
-        eth_price = get_market_data('ETH/USD')
+        btc_price = get_market_data('BTC-USD')
+        eth_price = get_market_data('ETH-USD')
         
         # Get platform statistics
         total_users = User.objects.count()
@@ -376,35 +381,42 @@ def edit_profile(request):
     })
 
 
-def get_alpha_vantage_data(symbol, function='TIME_SERIES_INTRADAY', interval='5min'):
-    """Helper function to fetch data from Alpha Vantage API"""
-    api_key = settings.ALPHA_VANTAGE_API_KEY
-    base_url = 'https://www.alphavantage.co/query'
-    
-    params = {
-        'function': function,
-        'symbol': symbol,
-        'interval': interval,
-        'apikey': api_key
-    }
-    
-    try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data from Alpha Vantage: {e}")
-        return None
-
 def get_market_data(asset='AAPL'):
+    """Latest close of an asset from the market data providers, or None"""
     try:
-        data = get_alpha_vantage_data(asset)
-        return data
+        bars = run_sync(get_market_router().get_bars(asset, '1min', limit=1))
+        return float(bars['4. close'].iloc[-1])
     except Exception as e:
         logger.error(f"Error fetching market data: {str(e)}")
         return None
 
 
+# Bars fetched for the dashboard: enough for the combined strategy's indicators to settle,
+# and no more than Alpha Vantage's compact output when it is the provider answering
+DASHBOARD_BARS = 100
+
+
+def asset_snapshot(asset, timeframe='5min'):
+    """Latest bar and combined-strategy indicators of an asset, or None without data.
+
+    Bars come from the market data providers (primary first, hedged and
+    failed over by the router). Returns a small JSON-serialisable dict, so
+    one fetch can be shared with every process through the single-flight tier.
+    """
+    data = run_sync(get_market_router().get_bars(asset, timeframe, limit=DASHBOARD_BARS))
+    if data.empty:
+        return None
+    # Computed once per bar and shared across requests
+    indicators = latest_indicators(asset, timeframe, data)
+    latest_data = data.iloc[-1]
+    return {
+        'last_price': float(latest_data['4. close']),
+        'volume': float(latest_data['5. volume']),
+        'timestamp': data.index[-1].strftime("%Y-%m-%d %H:%M:%S"),
+        'indicators': indicators
+    }
+
+
 @login_required
 def handle_selected_asset(request):
     if request.method == 'POST':
@@ -413,9 +425,10 @@ def handle_selected_asset(request):
 
         try:
             # Process the selected asset
-            data = get_alpha_vantage_data(asset)
+            # Concurrent requests for the same asset share one upstream fetch
+            snapshot = get_single_flight().do(f'bars:5min:{asset}', lambda: asset_snapshot(asset))
             
-            if not data:
+            if snapshot is None:
                 # Return default/mock data if real data fetch fails
                 return JsonResponse({
                     "asset": asset,
@@ -431,24 +444,20 @@ def handle_selected_asset(request):
                     }
                 })
                 
-            # Apply trading strategy
-            data = apply_combined_strategy(data)
-            
-            # Get the latest values
-            latest_data = data.iloc[-1]
+            indicators = snapshot['indicators']
             
             # Prepare response data
             response_data = {
                 "asset": asset,
-                "last_price": float(latest_data['4. close']),
-                "volume": float(latest_data['5. volume']),
-                "signal": int(latest_data['signal']),
-                "timestamp": data.index[-1].strftime("%Y-%m-%d %H:%M:%S"),
+                "last_price": snapshot['last_price'],
+                "volume": snapshot['volume'],
+                "signal": indicators['signal'],
+                "timestamp": snapshot['timestamp'],
                 "technical_indicators": {
-                    "rsi": float(latest_data['RSI']),
-                    "macd": float(latest_data['MACD']),
-                    "sma5": float(latest_data['SMA_5']),
-                    "sma20": float(latest_data['SMA_20'])
+                    "rsi": indicators['RSI'],
+                    "macd": indicators['MACD'],
+                    "sma5": indicators['SMA_5'],
+                    "sma20": indicators['SMA_20']
                 }
             }
             